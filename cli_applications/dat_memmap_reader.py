@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    dat_memmap_reader.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `dat_memmap_reader.py`, provides a memory-mapped reader for the .dat files of HSD v2 acquisitions.
+The .dat file of a component is mapped with `np.memmap` and only the bytes of the requested samples are read,
+so that the cost of a read depends on the size of the time window and not on its position in the file.
+The frame timestamps, used to find a time window, are kept in a persistent time index next to the acquisition
+(see `dat_time_index.py`), so they are read from the .dat file only once.
+
+Layout of an HSD v2 .dat file:
+- The file is a sequence of packets. Each packet starts with a 4-byte counter (the number of payload bytes written
+  so far) followed by the payload. The packet size is `sd_dps` for SD card acquisitions (interface 0) and
+  `usb_dps` + 4 for USB acquisitions (interface 1).
+- The payload of all the packets is a stream of frames. Each frame contains `samples_per_ts` samples of `dim` axes
+  (`data_type` values, interleaved by axis) followed by an 8-byte (double) timestamp, the time of the end of the frame.
+  A frame can span two or more packets.
+- The time of the first sample is `ioffset`; the samples of a frame are evenly spaced between the timestamp of the
+  previous frame and the timestamp of the frame.
+
+When the payload of a packet holds a whole number of frames, the samples are exposed as a strided view of the memory
+map with shape (n_frames, samples_per_ts, dim), with no copy at all. Otherwise only the packets of the requested
+window are copied. Raw samples are returned as views whenever possible; scaled samples (multiplied by sensitivity)
+are computed on the requested window only.
+
+Only sensor components with timestamps (samples_per_ts > 0) are supported. The tools fall back to the HSDatalog
+reader for the other components (algorithms, ISPU, MLC) and for HSD v1 acquisitions.
+"""
+
+import os
+import json
+import numpy as np
+from dat_time_index import DatTimeIndex
+
+class DatMemmapReader:
+    COUNTER_SIZE = 4
+    TIMESTAMP_SIZE = 8
+    DATA_TYPES = {"int8": np.int8, "uint8": np.uint8, "int16": np.int16, "uint16": np.uint16,
+                  "int32": np.int32, "uint32": np.uint32, "float": np.float32, "double": np.float64}
+
+    def __init__(self, acq_folder, component_name, use_index=True, log=None):
+        """
+        Map the .dat file of a component of an HSD v2 acquisition.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name (e.g. "iis3dwb_acc").
+            use_index (bool, optional): If True, the frame timestamps are taken from the persistent time index of the component. Defaults to True.
+            log (logging.Logger, optional): The logger used to report time index issues. Defaults to None.
+
+        Raises:
+            ValueError: If the acquisition or the component is not supported by the reader.
+        """
+        self.acq_folder = acq_folder
+        self.component_name = component_name
+        self.use_index = use_index
+        self.log = log
+
+        with open(os.path.join(acq_folder, "acquisition_info.json"), 'r') as f:
+            acquisition_info = json.load(f)
+        with open(os.path.join(acq_folder, "device_config.json"), 'r') as f:
+            device_config = json.load(f)
+        if not acquisition_info.get("data_fmt", "").startswith("HSD_2"):
+            raise ValueError("Unsupported acquisition format \"{}\"".format(acquisition_info.get("data_fmt")))
+        status = DatMemmapReader.get_component_status(device_config, component_name)
+        if status is None:
+            raise ValueError("No \"{}\" Component found in your Device Configuration file.".format(component_name))
+        self.status = status
+        if status.get("c_type", 0) != 0 or component_name.endswith(("_ispu", "_mlc")):
+            raise ValueError("{} is not a sensor component".format(component_name))
+
+        data_type = status.get("data_type", "").replace("_t", "")
+        if data_type not in DatMemmapReader.DATA_TYPES:
+            raise ValueError("Unsupported data type \"{}\" for {}".format(status.get("data_type"), component_name))
+        self.spts = status.get("samples_per_ts", 0)
+        if self.spts <= 0:
+            raise ValueError("{} has no timestamps (samples_per_ts = 0)".format(component_name))
+        self.dtype = np.dtype(DatMemmapReader.DATA_TYPES[data_type]).newbyteorder('<')
+        self.dim = status.get("dim", 1)
+        self.sensitivity = status.get("sensitivity", 1)
+        self.ioffset = status.get("ioffset", 0)
+
+        interface = acquisition_info.get("interface")
+        if interface == 0:
+            self.packet_size = status["sd_dps"]
+        elif interface == 1:
+            self.packet_size = status["usb_dps"] + DatMemmapReader.COUNTER_SIZE
+        else:
+            raise ValueError("Unsupported acquisition interface {}".format(interface))
+        self.payload_size = self.packet_size - DatMemmapReader.COUNTER_SIZE
+        self.samples_size = self.spts * self.dim * self.dtype.itemsize
+        self.frame_size = self.samples_size + DatMemmapReader.TIMESTAMP_SIZE
+
+        self.file_path = os.path.join(acq_folder, component_name + ".dat")
+        file_size = os.path.getsize(self.file_path)
+        self.mm = np.memmap(self.file_path, dtype=np.uint8, mode='r') if file_size > 0 else np.zeros(0, dtype=np.uint8)
+        n_full_packets, last_packet = divmod(file_size, self.packet_size)
+        self.payload_bytes = n_full_packets * self.payload_size + max(last_packet - DatMemmapReader.COUNTER_SIZE, 0)
+        self.n_frames = self.payload_bytes // self.frame_size
+        self.n_samples = self.n_frames * self.spts
+        self._frame_timestamps = None
+
+        # Frames never span two packets: the samples are a strided view of the memory map
+        self.frames_view = None
+        frames_per_packet = self.payload_size // self.frame_size
+        n_packets = -(-self.n_frames // frames_per_packet) if frames_per_packet > 0 else 0
+        if self.payload_size % self.frame_size == 0 and self.n_frames > 0 and n_packets * self.packet_size <= len(self.mm):
+            frames = np.ndarray(shape=(n_packets, frames_per_packet, self.spts, self.dim), dtype=self.dtype, buffer=self.mm,
+                                offset=DatMemmapReader.COUNTER_SIZE,
+                                strides=(self.packet_size, self.frame_size, self.dim * self.dtype.itemsize, self.dtype.itemsize))
+            self.frames_view = frames.reshape(-1, self.spts, self.dim)[:self.n_frames]
+
+    @staticmethod
+    def get_component_status(device_config, component_name):
+        """
+        Get the status of a component from an HSD v2 device configuration.
+
+        Args:
+            device_config (dict): The content of device_config.json.
+            component_name (str): The component name.
+
+        Returns:
+            dict: The component status, or None if the component is not found.
+        """
+        for component in device_config["devices"][0]["components"]:
+            if component_name in component:
+                return component[component_name]
+        return None
+
+    @staticmethod
+    def is_supported(acq_folder, component_name):
+        """
+        Check whether the reader supports a component of an acquisition.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+
+        Returns:
+            bool: True if the component can be read with a DatMemmapReader, False otherwise.
+        """
+        try:
+            DatMemmapReader(acq_folder, component_name, use_index=False)
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def _payload_to_file_offsets(self, payload_offsets):
+        # Skip the counter at the beginning of each packet
+        packet, offset = np.divmod(payload_offsets, self.payload_size)
+        return packet * self.packet_size + DatMemmapReader.COUNTER_SIZE + offset
+
+    def read_payload(self, start, end):
+        """
+        Read a range of bytes of the payload stream (the packet counters removed).
+
+        Args:
+            start (int): The start payload offset.
+            end (int): The end payload offset (excluded).
+
+        Returns:
+            np.ndarray: The bytes. A view of the memory map if the range lies in a single packet, a copy of the range otherwise.
+        """
+        first_packet, first_offset = divmod(start, self.payload_size)
+        last_packet = (end - 1) // self.payload_size
+        file_start = first_packet * self.packet_size + DatMemmapReader.COUNTER_SIZE + first_offset
+        if first_packet == last_packet:
+            return self.mm[file_start:file_start + end - start]
+        # Copy the payload of the packets in the range only
+        packets_end = min((last_packet + 1) * self.packet_size, len(self.mm))
+        packets = self.mm[first_packet * self.packet_size:packets_end]
+        n_full = len(packets) // self.packet_size
+        payload = [packets[:n_full * self.packet_size].reshape(n_full, self.packet_size)[:, DatMemmapReader.COUNTER_SIZE:].reshape(-1)]
+        if len(packets) > n_full * self.packet_size:
+            payload.append(packets[n_full * self.packet_size + DatMemmapReader.COUNTER_SIZE:])
+        payload = np.concatenate(payload)
+        return payload[first_offset:first_offset + end - start]
+
+    def get_frames(self, start_frame, end_frame):
+        """
+        Get the samples of a range of frames.
+
+        Args:
+            start_frame (int): The start frame index.
+            end_frame (int): The end frame index (excluded).
+
+        Returns:
+            np.ndarray: The raw samples, with shape (n_frames, samples_per_ts, dim). A view of the memory map if the frames never span two packets.
+        """
+        if self.frames_view is not None:
+            return self.frames_view[start_frame:end_frame]
+        frames = self.read_payload(start_frame * self.frame_size, end_frame * self.frame_size).reshape(-1, self.frame_size)
+        return np.ascontiguousarray(frames[:, :self.samples_size]).view(self.dtype).reshape(-1, self.spts, self.dim)
+
+    def read_frame_timestamps(self, start_frame=0, end_frame=None):
+        """
+        Read the timestamps of a range of frames from the file. Only the 8 timestamp bytes of each frame are read,
+        but every page of the file that holds a timestamp is loaded, so reading all the timestamps of a large file is slow.
+
+        Args:
+            start_frame (int, optional): The start frame index. Defaults to 0.
+            end_frame (int, optional): The end frame index (excluded). Defaults to None, that is, the last frame.
+
+        Returns:
+            np.ndarray: The timestamp (end time) of each frame, in seconds.
+        """
+        end_frame = self.n_frames if end_frame is None else end_frame
+        payload_offsets = (np.arange(start_frame, end_frame, dtype=np.int64) * self.frame_size + self.samples_size)[:, None] + np.arange(DatMemmapReader.TIMESTAMP_SIZE)
+        return self.mm[self._payload_to_file_offsets(payload_offsets)].view('<f8').ravel()
+
+    def get_frame_timestamps(self):
+        """
+        Get the timestamps of all the frames. If the reader uses the time index, they are loaded from (or saved to) the sidecar
+        index of the component (see dat_time_index.py), otherwise they are read from the file.
+
+        Returns:
+            np.ndarray: The timestamp (end time) of each frame, in seconds.
+        """
+        if self._frame_timestamps is None:
+            if self.use_index:
+                self._frame_timestamps = DatTimeIndex.get(self, self.log).timestamps
+            else:
+                self._frame_timestamps = self.read_frame_timestamps()
+        return self._frame_timestamps
+
+    def get_timestamps(self, start=0, end=None):
+        """
+        Get the timestamps of a range of samples.
+
+        Args:
+            start (int, optional): The start sample index. Defaults to 0.
+            end (int, optional): The end sample index (excluded). Defaults to None, that is, the last sample.
+
+        Returns:
+            np.ndarray: The time of each sample, in seconds.
+        """
+        end = self.n_samples if end is None else min(end, self.n_samples)
+        if end <= start:
+            return np.zeros(0)
+        frame_ts = self.get_frame_timestamps()
+        first_frame, last_frame = start // self.spts, (end - 1) // self.spts + 1
+        ends = frame_ts[first_frame:last_frame]
+        starts = np.concatenate([[frame_ts[first_frame - 1] if first_frame > 0 else self.ioffset], ends[:-1]])
+        times = starts[:, None] + (ends - starts)[:, None] * (np.arange(self.spts) / self.spts)
+        offset = start - first_frame * self.spts
+        return times.ravel()[offset:offset + end - start]
+
+    def get_sample_times(self, indices):
+        """
+        Get the timestamps of a set of samples, e.g. a decimated time axis, without computing the time of the samples in between.
+
+        Args:
+            indices (np.ndarray): The sample indices (each lower than n_samples).
+
+        Returns:
+            np.ndarray: The time of each sample, in seconds.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        frame_ts = self.get_frame_timestamps()
+        frames = indices // self.spts
+        ends = frame_ts[frames]
+        starts = np.where(frames > 0, frame_ts[np.maximum(frames - 1, 0)], self.ioffset)
+        return starts + (ends - starts) * ((indices % self.spts) / self.spts)
+
+    def get_samples(self, start=0, end=None, raw_data=False):
+        """
+        Get a range of samples.
+
+        Args:
+            start (int, optional): The start sample index. Defaults to 0.
+            end (int, optional): The end sample index (excluded). Defaults to None, that is, the last sample.
+            raw_data (bool, optional): If True, the raw samples are returned, otherwise they are multiplied by sensitivity. Defaults to False.
+
+        Returns:
+            np.ndarray: The samples, with shape (n_samples, dim). Raw samples are a view of the memory map if they lie in a single frame
+                or if the frames never span two packets and contain no timestamp between the requested samples.
+        """
+        end = self.n_samples if end is None else min(end, self.n_samples)
+        if end <= start:
+            return np.zeros((0, self.dim), dtype=self.dtype if raw_data else np.float32)
+        first_frame, last_frame = start // self.spts, (end - 1) // self.spts + 1
+        offset = start - first_frame * self.spts
+        samples = self.get_frames(first_frame, last_frame).reshape(-1, self.dim)[offset:offset + end - start]
+        if raw_data:
+            return samples
+        return samples * np.float32(self.sensitivity)
+
+    def get_axis(self, axis, start=0, end=None, raw_data=False):
+        """
+        Get a range of samples of an axis.
+
+        Args:
+            axis (int): The axis index.
+            start (int, optional): The start sample index. Defaults to 0.
+            end (int, optional): The end sample index (excluded). Defaults to None, that is, the last sample.
+            raw_data (bool, optional): If True, the raw samples are returned, otherwise they are multiplied by sensitivity. Defaults to False.
+
+        Returns:
+            np.ndarray: The samples of the axis (a strided view when get_samples returns a view).
+        """
+        return self.get_samples(start, end, raw_data)[:, axis]
+
+    def get_sample_range(self, start_time=0, end_time=-1):
+        """
+        Get the range of the samples in a time window. Only the frame timestamps are searched.
+
+        Args:
+            start_time (float, optional): The start time in seconds. Defaults to 0.
+            end_time (float, optional): The end time in seconds, -1 for the end of the acquisition. Defaults to -1.
+
+        Returns:
+            tuple: The start and the end (excluded) sample indices.
+        """
+        frame_ts = self.get_frame_timestamps()
+        start_frame = int(np.searchsorted(frame_ts, start_time, side='right'))
+        end_frame = self.n_frames if end_time == -1 else min(int(np.searchsorted(frame_ts, end_time, side='right')) + 1, self.n_frames)
+        if start_frame >= end_frame:
+            return 0, 0
+        # Refine the boundaries inside the first and the last frames
+        start = start_frame * self.spts
+        start += int(np.searchsorted(self.get_timestamps(start, start + self.spts), start_time, side='left'))
+        end = end_frame * self.spts
+        if end_time != -1:
+            last = (end_frame - 1) * self.spts
+            end = last + int(np.searchsorted(self.get_timestamps(last, last + self.spts), end_time, side='left'))
+        return start, max(start, end)
+
+    def get_time_window(self, start_time=0, end_time=-1, raw_data=False):
+        """
+        Get the timestamps and the samples in a time window.
+
+        Args:
+            start_time (float, optional): The start time in seconds. Defaults to 0.
+            end_time (float, optional): The end time in seconds, -1 for the end of the acquisition. Defaults to -1.
+            raw_data (bool, optional): If True, the raw samples are returned, otherwise they are multiplied by sensitivity. Defaults to False.
+
+        Returns:
+            tuple: The time of each sample and the samples, with shape (n_samples, dim).
+        """
+        start, end = self.get_sample_range(start_time, end_time)
+        return self.get_timestamps(start, end), self.get_samples(start, end, raw_data)
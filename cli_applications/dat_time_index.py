@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    dat_time_index.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `dat_time_index.py`, provides a persistent time index for the .dat files of HSD v2 acquisitions.
+The index of a component holds the timestamp of each frame. The byte offset of a frame in the .dat file follows
+from the frame index and the packet and frame sizes, so a time window is mapped to the bytes to read with a binary
+search on the timestamps (see `DatMemmapReader.get_sample_range`).
+The index is built once by a DatMemmapReader (see `dat_memmap_reader.py`) and saved in a `.stdatalog_index` folder
+inside the acquisition folder, so that the next time-window queries on the component read only the frames of the
+window instead of the timestamps of the whole file.
+
+The index records the size and the modification time of the .dat file and its packet and frame sizes:
+- if the file did not change, the index is loaded as is,
+- if the file grew (e.g. an acquisition still in progress) and the last indexed frame is unchanged, only the new
+  frames are indexed,
+- otherwise the index is built again.
+If the acquisition folder is read-only, the index is kept in memory only.
+"""
+
+import os
+import numpy as np
+
+class DatTimeIndex:
+    FOLDER_NAME = ".stdatalog_index"
+    VERSION = 1
+
+    def __init__(self, path, timestamps, file_size, file_mtime, packet_size, frame_size):
+        """
+        Initialize the DatTimeIndex.
+
+        Args:
+            path (str): The path of the index file.
+            timestamps (np.ndarray): The timestamp (end time) of each frame, in seconds.
+            file_size (int): The size of the indexed .dat file.
+            file_mtime (int): The modification time (ns) of the indexed .dat file.
+            packet_size (int): The packet size of the .dat file.
+            frame_size (int): The frame size of the .dat file.
+        """
+        self.path = path
+        self.timestamps = timestamps
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+        self.packet_size = packet_size
+        self.frame_size = frame_size
+
+    @staticmethod
+    def get_index_path(acq_folder, component_name):
+        """
+        Get the path of the index file of a component.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+
+        Returns:
+            str: The index file path.
+        """
+        return os.path.join(acq_folder, DatTimeIndex.FOLDER_NAME, component_name + ".npz")
+
+    @staticmethod
+    def load(path):
+        """
+        Load an index file.
+
+        Args:
+            path (str): The index file path.
+
+        Returns:
+            DatTimeIndex: The index, or None if the file does not exist or cannot be read.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != DatTimeIndex.VERSION:
+                    return None
+                return DatTimeIndex(path, data["timestamps"], int(data["file_size"]), int(data["file_mtime"]),
+                                    int(data["packet_size"]), int(data["frame_size"]))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self):
+        """
+        Save the index file. The file is replaced atomically, so that concurrent readers never load a truncated index.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, version=DatTimeIndex.VERSION, timestamps=self.timestamps, file_size=self.file_size,
+                 file_mtime=self.file_mtime, packet_size=self.packet_size, frame_size=self.frame_size)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def get(reader, log=None):
+        """
+        Get the up to date index of the component of a reader, loading, extending or building it as needed.
+
+        Args:
+            reader (DatMemmapReader): The reader of the component.
+            log (logging.Logger, optional): The logger used to report an index that cannot be saved. Defaults to None.
+
+        Returns:
+            DatTimeIndex: The index.
+        """
+        path = DatTimeIndex.get_index_path(reader.acq_folder, reader.component_name)
+        stat = os.stat(reader.file_path)
+        index = DatTimeIndex.load(path)
+        if index is not None and (index.packet_size, index.frame_size) == (reader.packet_size, reader.frame_size):
+            n_indexed = len(index.timestamps)
+            if index.file_size == stat.st_size and index.file_mtime == stat.st_mtime_ns and n_indexed == reader.n_frames:
+                return index
+            if index.file_size <= stat.st_size and n_indexed <= reader.n_frames and \
+                (n_indexed == 0 or reader.read_frame_timestamps(n_indexed - 1, n_indexed)[0] == index.timestamps[-1]):
+                # The file grew: index only the new frames
+                index.timestamps = np.concatenate([index.timestamps, reader.read_frame_timestamps(n_indexed)])
+                index.file_size, index.file_mtime = stat.st_size, stat.st_mtime_ns
+                index._try_save(log)
+                return index
+        index = DatTimeIndex(path, reader.read_frame_timestamps(), stat.st_size, stat.st_mtime_ns,
+                             reader.packet_size, reader.frame_size)
+        index._try_save(log)
+        return index
+
+    def _try_save(self, log=None):
+        try:
+            self.save()
+        except OSError as err:
+            # A read-only acquisition folder only costs a new index at each run
+            if log is not None:
+                log.warning("Time index {} cannot be saved ({}), it will be built again at the next run".format(self.path, err))
\ No newline at end of file
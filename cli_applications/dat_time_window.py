@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    dat_time_window.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `dat_time_window.py`, is used by the CLI tools to read the data of a component through the
+memory-mapped reader (see `dat_memmap_reader.py`) instead of the HSDatalog chunked reads.
+The samples of the time window are read from the memory map only, and they are returned as dataframe chunks with
+the same columns (names and types) as the HSDatalog dataframes: the first chunk of the component is read once with
+HSDatalog and used as a reference, so the output of a tool does not depend on the reader used.
+
+The tools read their time window (-st/-et options) through this module with the -mm option (stdatalog_plot.py
+always), so that a time window near the end of a long acquisition costs the same as one at its beginning: the window
+is found in the persistent time index of the component (see `dat_time_index.py`) and only its frames are read.
+The export_* writers have their own file names and formatting: without -mm the files are written by HSDatalog.
+The tools fall back to HSDatalog for the components not supported by the memory-mapped reader (HSD v1 acquisitions,
+algorithms, ISPU, MLC), for annotated data and for the timestamp recovery of the debug mode.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from stdatalog_core.HSD.HSDatalog import HSDatalog
+from dat_memmap_reader import DatMemmapReader
+from export_sinks import WavSink
+
+class DatTimeWindow:
+
+    def __init__(self, hsd, component, start_time=0, end_time=-1, raw_data=False, log=None):
+        """
+        Open the time window of a component through a DatMemmapReader.
+
+        Args:
+            hsd: The HSDatalog object of the acquisition.
+            component (dict): The component, as returned by HSDatalog.get_component.
+            start_time (float, optional): The start time in seconds. Defaults to 0.
+            end_time (float, optional): The end time in seconds, -1 for the end of the acquisition. Defaults to -1.
+            raw_data (bool, optional): If True, the raw samples are read, otherwise they are multiplied by sensitivity. Defaults to False.
+            log (logging.Logger, optional): The logger used to report time index issues. Defaults to None.
+
+        Raises:
+            ValueError: If the component is not supported by DatMemmapReader or its HSDatalog columns cannot be read.
+        """
+        self.component_name = list(component.keys())[0]
+        self.component_status = component[self.component_name]
+        self.raw_data = raw_data
+        self.reader = DatMemmapReader(HSDatalog.get_acquisition_path(hsd), self.component_name, log=log)
+        reference = DatTimeWindow.get_reference_chunk(hsd, component, raw_data, self.reader.spts)
+        if len(reference.columns) != self.reader.dim + 1:
+            raise ValueError("{} HSDatalog dataframes have {} columns, {} expected".format(self.component_name, len(reference.columns), self.reader.dim + 1))
+        self.columns = list(reference.columns)
+        self.dtypes = reference.dtypes.to_dict()
+        # Only the frame timestamps are searched to find the time window
+        self.start, self.end = self.reader.get_sample_range(start_time, end_time)
+
+    @staticmethod
+    def open(hsd, component, start_time=0, end_time=-1, raw_data=False, log=None):
+        """
+        Open the time window of a component, if the component is supported by the memory-mapped reader.
+
+        Args:
+            hsd: The HSDatalog object of the acquisition.
+            component (dict): The component, as returned by HSDatalog.get_component.
+            start_time (float, optional): The start time in seconds. Defaults to 0.
+            end_time (float, optional): The end time in seconds, -1 for the end of the acquisition. Defaults to -1.
+            raw_data (bool, optional): If True, the raw samples are read, otherwise they are multiplied by sensitivity. Defaults to False.
+            log (logging.Logger, optional): The logger used to report the fallback to HSDatalog. Defaults to None.
+
+        Returns:
+            DatTimeWindow: The time window, or None if the component has to be read with HSDatalog.
+        """
+        try:
+            return DatTimeWindow(hsd, component, start_time, end_time, raw_data, log)
+        except (OSError, ValueError, KeyError) as err:
+            if log is not None:
+                log.info("{} is read with HSDatalog ({})".format(list(component.keys())[0], err))
+            return None
+
+    @staticmethod
+    def is_time_window(start_time, end_time):
+        """
+        Check whether a time range selects a part of the acquisition.
+
+        Args:
+            start_time (float): The start time in seconds.
+            end_time (float): The end time in seconds, -1 for the end of the acquisition.
+
+        Returns:
+            bool: True if the time range does not start at the beginning or does not stop at the end of the acquisition.
+        """
+        return start_time > 0 or end_time != -1
+
+    @staticmethod
+    def get_reference_chunk(hsd, component, raw_data, chunk_size):
+        """
+        Read the first dataframe chunk of a component with HSDatalog.
+
+        Args:
+            hsd: The HSDatalog object of the acquisition.
+            component (dict): The component, as returned by HSDatalog.get_component.
+            raw_data (bool): If True, the raw samples are read, otherwise they are multiplied by sensitivity.
+            chunk_size (int): The chunk size (samples per timestamp, the smallest chunk read by HSDatalog).
+
+        Returns:
+            pd.DataFrame: The first chunk.
+
+        Raises:
+            ValueError: If HSDatalog returns no dataframe.
+        """
+        try:
+            df_generator = HSDatalog.get_dataframe_gen(hsd, component, 0, -1, False, raw_data, [], chunk_size)
+            reference = next((df for df in df_generator if df is not None), None) if df_generator is not None else None
+            if df_generator is not None and hasattr(df_generator, "close"):
+                df_generator.close()
+        except Exception as err:
+            raise ValueError("HSDatalog dataframe cannot be read ({}: {})".format(type(err).__name__, err)) from err
+        if reference is None:
+            raise ValueError("HSDatalog returned no dataframe")
+        return reference
+
+    def get_n_samples(self):
+        """
+        Get the number of samples of the time window.
+
+        Returns:
+            int: The number of samples.
+        """
+        return self.end - self.start
+
+    def get_dataframe_gen(self, chunk_size):
+        """
+        Get the samples of the time window as a sequence of dataframe chunks, with the columns of the HSDatalog dataframes.
+
+        Args:
+            chunk_size (int): The number of samples of each chunk.
+
+        Yields:
+            pd.DataFrame: The time and the samples of a chunk.
+        """
+        for chunk_start in range(self.start, self.end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, self.end)
+            df = pd.DataFrame(self.reader.get_samples(chunk_start, chunk_end, self.raw_data), columns=self.columns[1:])
+            df.insert(0, self.columns[0], self.reader.get_timestamps(chunk_start, chunk_end))
+            yield df.astype(self.dtypes, copy=False)
+
+    def get_dataframe(self):
+        """
+        Get all the samples of the time window as a single dataframe.
+
+        Returns:
+            pd.DataFrame: The time and the samples.
+        """
+        return next(self.get_dataframe_gen(max(self.get_n_samples(), 1)), pd.DataFrame(columns=self.columns).astype(self.dtypes))
+
+    def export_wav(self, output_folder, chunk_size):
+        """
+        Write the time window of a microphone to a 16-bit PCM WAV file (see export_sinks.WavSink).
+
+        Args:
+            output_folder (str): The output folder.
+            chunk_size (int): The number of samples of each chunk.
+
+        Returns:
+            list: The paths of the files written.
+        """
+        sink = WavSink(output_folder)
+        try:
+            for df in self.get_dataframe_gen(chunk_size):
+                sink.write(self.component_name, self.component_status, df)
+        finally:
+            sink.close()
+        return sink.written_files
+
+    def export_xsv(self, output_folder, file_format, no_timestamps=False, chunk_size=1000000):
+        """
+        Write the time window to a file named after the component, in the output folder.
+
+        Args:
+            output_folder (str): The output folder.
+            file_format (str): The file format: "CSV" (comma-separated), "TSV" or "TXT" (tab-separated), or "PARQUET" (requires pyarrow).
+            no_timestamps (bool, optional): If True, the "Time" column is not written. Defaults to False.
+            chunk_size (int, optional): The number of samples of each chunk. Defaults to 1000000.
+
+        Returns:
+            str: The path of the file written.
+        """
+        file_format = file_format.upper()
+        path = os.path.join(output_folder, "{}.{}".format(self.component_name, file_format.lower()))
+        columns = self.columns[1:] if no_timestamps else self.columns
+        if file_format == "PARQUET":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            writer = None
+            try:
+                for df in self.get_dataframe_gen(chunk_size):
+                    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            sep = ',' if file_format == "CSV" else '\t'
+            with open(path, 'w', newline='') as f:
+                header = True
+                for df in self.get_dataframe_gen(chunk_size):
+                    df[columns].to_csv(f, sep=sep, index=False, header=header)
+                    header = False
+                if header:
+                    # Empty time window: the header only
+                    f.write(sep.join(columns) + "\n")
+        return path
+
+    def export_nanoedge(self, output_folder, signal_length, signal_increment=0, target_value=None, chunk_size=1000000):
+        """
+        Write the time window in the NanoEdge AI Studio format: a row per segment of signal_length samples, with the axes
+        interleaved (x0, y0, z0, x1, ...) and, if given, the target value in the first column.
+
+        Args:
+            output_folder (str): The output folder.
+            signal_length (int): The number of samples of each segment.
+            signal_increment (int, optional): The number of samples between the start of two consecutive segments, 0 for no overlap. Defaults to 0.
+            target_value (float, optional): The target value of the segments (NanoEdge AI extrapolation datasets). Defaults to None.
+            chunk_size (int, optional): The approximate number of samples read at a time. Defaults to 1000000.
+
+        Returns:
+            str: The path of the file written.
+        """
+        step = signal_increment if signal_increment > 0 else signal_length
+        n_samples = self.get_n_samples()
+        n_segments = (n_samples - signal_length) // step + 1 if n_samples >= signal_length else 0
+        segments_per_chunk = max(1, chunk_size // max(step, signal_length))
+        dtype = self.dtypes[self.columns[1]]
+        path = os.path.join(output_folder, "{}_nanoedge.csv".format(self.component_name))
+        with open(path, 'w', newline='') as f:
+            for first in range(0, n_segments, segments_per_chunk):
+                last = min(first + segments_per_chunk, n_segments)
+                start = self.start + first * step
+                samples = self.reader.get_samples(start, self.start + (last - 1) * step + signal_length, self.raw_data)
+                # Segments as views of the samples, flattened one row per segment
+                segments = np.lib.stride_tricks.sliding_window_view(samples, signal_length, axis=0)[::step]
+                df = pd.DataFrame(segments.transpose(0, 2, 1).reshape(len(segments), -1).astype(dtype))
+                if target_value is not None:
+                    df.insert(0, "target", target_value)
+                df.to_csv(f, index=False, header=False)
+        return path
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    export_manifest.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `export_manifest.py`, is used by the data export scripts (`stdatalog_data_export.py` and
+`stdatalog_data_export_by_tags.py`) to make the exports incremental and resumable.
+The scripts write a manifest (`export_manifest.json`) into the output folder, with an entry per exported
+component that records:
+- the source files of the component (the .dat file and the acquisition .json files) with their size and
+  modification time (and their SHA-256 hash, if content hashing is enabled),
+- the export options,
+- the output files written by the export,
+- the export status ("in_progress" while the component is being exported, "completed" at the end).
+
+A later run skips the components whose entry is completed, exported with the same options, whose outputs
+still exist and whose sources did not change. A source is unchanged if its size and modification time are
+the same: hashing the sources would cost a full extra read of multi-GB .dat files after each export.
+With content hashing enabled (`hash_sources`), the hash of a source is recorded too and, when its size is the
+same but its modification time changed (e.g. the acquisition folder was copied), the content decides.
+A component whose previous export was interrupted is still "in_progress" and is exported again.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+
+class ExportManifest:
+    FILE_NAME = "export_manifest.json"
+    VERSION = 1
+    HASH_BLOCK_SIZE = 2**20
+
+    def __init__(self, output_folder, log=None, hash_sources=False):
+        """
+        Load the export manifest of an output folder, or create an empty one.
+
+        Args:
+            output_folder (str): The export output folder.
+            log (logging.Logger, optional): The logger used to report an unreadable manifest. Defaults to None.
+            hash_sources (bool, optional): Compare the content (SHA-256 hash) of the sources whose modification time changed,
+                instead of exporting them again. Defaults to False.
+        """
+        self.output_folder = output_folder
+        self.hash_sources = hash_sources
+        self.path = os.path.join(output_folder, ExportManifest.FILE_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == ExportManifest.VERSION:
+                    self.entries = manifest.get("entries", {})
+            except (OSError, ValueError) as err:
+                # A corrupted manifest only causes a full export
+                if log is not None:
+                    log.warning("Export manifest {} cannot be read ({}), all the outputs will be exported again".format(self.path, err))
+
+    def save(self):
+        """
+        Write the manifest to the output folder. The file is replaced atomically, so an interrupted run never leaves a truncated manifest.
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": ExportManifest.VERSION, "entries": self.entries}, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def get_source_files(acq_folder, component_name=None):
+        """
+        Get the source files of an export: the .dat file of the component and the acquisition .json files (device configuration, acquisition info, tags).
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str, optional): The component name. Defaults to None, that is, the .dat files of all the components.
+
+        Returns:
+            list: The paths of the source files.
+        """
+        sources = []
+        for file_name in sorted(os.listdir(acq_folder)):
+            name, ext = os.path.splitext(file_name)
+            if ext == ".json" or (ext == ".dat" and (component_name is None or name == component_name)):
+                sources.append(os.path.join(acq_folder, file_name))
+        return sources
+
+    @staticmethod
+    def hash_file(path):
+        """
+        Compute the SHA-256 hash of a file, reading it one block at a time.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            str: The hexadecimal hash.
+        """
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(ExportManifest.HASH_BLOCK_SIZE), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def get_source_info(paths, hash_sources=False):
+        """
+        Get the size and the modification time of the source files, and optionally their hash.
+
+        Args:
+            paths (list): The paths of the source files.
+            hash_sources (bool, optional): Also compute the SHA-256 hash of the files (a full read of each file). Defaults to False.
+
+        Returns:
+            dict: The source info, keyed by file name.
+        """
+        info = {}
+        for path in paths:
+            stat = os.stat(path)
+            info[os.path.basename(path)] = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+            if hash_sources:
+                info[os.path.basename(path)]["sha256"] = ExportManifest.hash_file(path)
+        return info
+
+    @staticmethod
+    def list_files(folder):
+        """
+        Get the modification time of all the files in a folder and its subfolders.
+
+        Args:
+            folder (str): The folder.
+
+        Returns:
+            dict: The modification time of each file, keyed by the path relative to the folder.
+        """
+        files = {}
+        for root, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                path = os.path.join(root, file_name)
+                files[os.path.relpath(path, folder)] = os.stat(path).st_mtime_ns
+        return files
+
+    @staticmethod
+    def get_written_files(before, after, component_name=None):
+        """
+        Get the files written between two listings of the output folder.
+
+        Args:
+            before (dict): The listing taken before the export (see list_files).
+            after (dict): The listing taken after the export (see list_files).
+            component_name (str, optional): If given, and if some of the written files contain it in their path,
+                only those files are returned (other components may be exported at the same time). Defaults to None.
+
+        Returns:
+            list: The paths, relative to the output folder, of the files written.
+        """
+        manifest_files = (ExportManifest.FILE_NAME, ExportManifest.FILE_NAME + ".tmp")
+        written = sorted(f for f, mtime in after.items() if before.get(f) != mtime and f not in manifest_files)
+        if component_name is not None:
+            own = [f for f in written if component_name.lower() in f.lower()]
+            if own:
+                written = own
+        return written
+
+    def is_up_to_date(self, key, options, sources):
+        """
+        Check whether an export is up to date: it was completed with the same options, its outputs still exist and its sources did not change.
+
+        Args:
+            key (str): The export entry key.
+            options (dict): The export options.
+            sources (list): The paths of the source files.
+
+        Returns:
+            bool: True if the export can be skipped, False otherwise.
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry.get("status") != "completed" or entry.get("options") != options:
+            return False
+        if not entry.get("outputs") or not all(os.path.exists(os.path.join(self.output_folder, f)) for f in entry["outputs"]):
+            return False
+        recorded = entry.get("sources", {})
+        if not sources or sorted(recorded) != sorted(os.path.basename(path) for path in sources):
+            return False
+        refreshed = False
+        for path in sources:
+            stat = os.stat(path)
+            source = recorded[os.path.basename(path)]
+            if stat.st_size != source["size"]:
+                return False
+            if stat.st_mtime_ns != source["mtime"]:
+                # Same size but touched: the content decides, if it was hashed
+                if not self.hash_sources or "sha256" not in source or ExportManifest.hash_file(path) != source["sha256"]:
+                    return False
+                source["mtime"] = stat.st_mtime_ns
+                refreshed = True
+        if refreshed:
+            self.save()
+        return True
+
+    def start(self, key, options):
+        """
+        Record that an export started. If the run is interrupted, the entry stays "in_progress" and the export is done again by the next run.
+
+        Args:
+            key (str): The export entry key.
+            options (dict): The export options.
+        """
+        self.entries[key] = {"status": "in_progress", "options": options, "started": datetime.now().isoformat()}
+        self.save()
+
+    def complete(self, key, options, source_info, outputs):
+        """
+        Record that an export completed.
+
+        Args:
+            key (str): The export entry key.
+            options (dict): The export options.
+            source_info (dict): The source info (see get_source_info).
+            outputs (list): The paths, relative to the output folder, of the files written.
+        """
+        entry = self.entries.get(key, {})
+        entry.update({"status": "completed", "options": options, "sources": source_info, "outputs": outputs, "completed": datetime.now().isoformat()})
+        self.entries[key] = entry
+        self.save()
@@ -0,0 +1,535 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    export_sinks.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `export_sinks.py`, provides the output sinks of `stdatalog_multi_export.py`.
+The data of each component is decoded once, as a sequence of dataframe chunks (the "Time" column, the data
+columns and, if the dataframes are labeled, a boolean column for each tag), and each chunk is written to all
+the selected sinks, so that many output formats are produced in a single pass over the .dat files.
+Most sinks write one component at a time; the UnicoAggregatedSink combines the components, so it buffers their
+chunks in a temporary folder and writes the aggregated files when it is closed.
+
+Sinks:
+- CsvTagSink: a file per tag group (a section of consecutive samples where a tag is active) and per component,
+  in a folder per tag (and in an "untagged" folder for the sections without tags), named as the files of
+  `stdatalog_data_export_by_tags.py`: {tag}/{tag}_{component}_dataLog_{group}.{csv|txt|tsv}.
+- TxtSink: a tab-separated TXT file per component, with the tags as 0/1 columns.
+- ParquetSink: a Parquet file per component, written one row group per chunk (requires pyarrow).
+- HDF5Sink: a single HDF5 file with a group per component and resizable datasets (requires h5py).
+- WavSink: a 16-bit PCM WAV file per microphone component.
+- UnicoAggregatedSink: the sensor components aggregated in a single ST MEMS Studio (Unico) file, or in a file
+  per tag group ("single_file" and "split_per_tags" aggregations of `stdatalog_to_unico.py`).
+"""
+
+import os
+import wave
+import shutil
+import tempfile
+import re
+import numpy as np
+import pandas as pd
+
+# Column separator of each text output format
+SEPARATORS = {"CSV": ',', "TXT": '\t', "TSV": '\t'}
+
+class ExportSink:
+    # Name of the sink in the command line options
+    NAME = None
+    # Packages needed by the sink
+    REQUIRED_PACKAGES = []
+    # True if the sink needs the labeled dataframes (with a column for each tag)
+    uses_tags = False
+
+    def __init__(self, output_folder, no_timestamps=False):
+        """
+        Initialize the ExportSink.
+
+        Args:
+            output_folder (str): The output folder.
+            no_timestamps (bool, optional): If True, the timestamps are not written. Defaults to False.
+        """
+        self.output_folder = output_folder
+        self.no_timestamps = no_timestamps
+        self.written_files = []
+
+    @staticmethod
+    def split_columns(df):
+        """
+        Split the columns of a dataframe chunk.
+
+        Args:
+            df (pd.DataFrame): The dataframe chunk.
+
+        Returns:
+            tuple: The data columns and the tag (boolean) columns. The "Time" column is in neither.
+        """
+        tag_columns = [c for c in df.columns[1:] if df[c].dtype == bool]
+        data_columns = [c for c in df.columns[1:] if c not in tag_columns]
+        return data_columns, tag_columns
+
+    def accepts(self, component_name, component_status):
+        """
+        Check whether the sink exports a component.
+
+        Args:
+            component_name (str): The component name.
+            component_status (dict): The component status.
+
+        Returns:
+            bool: True if the sink exports the component.
+        """
+        return True
+
+    def write(self, component_name, component_status, df):
+        """
+        Write a dataframe chunk of a component.
+
+        Args:
+            component_name (str): The component name.
+            component_status (dict): The component status.
+            df (pd.DataFrame): The dataframe chunk.
+        """
+        raise NotImplementedError
+
+    def close_component(self, component_name):
+        """
+        Close the outputs of a component, after its last chunk.
+
+        Args:
+            component_name (str): The component name.
+        """
+        pass
+
+    def close(self):
+        """
+        Close all the outputs of the sink.
+        """
+        pass
+
+class CsvTagSink(ExportSink):
+    NAME = "CSV_TAGS"
+    uses_tags = True
+
+    def __init__(self, output_folder, no_timestamps=False, with_untagged=False, out_format="CSV"):
+        super().__init__(output_folder, no_timestamps)
+        self.with_untagged = with_untagged
+        self.out_format = out_format.upper()
+        self.files = {} # Open file of the current group of each (component, tag)
+        self.n_groups = {} # Number of groups of each (component, tag)
+
+    def _write_groups(self, component_name, tag, active, df):
+        key = (component_name, tag)
+        sep = SEPARATORS[self.out_format]
+        # Runs of consecutive rows where the tag is active
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+        for start, end in zip(edges[0::2], edges[1::2]):
+            # A run at the start of the chunk continues the group still open at the end of the previous chunk
+            if start > 0 or key not in self.files:
+                self._close_group(key)
+                folder = os.path.join(self.output_folder, tag)
+                os.makedirs(folder, exist_ok=True)
+                group = self.n_groups.get(key, 0)
+                self.n_groups[key] = group + 1
+                path = os.path.join(folder, "{}_{}_dataLog_{}.{}".format(tag, component_name, group, self.out_format.lower()))
+                self.files[key] = open(path, 'w', newline='')
+                self.written_files.append(path)
+                df.iloc[start:end].to_csv(self.files[key], sep=sep, index=False)
+            else:
+                df.iloc[start:end].to_csv(self.files[key], sep=sep, index=False, header=False)
+        if len(active) > 0 and not active[-1]:
+            self._close_group(key)
+
+    def _close_group(self, key):
+        if key in self.files:
+            self.files.pop(key).close()
+
+    def write(self, component_name, component_status, df):
+        data_columns, tag_columns = self.split_columns(df)
+        columns = data_columns if self.no_timestamps else [df.columns[0]] + data_columns
+        for tag in tag_columns:
+            self._write_groups(component_name, tag, df[tag].to_numpy(), df[columns])
+        if self.with_untagged:
+            untagged = ~df[tag_columns].to_numpy().any(axis=1) if tag_columns else np.ones(len(df), dtype=bool)
+            self._write_groups(component_name, "untagged", untagged, df[columns])
+
+    def close_component(self, component_name):
+        for key in [key for key in self.files if key[0] == component_name]:
+            self._close_group(key)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+class TxtSink(ExportSink):
+    NAME = "TXT"
+
+    def __init__(self, output_folder, no_timestamps=False):
+        super().__init__(output_folder, no_timestamps)
+        self.files = {}
+
+    def write(self, component_name, component_status, df):
+        data_columns, tag_columns = self.split_columns(df)
+        columns = data_columns + tag_columns if self.no_timestamps else [df.columns[0]] + data_columns + tag_columns
+        df = df[columns].astype({tag: np.uint8 for tag in tag_columns})
+        if component_name not in self.files:
+            path = os.path.join(self.output_folder, component_name + ".txt")
+            self.files[component_name] = open(path, 'w', newline='')
+            self.written_files.append(path)
+            df.to_csv(self.files[component_name], sep='\t', index=False)
+        else:
+            df.to_csv(self.files[component_name], sep='\t', index=False, header=False)
+
+    def close_component(self, component_name):
+        if component_name in self.files:
+            self.files.pop(component_name).close()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+class ParquetSink(ExportSink):
+    NAME = "PARQUET"
+    REQUIRED_PACKAGES = ["pyarrow"]
+
+    def __init__(self, output_folder, no_timestamps=False):
+        super().__init__(output_folder, no_timestamps)
+        self.writers = {}
+
+    def write(self, component_name, component_status, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self.no_timestamps:
+            df = df.iloc[:, 1:]
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if component_name not in self.writers:
+            path = os.path.join(self.output_folder, component_name + ".parquet")
+            self.writers[component_name] = pq.ParquetWriter(path, table.schema)
+            self.written_files.append(path)
+        self.writers[component_name].write_table(table)
+
+    def close_component(self, component_name):
+        if component_name in self.writers:
+            self.writers.pop(component_name).close()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+class HDF5Sink(ExportSink):
+    NAME = "HDF5"
+    REQUIRED_PACKAGES = ["h5py"]
+
+    def __init__(self, output_folder, no_timestamps=False, file_name="export.h5"):
+        super().__init__(output_folder, no_timestamps)
+        self.path = os.path.join(output_folder, file_name)
+        self.file = None
+
+    @staticmethod
+    def _append(group, name, values):
+        if name not in group:
+            group.create_dataset(name, data=values, maxshape=(None,) + values.shape[1:], chunks=True)
+        else:
+            dataset = group[name]
+            dataset.resize(dataset.shape[0] + len(values), axis=0)
+            dataset[-len(values):] = values
+
+    def write(self, component_name, component_status, df):
+        import h5py
+        if self.file is None:
+            self.file = h5py.File(self.path, 'w')
+            self.written_files.append(self.path)
+        data_columns, tag_columns = self.split_columns(df)
+        if component_name not in self.file:
+            group = self.file.create_group(component_name)
+            group.attrs["columns"] = data_columns
+            group.attrs["tags"] = tag_columns
+        group = self.file[component_name]
+        if not self.no_timestamps:
+            self._append(group, "time", df.iloc[:, 0].to_numpy())
+        self._append(group, "data", df[data_columns].to_numpy())
+        for tag in tag_columns:
+            self._append(group, "tags/" + tag, df[tag].to_numpy())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class WavSink(ExportSink):
+    NAME = "WAV"
+    # Standard audio sample rates, the rate measured on the timestamps is rounded to the nearest one
+    SAMPLE_RATES = [8000, 16000, 22050, 32000, 44100, 48000, 96000, 192000]
+    # Number of samples needed to measure the sample rate, shorter first chunks are buffered
+    MIN_RATE_SAMPLES = 2
+
+    def __init__(self, output_folder, no_timestamps=False):
+        super().__init__(output_folder, no_timestamps)
+        self.files = {}
+        self.pending = {} # First chunks of each component, buffered until the sample rate can be measured
+
+    def accepts(self, component_name, component_status):
+        return component_name.endswith("_mic")
+
+    @staticmethod
+    def get_sample_rate(times, component_status=None):
+        """
+        Get the sample rate of a chunk from its timestamps, rounded to the nearest standard audio sample rate if it is within 1%.
+
+        Args:
+            times (np.ndarray): The timestamps of the chunk.
+            component_status (dict, optional): The component status, whose output data rate is used if the chunk has less than 2 samples. Defaults to None.
+
+        Returns:
+            int: The sample rate.
+        """
+        if len(times) < WavSink.MIN_RATE_SAMPLES:
+            status = component_status or {}
+            rate = status.get("measodr") or status.get("odr") or WavSink.SAMPLE_RATES[0]
+        else:
+            rate = 1 / np.median(np.diff(times))
+        nearest = min(WavSink.SAMPLE_RATES, key=lambda r: abs(r - rate))
+        return nearest if abs(nearest - rate) < 0.01 * nearest else int(round(rate))
+
+    def _open(self, component_name, component_status, df):
+        data_columns, _ = self.split_columns(df)
+        path = os.path.join(self.output_folder, component_name + ".wav")
+        wav = wave.open(path, 'wb')
+        wav.setnchannels(len(data_columns))
+        wav.setsampwidth(2)
+        wav.setframerate(self.get_sample_rate(df.iloc[:, 0].to_numpy(), component_status))
+        self.files[component_name] = wav
+        self.written_files.append(path)
+
+    def _write_frames(self, component_name, component_status, df):
+        data_columns, _ = self.split_columns(df)
+        samples = df[data_columns].to_numpy()
+        if not np.issubdtype(samples.dtype, np.integer):
+            # Scaled data: back to the raw sensor values
+            samples = np.rint(samples / component_status.get("sensitivity", 1))
+        samples = np.clip(samples, -32768, 32767).astype('<i2')
+        self.files[component_name].writeframes(samples.tobytes())
+
+    def write(self, component_name, component_status, df):
+        if component_name not in self.files:
+            if component_name in self.pending:
+                df = pd.concat([self.pending.pop(component_name)[0], df], ignore_index=True)
+            if len(df) < WavSink.MIN_RATE_SAMPLES:
+                self.pending[component_name] = (df, component_status)
+                return
+            self._open(component_name, component_status, df)
+        self._write_frames(component_name, component_status, df)
+
+    def _flush_pending(self, component_name):
+        if component_name in self.pending:
+            # The component has less samples than needed to measure the sample rate
+            df, component_status = self.pending.pop(component_name)
+            self._open(component_name, component_status, df)
+            self._write_frames(component_name, component_status, df)
+
+    def close_component(self, component_name):
+        self._flush_pending(component_name)
+        if component_name in self.files:
+            self.files.pop(component_name).close()
+
+    def close(self):
+        for component_name in list(self.pending):
+            self.close_component(component_name)
+        for wav in self.files.values():
+            wav.close()
+        self.files = {}
+
+class NearestSampleReader:
+    """
+    Reads the buffered chunks of a component at the times of another component, sample by sample.
+    """
+    def __init__(self, paths, columns):
+        """
+        Initialize the NearestSampleReader.
+
+        Args:
+            paths (list): The paths of the buffered chunks, in time order.
+            columns (list): The data columns to read.
+        """
+        self.paths = list(paths)
+        self.columns = columns
+        self.times = np.empty(0)
+        self.values = np.empty((0, len(columns)))
+
+    def read(self, times):
+        """
+        Read the samples nearest to the given times.
+
+        Args:
+            times (np.ndarray): Increasing times, after the times of the previous read.
+
+        Returns:
+            np.ndarray: The nearest sample of each time (a row per time).
+        """
+        # Load the chunks up to the first sample after the last time
+        while len(self.paths) > 0 and (len(self.times) == 0 or self.times[-1] < times[-1]):
+            df = pd.read_pickle(self.paths.pop(0))
+            self.times = np.concatenate([self.times, df.iloc[:, 0].to_numpy()])
+            self.values = np.concatenate([self.values, df[self.columns].to_numpy()])
+        if len(self.times) == 1:
+            nearest = np.zeros(len(times), dtype=int)
+        else:
+            after = np.searchsorted(self.times, times).clip(1, len(self.times) - 1)
+            nearest = after - (np.abs(self.times[after - 1] - times) <= np.abs(self.times[after] - times))
+        values = self.values[nearest]
+        # The samples before the last one preceding the last time are not the nearest to any later time
+        keep = max(np.searchsorted(self.times, times[-1], side='right') - 1, 0)
+        self.times = self.times[keep:]
+        self.values = self.values[keep:]
+        return values
+
+class UnicoAggregatedSink(ExportSink):
+    NAME = "UNICO"
+    # Units of the 'mlc_tool' column labels, with the scale from the unit of the exported data
+    MLC_TOOL_UNITS = {"g": ("mg", 1000), "mdps": ("dps", 0.001), "gauss": ("mG", 1000)}
+
+    def __init__(self, output_folder, with_timestamps=False, aggregation="single_file", out_format="CSV", columns_labels="default",
+                 use_datalog_tags=False, with_untagged=False, file_name="unico_aggregated"):
+        """
+        Initialize the UnicoAggregatedSink.
+
+        The rows of the aggregated files are the samples of the component with the most samples, each other component
+        contributes its sample nearest in time.
+
+        Args:
+            output_folder (str): The output folder.
+            with_timestamps (bool, optional): If True, the timestamps are written. Defaults to False.
+            aggregation (str, optional): "single_file" or "split_per_tags" (a file per tag group, in a folder per tag). Defaults to "single_file".
+            out_format (str, optional): "CSV", "TXT" or "TSV". Defaults to "CSV".
+            columns_labels (str, optional): "default" (the component name and the data column) or "mlc_tool" (e.g. "A_X [mg]"). Defaults to "default".
+            use_datalog_tags (bool, optional): If True, the tags are written as 0/1 columns in the single file. Defaults to False.
+            with_untagged (bool, optional): If True, the sections without tags are written in an "untagged" folder by the "split_per_tags" aggregation. Defaults to False.
+            file_name (str, optional): The name of the aggregated file, without extension. Defaults to "unico_aggregated".
+        """
+        super().__init__(output_folder, not with_timestamps)
+        self.aggregation = aggregation
+        self.out_format = out_format.upper()
+        self.columns_labels = columns_labels
+        self.use_datalog_tags = use_datalog_tags
+        self.file_name = file_name
+        # The tag groups of the aggregated rows are written as the groups of a component named file_name
+        self.tag_sink = CsvTagSink(output_folder, not with_timestamps, with_untagged, out_format) if aggregation == "split_per_tags" else None
+        self.uses_tags = self.tag_sink is not None or use_datalog_tags
+        self.buffer_folder = None
+        self.chunks = {} # Buffered chunk files of each component
+        self.n_samples = {} # Number of samples of each component
+        self.labels = {} # Data columns, labels and scales of each component
+
+    def accepts(self, component_name, component_status):
+        # Sensors only: no algorithm outputs, and no microphones, whose audio data rate would set the rows of the files
+        return component_status.get("c_type", 0) == 0 and not component_name.endswith(("_ispu", "_mlc", "_mic"))
+
+    def _get_labels(self, component_name, data_columns, dtype):
+        labels = []
+        scales = []
+        for column in data_columns:
+            label = "{}_{}".format(component_name, column)
+            scale = 1
+            match = re.match(r"^(.*?)\s*\[(.*)\]$", column)
+            if self.columns_labels == "mlc_tool" and match is not None:
+                name, unit = match.groups()
+                if unit in self.MLC_TOOL_UNITS and np.issubdtype(dtype, np.floating):
+                    unit, scale = self.MLC_TOOL_UNITS[unit]
+                label = "{} [{}]".format(name.upper(), unit)
+            labels.append(label)
+            scales.append(scale)
+        return data_columns, labels, np.array(scales)
+
+    def write(self, component_name, component_status, df):
+        if self.buffer_folder is None:
+            self.buffer_folder = tempfile.mkdtemp(prefix=".unico_", dir=self.output_folder)
+        if component_name not in self.chunks:
+            data_columns, _ = self.split_columns(df)
+            self.labels[component_name] = self._get_labels(component_name, data_columns, df[data_columns].to_numpy().dtype)
+            self.chunks[component_name] = []
+            self.n_samples[component_name] = 0
+        path = os.path.join(self.buffer_folder, "{}_{}.pkl".format(component_name, len(self.chunks[component_name])))
+        df.to_pickle(path)
+        self.chunks[component_name].append(path)
+        self.n_samples[component_name] += len(df)
+
+    def _write_aggregated(self):
+        names = list(self.chunks)
+        all_labels = [label for name in names for label in self.labels[name][1]]
+        if len(set(all_labels)) < len(all_labels):
+            # Same 'mlc_tool' labels from different components: the component name disambiguates them
+            for name in names:
+                data_columns, _, scales = self.labels[name]
+                self.labels[name] = (data_columns, ["{}_{}".format(name, label) for label in self.labels[name][1]], scales)
+        # The rows of the aggregated files are the samples of the component with the most samples
+        base = max(names, key=lambda name: self.n_samples[name])
+        readers = {name: NearestSampleReader(self.chunks[name], self.labels[name][0]) for name in names if name != base}
+        file = None
+        try:
+            for path in self.chunks[base]:
+                df = pd.read_pickle(path)
+                times = df.iloc[:, 0].to_numpy()
+                _, tag_columns = self.split_columns(df)
+                columns = {"Time": times}
+                for name in names:
+                    data_columns, labels, scales = self.labels[name]
+                    values = df[data_columns].to_numpy() if name == base else readers[name].read(times)
+                    if np.any(scales != 1):
+                        values = values * scales
+                    columns.update(zip(labels, values.T))
+                out = pd.DataFrame(columns)
+                if self.tag_sink is not None:
+                    for tag in tag_columns:
+                        out[tag] = df[tag].to_numpy()
+                    self.tag_sink.write(self.file_name, None, out)
+                    continue
+                if self.use_datalog_tags:
+                    for tag in tag_columns:
+                        out[tag] = df[tag].to_numpy().astype(np.uint8)
+                if self.no_timestamps:
+                    out = out.iloc[:, 1:]
+                if file is None:
+                    path = os.path.join(self.output_folder, "{}.{}".format(self.file_name, self.out_format.lower()))
+                    file = open(path, 'w', newline='')
+                    self.written_files.append(path)
+                    out.to_csv(file, sep=SEPARATORS[self.out_format], index=False)
+                else:
+                    out.to_csv(file, sep=SEPARATORS[self.out_format], index=False, header=False)
+        finally:
+            if file is not None:
+                file.close()
+            if self.tag_sink is not None:
+                self.tag_sink.close()
+                self.written_files.extend(self.tag_sink.written_files)
+
+    def close(self):
+        if self.buffer_folder is None:
+            return
+        try:
+            if len(self.chunks) > 0:
+                self._write_aggregated()
+        finally:
+            shutil.rmtree(self.buffer_folder, ignore_errors=True)
+            self.buffer_folder = None
+            self.chunks = {}
+
+# Sink classes by command line name
+SINKS = {sink.NAME: sink for sink in [CsvTagSink, TxtSink, ParquetSink, HDF5Sink, WavSink, UnicoAggregatedSink]}
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    parquet_cache.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `parquet_cache.py`, provides the managed Parquet cache of `stdatalog_plot_large.py`.
+The data of a component is converted to Parquet in time partitions of fixed duration, and each partition is
+stored in the cache folder under a key derived from:
+- the source files of the component (the .dat file and the acquisition .json files) with their size and
+  modification time, so that a changed acquisition never shows stale data,
+- the conversion options (raw_data, labeled).
+A plot of a time window converts only the partitions of the window that are not in the cache yet, so repeated
+plots of different windows of the same acquisition reuse the partitions already converted.
+The cache size is bounded: when it exceeds the maximum size, the least recently used partitions are removed
+(each cache hit refreshes the modification time of the partition file).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from export_manifest import ExportManifest
+
+class ParquetCache:
+    META_FILE_NAME = "meta.json"
+
+    def __init__(self, cache_folder, max_size, partition_duration=60, log=None):
+        """
+        Initialize the ParquetCache.
+
+        Args:
+            cache_folder (str): The cache folder (created if it does not exist).
+            max_size (int): The maximum size of the cache, in bytes.
+            partition_duration (int, optional): The duration of a time partition, in seconds. Defaults to 60.
+            log (logging.Logger, optional): The logger. Defaults to None.
+        """
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self.partition_duration = partition_duration
+        self.log = log
+        os.makedirs(cache_folder, exist_ok=True)
+
+    @staticmethod
+    def get_key(acq_folder, component_name, raw_data, labeled, partition_duration):
+        """
+        Get the cache key of the data of a component converted with some options.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+            raw_data (bool): The raw_data conversion option.
+            labeled (bool): The labeled conversion option.
+            partition_duration (int): The duration of a time partition, in seconds.
+
+        Returns:
+            str: The cache key.
+        """
+        sources = {}
+        for path in ExportManifest.get_source_files(acq_folder, component_name):
+            stat = os.stat(path)
+            sources[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+        description = {"acquisition": os.path.abspath(acq_folder), "component": component_name, "sources": sources,
+                       "raw_data": raw_data, "labeled": labeled, "partition_duration": partition_duration}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _load_meta(self, key_folder):
+        path = os.path.join(key_folder, ParquetCache.META_FILE_NAME)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save_meta(self, key_folder, meta):
+        path = os.path.join(key_folder, ParquetCache.META_FILE_NAME)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(path + ".tmp", path)
+
+    def get_partitions(self, convert_partition, acq_folder, component_name, start_time, end_time, raw_data, labeled, acquisition_end=None):
+        """
+        Get the Parquet partition files of a time window, converting the missing ones.
+
+        Args:
+            convert_partition (callable): A function (start_time, end_time, output_folder) that converts a time range of the
+                component data to a "<component_name>.parquet" file in output_folder (no file if the range has no data).
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+            start_time (int): The start time of the window, in seconds.
+            end_time (int): The end time of the window, in seconds, -1 for the end of the acquisition.
+            raw_data (bool): The raw_data conversion option.
+            labeled (bool): The labeled conversion option.
+            acquisition_end (float, optional): The end time of the component data, if known. Defaults to None, that is,
+                the partitions are converted until the first empty one.
+
+        Returns:
+            list: The paths of the partition files of the window, in time order. Each file holds the rows with
+                Time in [partition start, partition end), the first and the last may hold rows out of the window.
+        """
+        key = ParquetCache.get_key(acq_folder, component_name, raw_data, labeled, self.partition_duration)
+        key_folder = os.path.join(self.cache_folder, key)
+        os.makedirs(key_folder, exist_ok=True)
+        meta = self._load_meta(key_folder)
+        if not meta:
+            meta = {"acquisition": os.path.abspath(acq_folder), "component": component_name, "raw_data": raw_data, "labeled": labeled,
+                    "partition_duration": self.partition_duration, "partitions": {}, "end_partition": None}
+        duration = meta["partition_duration"]
+        if acquisition_end is not None and meta["end_partition"] is None:
+            meta["end_partition"] = int(acquisition_end // duration)
+
+        partitions = []
+        index = int(start_time // duration)
+        n_hits = n_converted = 0
+        while True:
+            if end_time != -1 and index * duration >= end_time:
+                break
+            if meta["end_partition"] is not None and index > meta["end_partition"]:
+                break
+            name = str(index)
+            if name in meta["partitions"] and (meta["partitions"][name] is None or os.path.exists(os.path.join(key_folder, meta["partitions"][name]))):
+                n_hits += 1
+                file_name = meta["partitions"][name]
+                if file_name is not None:
+                    # Refresh the last access time of the partition
+                    os.utime(os.path.join(key_folder, file_name))
+            else:
+                n_converted += 1
+                file_name = self._convert(convert_partition, key_folder, component_name, index, duration)
+                meta["partitions"][name] = file_name
+                if file_name is None and meta["end_partition"] is None:
+                    # The data ended in the previous partition
+                    meta["end_partition"] = index - 1
+                self._save_meta(key_folder, meta)
+            if file_name is not None:
+                partitions.append(os.path.join(key_folder, file_name))
+            index += 1
+
+        if self.log is not None:
+            self.log.info("{}: {} cached partitions, {} converted".format(component_name, n_hits, n_converted))
+        self.evict(keep=partitions)
+        return partitions
+
+    def _convert(self, convert_partition, key_folder, component_name, index, duration):
+        import pyarrow.parquet as pq
+        tmp_folder = os.path.join(key_folder, "tmp_{}".format(index))
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        os.makedirs(tmp_folder)
+        try:
+            convert_partition(index * duration, (index + 1) * duration, tmp_folder)
+            tmp_path = os.path.join(tmp_folder, component_name + ".parquet")
+            if not os.path.exists(tmp_path):
+                return None
+            # Keep only the rows of the partition, the conversion may include the samples on its boundaries
+            table = pq.read_table(tmp_path)
+            times = table.column("Time").to_numpy()
+            mask = (times >= index * duration) & (times < (index + 1) * duration)
+            if not mask.any():
+                return None
+            file_name = "part_{:06d}.parquet".format(index)
+            pq.write_table(table.filter(mask), os.path.join(key_folder, file_name))
+            return file_name
+        finally:
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+
+    def get_size(self):
+        """
+        Get the size of the cache.
+
+        Returns:
+            int: The total size of the partition files, in bytes.
+        """
+        return sum(size for _, _, size in self._list_partition_files())
+
+    def _list_partition_files(self):
+        files = []
+        for root, _, file_names in os.walk(self.cache_folder):
+            for file_name in file_names:
+                if file_name.endswith(".parquet") and file_name.startswith("part_"):
+                    path = os.path.join(root, file_name)
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def evict(self, keep=()):
+        """
+        Remove the least recently used partition files until the cache size is below its maximum size.
+
+        Args:
+            keep (list, optional): The partition files that must not be removed (e.g. the ones of the current plot). Defaults to ().
+        """
+        files = sorted(self._list_partition_files())
+        size = sum(f[2] for f in files)
+        keep = set(os.path.abspath(path) for path in keep)
+        for _, path, file_size in files:
+            if size <= self.max_size:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            os.remove(path)
+            size -= file_size
+            # Forget the partition, it is converted again at the next use
+            key_folder = os.path.dirname(path)
+            meta = self._load_meta(key_folder)
+            for name, file_name in list(meta.get("partitions", {}).items()):
+                if file_name == os.path.basename(path):
+                    del meta["partitions"][name]
+            if not any(f.startswith("part_") for f in os.listdir(key_folder)):
+                # No partition left (e.g. the acquisition changed and the key is stale)
+                shutil.rmtree(key_folder, ignore_errors=True)
+            elif meta:
+                self._save_meta(key_folder, meta)
+        if size > self.max_size and self.log is not None:
+            self.log.warning("Parquet cache size ({:.1f} MB) exceeds its maximum size, the current plot needs more space".format(size / 2**20))
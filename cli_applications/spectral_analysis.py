@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    spectral_analysis.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This module, `spectral_analysis.py`, provides the frequency analysis of `stdatalog_plot.py` (-fp option) for the
+inertial sensors and the microphones of HSD v2 acquisitions.
+The samples of the time window are split in Hann-windowed segments overlapping by half their length (nperseg // 2 samples, as scipy.signal.welch), and the segments are processed
+in blocks by a pool of worker processes. Each worker reads its block from the memory-mapped .dat file (see
+`dat_memmap_reader.py`), so the samples are never copied between processes. Each block returns:
+- the sum of the power spectral densities of its segments: the Welch PSD is the sum of all the blocks divided by
+  the number of segments, exactly as if it was computed in a single pass,
+- the STFT spectrogram columns of its segments, each column being the mean power of a group of consecutive segments,
+  so that the spectrogram of long acquisitions has at most `max_columns` columns.
+The blocks are computed in an interleaved order (first, middle, quarters, ...), so that the partial results are a
+preview of the whole time window while the remaining blocks are still computing.
+The results are cached in the `.stdatalog_index` folder of the acquisition (see `dat_time_index.py`), keyed by the
+size and modification time of the source files, the time window and the analysis parameters.
+"""
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dat_memmap_reader import DatMemmapReader
+from dat_time_index import DatTimeIndex
+from export_manifest import ExportManifest
+
+# Readers opened by a worker process, by (acquisition folder, component name)
+worker_readers = {}
+
+def compute_block(acq_folder, component_name, raw_data, first_sample, n_segments, nperseg, step, segments_per_column, fs):
+    """
+    Compute the PSD sum and the spectrogram columns of a block of segments. It runs in a worker process.
+
+    Args:
+        acq_folder (str): The acquisition folder.
+        component_name (str): The component name.
+        raw_data (bool): If True, the raw samples are used, otherwise they are multiplied by sensitivity.
+        first_sample (int): The index of the first sample of the block.
+        n_segments (int): The number of segments of the block.
+        nperseg (int): The number of samples of a segment.
+        step (int): The number of samples between the start of two consecutive segments.
+        segments_per_column (int): The number of segments averaged in a spectrogram column.
+        fs (float): The sample rate, in Hz.
+
+    Returns:
+        tuple: The sum of the PSDs of the segments, with shape (n_frequencies, dim), and the spectrogram columns,
+            with shape (n_columns, n_frequencies, dim).
+    """
+    key = (acq_folder, component_name)
+    if key not in worker_readers:
+        worker_readers[key] = DatMemmapReader(acq_folder, component_name, use_index=False)
+    reader = worker_readers[key]
+    samples = reader.get_samples(first_sample, first_sample + (n_segments - 1) * step + nperseg, raw_data).astype(np.float64)
+    # Segments with shape (n_segments, dim, nperseg), views of the samples
+    segments = np.lib.stride_tricks.sliding_window_view(samples, nperseg, axis=0)[::step]
+    window = np.hanning(nperseg + 1)[:-1]
+    spectrum = np.fft.rfft((segments - segments.mean(axis=-1, keepdims=True)) * window, axis=-1)
+    # One-sided power spectral density
+    power = (spectrum.real ** 2 + spectrum.imag ** 2) / (fs * np.sum(window ** 2))
+    power[..., 1:(nperseg + 1) // 2] *= 2
+    power = power.transpose(0, 2, 1)
+    column_starts = np.arange(0, n_segments, segments_per_column)
+    counts = np.diff(np.append(column_starts, n_segments))
+    columns = np.add.reduceat(power, column_starts, axis=0) / counts[:, None, None]
+    return power.sum(axis=0), columns
+
+class SpectralAnalysis:
+    # Components with frequency plots: inertial sensors and microphones
+    COMPONENT_SUFFIXES = ("_acc", "_gyro", "_mic")
+    CACHE_VERSION = 2
+
+    def __init__(self, acq_folder, component_name, start_time=0, end_time=-1, raw_data=False, nperseg=1024, max_columns=1000, block_segments=256, log=None):
+        """
+        Prepare the frequency analysis of a component in a time window.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+            start_time (float, optional): The start time in seconds. Defaults to 0.
+            end_time (float, optional): The end time in seconds, -1 for the end of the acquisition. Defaults to -1.
+            raw_data (bool, optional): If True, the raw samples are used, otherwise they are multiplied by sensitivity. Defaults to False.
+            nperseg (int, optional): The number of samples of a segment (the FFT size). Defaults to 1024.
+            max_columns (int, optional): The maximum number of columns of the spectrogram. Defaults to 1000.
+            block_segments (int, optional): The number of segments processed by a worker at a time. Defaults to 256.
+            log (logging.Logger, optional): The logger. Defaults to None.
+
+        Raises:
+            ValueError: If the component is not supported by DatMemmapReader or the time window holds less than a segment.
+        """
+        self.acq_folder = acq_folder
+        self.component_name = component_name
+        self.raw_data = raw_data
+        self.log = log
+        self.reader = DatMemmapReader(acq_folder, component_name, log=log)
+        self.start, self.end = self.reader.get_sample_range(start_time, end_time)
+        if self.end - self.start < max(nperseg, 2):
+            raise ValueError("{}: less than {} samples in the selected time window".format(component_name, nperseg))
+        self.dim = self.reader.dim
+        self.nperseg = nperseg
+        # Overlap of nperseg // 2 samples, as scipy.signal.welch, also for an odd nperseg
+        self.step = nperseg - nperseg // 2
+        self.n_segments = (self.end - self.start - nperseg) // self.step + 1
+        self.segments_per_column = -(-self.n_segments // max_columns)
+        self.n_columns = -(-self.n_segments // self.segments_per_column)
+        # Each block holds whole spectrogram columns
+        columns_per_block = max(1, block_segments // self.segments_per_column)
+        self.blocks = [(c, min(c + columns_per_block, self.n_columns)) for c in range(0, self.n_columns, columns_per_block)]
+
+        times = self.reader.get_sample_times([self.start, self.end - 1])
+        self.fs = (self.end - 1 - self.start) / (times[1] - times[0])
+        self.frequencies = np.fft.rfftfreq(nperseg, 1 / self.fs)
+        # Time of each spectrogram column: the center of its segments
+        first_segments = np.arange(self.n_columns) * self.segments_per_column
+        last_segments = np.minimum(first_segments + self.segments_per_column, self.n_segments) - 1
+        centers = self.start + (first_segments + last_segments) * self.step // 2 + nperseg // 2
+        self.times = self.reader.get_sample_times(centers)
+
+        self.psd_sum = np.zeros((len(self.frequencies), self.dim))
+        self.psd_segments = 0
+        self.spectrogram = np.full((self.n_columns, len(self.frequencies), self.dim), np.nan, dtype=np.float32)
+        self.n_done = 0
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_supported(acq_folder, component_name):
+        """
+        Check whether a component has a frequency analysis.
+
+        Args:
+            acq_folder (str): The acquisition folder.
+            component_name (str): The component name.
+
+        Returns:
+            bool: True if the component is an inertial sensor or a microphone supported by DatMemmapReader.
+        """
+        return component_name.endswith(SpectralAnalysis.COMPONENT_SUFFIXES) and DatMemmapReader.is_supported(acq_folder, component_name)
+
+    @staticmethod
+    def get_preview_order(n):
+        """
+        Get an order of n items where each prefix is spread over the whole range (0, n/2, n/4, 3n/4, ...).
+
+        Args:
+            n (int): The number of items.
+
+        Returns:
+            list: The item indices.
+        """
+        order, seen = [], set()
+        stride = 1 << max(n - 1, 0).bit_length()
+        while stride >= 1:
+            for i in range(0, n, stride):
+                if i not in seen:
+                    seen.add(i)
+                    order.append(i)
+            stride //= 2
+        return order
+
+    def get_cache_path(self):
+        """
+        Get the path of the cache file of the analysis.
+
+        Returns:
+            str: The cache file path.
+        """
+        sources = {}
+        for path in ExportManifest.get_source_files(self.acq_folder, self.component_name):
+            stat = os.stat(path)
+            sources[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+        description = {"version": SpectralAnalysis.CACHE_VERSION, "sources": sources, "start": self.start, "end": self.end, "raw_data": self.raw_data,
+                       "nperseg": self.nperseg, "step": self.step, "segments_per_column": self.segments_per_column}
+        key = hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:16]
+        return os.path.join(self.acq_folder, DatTimeIndex.FOLDER_NAME, "{}_spectrum_{}.npz".format(self.component_name, key))
+
+    def load_cache(self):
+        """
+        Load the results of the analysis from its cache file, if any.
+
+        Returns:
+            bool: True if the results were loaded.
+        """
+        path = self.get_cache_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                self.psd_sum = data["psd_sum"]
+                self.psd_segments = int(data["psd_segments"])
+                self.spectrogram = data["spectrogram"]
+        except (OSError, ValueError, KeyError):
+            return False
+        self.n_done = len(self.blocks)
+        return True
+
+    def save_cache(self):
+        """
+        Save the results of the analysis to its cache file. If the acquisition folder is read-only, the results are not cached.
+        """
+        path = self.get_cache_path()
+        tmp_path = path + ".tmp.npz"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.savez(tmp_path, psd_sum=self.psd_sum, psd_segments=self.psd_segments, spectrogram=self.spectrogram)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            if self.log is not None:
+                self.log.warning("Spectral analysis of {} not cached: {}".format(self.component_name, err))
+
+    def _get_block_args(self, block):
+        first_column, last_column = self.blocks[block]
+        first_segment = first_column * self.segments_per_column
+        n_segments = min(last_column * self.segments_per_column, self.n_segments) - first_segment
+        return (self.acq_folder, self.component_name, self.raw_data, self.start + first_segment * self.step, n_segments,
+                self.nperseg, self.step, self.segments_per_column, self.fs)
+
+    def _add_result(self, block, result):
+        psd_sum, columns = result
+        first_column, last_column = self.blocks[block]
+        with self.lock:
+            self.psd_sum += psd_sum
+            self.psd_segments += min(last_column * self.segments_per_column, self.n_segments) - first_column * self.segments_per_column
+            self.spectrogram[first_column:last_column] = columns
+            self.n_done += 1
+
+    def run(self, jobs=None, use_cache=True):
+        """
+        Compute the analysis. The partial results can be read from other threads while it runs (see get_psd, get_spectrogram).
+
+        Args:
+            jobs (int, optional): The number of worker processes, 1 to compute in the calling process. Defaults to None, that is, the number of CPUs.
+            use_cache (bool, optional): If True, the results are loaded from (or saved to) the cache. Defaults to True.
+        """
+        if use_cache and self.load_cache():
+            if self.log is not None:
+                self.log.info("{}: spectral analysis loaded from cache".format(self.component_name))
+            return
+        order = SpectralAnalysis.get_preview_order(len(self.blocks))
+        if jobs == 1:
+            for block in order:
+                if self.cancelled:
+                    break
+                self._add_result(block, compute_block(*self._get_block_args(block)))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {executor.submit(compute_block, *self._get_block_args(block)): block for block in order}
+                for future in as_completed(futures):
+                    if self.cancelled:
+                        for f in futures:
+                            f.cancel()
+                        break
+                    self._add_result(futures[future], future.result())
+        if use_cache and self.is_done():
+            self.save_cache()
+
+    def cancel(self):
+        """
+        Stop the computation; the blocks already submitted to the workers are completed.
+        """
+        self.cancelled = True
+
+    def is_done(self):
+        """
+        Returns:
+            bool: True if all the blocks are computed.
+        """
+        return self.n_done == len(self.blocks)
+
+    def get_progress(self):
+        """
+        Returns:
+            float: The fraction of the blocks computed, between 0 and 1.
+        """
+        return self.n_done / len(self.blocks)
+
+    def get_psd(self):
+        """
+        Get the Welch PSD, from the blocks computed so far.
+
+        Returns:
+            tuple: The frequencies (Hz) and the PSD of each axis, with shape (n_frequencies, dim).
+        """
+        with self.lock:
+            return self.frequencies, self.psd_sum / max(self.psd_segments, 1)
+
+    def get_spectrogram(self):
+        """
+        Get the spectrogram, from the blocks computed so far (the columns not computed yet are NaN).
+
+        Returns:
+            tuple: The column times (s), the frequencies (Hz) and the power of each axis in dB, with shape (n_columns, n_frequencies, dim).
+        """
+        with self.lock:
+            spectrogram = self.spectrogram.copy()
+        return self.times, self.frequencies, 10 * np.log10(spectrogram + np.finfo(np.float32).tiny)
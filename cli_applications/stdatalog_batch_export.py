@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    stdatalog_batch_export.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This script, `stdatalog_batch_export.py`, is designed to export data from many acquisition folders
+generated by STMicroelectronics' HSDatalog tool in a single run. The acquisition folders are discovered
+under a root directory (or matched by a glob pattern) and validated with HSDatalog.validate_hsd_folder,
+then they are exported by a pool of worker processes with the same options of `stdatalog_data_export.py`.
+It uses Click for command-line interface options and logs information and errors during execution.
+
+Key Features:
+- Discover all the valid acquisition folders under a root directory, or matching a glob pattern.
+- Export the acquisitions in parallel worker processes. Each worker imports the SDK, uploads the custom Device
+  Template Model (if any) and creates the HSDatalog factory once, and then exports many acquisitions.
+- The acquisitions are scheduled grouped by board and firmware ID, so that consecutive acquisitions handled by a
+  worker share the same Device Template Model.
+- Incremental exports: each output folder has its own export manifest (see `export_manifest.py`), acquisitions
+  already exported with the same options are skipped.
+- Export data in different formats (TXT, CSV, TSV, PARQUET, HDF5).
+- Per-acquisition summary of the exported components and of the errors.
+"""
+
+import sys
+import os
+import glob
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add the STDatalog SDK root directory to the sys.path to access the SDK packages
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import click
+from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
+import stdatalog_core.HSD_utils.logger as logger
+from stdatalog_core.HSD.HSDatalog import HSDatalog
+from export_manifest import ExportManifest
+from stdatalog_data_export import get_export_options, get_manifest_key
+
+# Set up the application logger with a specified log file
+log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
+
+# Define the script version for reference
+script_version = "1.0.0"
+
+# HSDatalog factory of the worker process, created once by init_worker
+worker_hsd_factory = None
+
+# Define a callback function to show help information and example usage of the script
+def show_help(ctx, param, value):
+    if value and not ctx.resilient_parsing:
+        # Display the help information for the command
+        click.secho(ctx.get_help(), color=ctx.color)
+        # Display examples of script execution
+        click.secho("\n-> Script execution examples:")
+        # Example: Export all the acquisitions found under a root folder
+        click.secho("   python stdatalog_batch_export.py Root_Folder_Path", fg='cyan')
+        # Example: Export the acquisitions matching a glob pattern with 8 worker processes
+        click.secho("   python stdatalog_batch_export.py \"Root_Folder_Path/DL2_000*\" -j 8", fg='cyan')
+        # Example: Export all the acquisitions in PARQUET format to an output root folder
+        click.secho("   python stdatalog_batch_export.py Root_Folder_Path -f PARQUET -o Output_Root_Folder_Path", fg='cyan')
+        # Example: Export a specific sensor of all the acquisitions, between 3 and 6 seconds
+        click.secho("   python stdatalog_batch_export.py Root_Folder_Path -s SENSOR_NAME -st 3 -et 6", fg='cyan')
+        # Example: Export all the acquisitions again, ignoring the export manifests of a previous run
+        click.secho("   python stdatalog_batch_export.py Root_Folder_Path -fe", fg='cyan')
+        ctx.exit()
+
+# Define the click command with options for the batch export script
+@click.command()
+@click.argument('acq_root')
+@click.option('-o', '--output_root', help="Output root folder, each acquisition is exported to a subfolder with its path relative to the root (default: an \"_Exported\" folder next to each acquisition)")
+@click.option('-f', '--file_format', help="Select exported data format", type=click.Choice(['TXT', 'CSV', 'TSV', 'PARQUET', 'HDF5'], case_sensitive=False), default="CSV")
+@click.option('-s', '--sensor_name', help="Sensor Name - use \"all\" to extract all active sensors data, otherwise select a specific sensor by name", default='all')
+@click.option('-st','--start_time', help="Start Time - Data conversion will start from this time (seconds)", type=int, default=0)
+@click.option('-et','--end_time', help="End Time - Data conversion will end up in this time (seconds)", type=int, default=-1)
+@click.option('-l', '--labeled', is_flag=True, help="Includes annotations taken during acquisition (if any) in the exported data", default=False)
+@click.option('-tl', '--tag_labels', multiple=True, help='A list of tag labels strings to filter and include only the corresponding entries in the converted output')
+@click.option('-nt','--no_timestamps', help="Enable this option to remove timestamps column in the exported output files", is_flag=True, default=False)
+@click.option('-r', '--raw_data', is_flag=True, help="Uses Raw data (not multiplied by sensitivity)", default=False)
+@click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
+@click.option('-cs', '--chunk_size', help="Specify the size (number of samples) of each data chunk to be processed", default=HSDatalog.DEFAULT_SAMPLES_CHUNK_SIZE)
+@click.option('-j', '--jobs', help="Number of worker processes (default: number of CPUs)", type=click.IntRange(min=1), default=os.cpu_count())
+@click.option('-fe', '--force_export', is_flag=True, help="Export the acquisitions again, even if their export manifest reports them as up to date", default=False)
+@click.option('-hs', '--hash_sources', is_flag=True, help="Record the SHA-256 hash of the sources in the export manifest, so that sources with a new modification time but the same content are not exported again (reads the sources once more after each export)", default=False)
+@click.version_option(script_version, '-v', '--version', prog_name="stdatalog_batch_export", is_flag=True, help="stdatalog_batch_export tool version number")
+@click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
+@click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
+
+# Define the main function that will be executed when the script is run
+def hsd_batch_export(acq_root, output_root, file_format, sensor_name, start_time, end_time, labeled, tag_labels, no_timestamps, raw_data, custom_device_model, chunk_size, jobs, force_export, hash_sources, debug):
+
+    # Discover the acquisition folders
+    acq_folders, base_folder = discover_acquisitions(acq_root)
+    if len(acq_folders) == 0:
+        log.error("No valid acquisition folder found in \"{}\"".format(acq_root))
+        return
+    log.info("{} acquisition folders found in \"{}\"".format(len(acq_folders), acq_root))
+
+    # Process tag labels if provided as selection filter
+    which_tags = []
+    if len(tag_labels) > 0:
+        which_tags = list(tag_labels)
+        labeled = True
+
+    # Group the acquisitions by Device Template Model, so that consecutive tasks of a worker share the same one
+    acq_folders = sorted(acq_folders, key=lambda acq_folder: (get_template_key(acq_folder), acq_folder))
+    options = get_export_options(file_format, start_time, end_time, labeled, which_tags, no_timestamps, raw_data, custom_device_model)
+
+    results = {}
+    n_workers = min(jobs, len(acq_folders))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(custom_device_model,)) as executor:
+        futures = {}
+        for acq_folder in acq_folders:
+            output_folder = get_output_folder(acq_folder, base_folder, output_root)
+            futures[executor.submit(export_acquisition, acq_folder, output_folder, file_format.upper(), sensor_name, start_time, end_time, labeled, which_tags,
+                                    no_timestamps, raw_data, chunk_size, options, force_export, hash_sources, debug)] = acq_folder
+        # Show a combined progress bar, updated as soon as each acquisition is exported
+        with click.progressbar(length=len(futures), label="Exporting {} acquisitions ({} processes)".format(len(futures), n_workers)) as progress_bar:
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as err:
+                    # The worker process terminated abruptly
+                    results[futures[future]] = ([], [], {"": "{}: {}".format(type(err).__name__, err)})
+                progress_bar.update(1)
+
+    # Log the per-acquisition summary
+    n_failed = 0
+    for acq_folder in acq_folders:
+        exported, skipped, errors = results[acq_folder]
+        log.info("{}: {} exported, {} up to date".format(acq_folder, len(exported), len(skipped)))
+        for c_name, error in errors.items():
+            log.error("{}: {} export failed - {}".format(acq_folder, c_name, error))
+        n_failed += len(errors) > 0
+    log.info("{}/{} acquisitions exported without errors".format(len(acq_folders) - n_failed, len(acq_folders)))
+
+# Define a helper function to discover the acquisition folders under a root folder or matching a glob pattern
+def discover_acquisitions(acq_root):
+    if glob.has_magic(acq_root):
+        candidates = [path for path in sorted(glob.glob(acq_root)) if os.path.isdir(path)]
+        base_folder = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in candidates]) if candidates else None
+    else:
+        candidates = []
+        for root, dirs, files in os.walk(acq_root):
+            # Skip the export outputs and the time indexes
+            dirs[:] = sorted(d for d in dirs if not d.endswith("_Exported") and not d.startswith("."))
+            if any(f.endswith(".json") for f in files):
+                candidates.append(root)
+        base_folder = os.path.abspath(acq_root)
+    acq_folders = [os.path.abspath(path) for path in candidates if HSDatalog.validate_hsd_folder(path) != HSDatalog.HSDVersion.INVALID]
+    return acq_folders, base_folder
+
+# Define a helper function to get the board and firmware ID of an acquisition, that identify its Device Template Model
+def get_template_key(acq_folder):
+    try:
+        with open(os.path.join(acq_folder, "device_config.json"), 'r') as f:
+            device = json.load(f)["devices"][0]
+        return "{}:{}".format(device.get("board_id"), device.get("fw_id"))
+    except (OSError, ValueError, KeyError, IndexError):
+        # HSD v1 acquisitions (DeviceConfig.json) are grouped together
+        return ""
+
+# Define a helper function to get the output folder of an acquisition
+def get_output_folder(acq_folder, base_folder, output_root):
+    if output_root is None:
+        return acq_folder + "_Exported"
+    rel_path = os.path.relpath(acq_folder, base_folder)
+    return os.path.join(output_root, os.path.basename(acq_folder) if rel_path == "." else rel_path)
+
+# Define a helper function to initialize a worker process, once for all the acquisitions it exports
+def init_worker(custom_device_model):
+    global worker_hsd_factory
+    if custom_device_model is not None:
+        HSDatalogDTM.upload_custom_dtm(custom_device_model)
+    worker_hsd_factory = HSDatalog()
+
+# Define a helper function to export an acquisition in a worker process
+def export_acquisition(acq_folder, output_folder, file_format, sensor_name, start_time, end_time, labeled, which_tags, no_timestamps, raw_data, chunk_size, options, force_export, hash_sources, debug):
+    exported, skipped, errors = [], [], {}
+    try:
+        hsd = worker_hsd_factory.create_hsd(acq_folder)
+        hsd.enable_timestamp_recovery(debug)
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        manifest = ExportManifest(output_folder, hash_sources=hash_sources)
+
+        if sensor_name == 'all':
+            components = HSDatalog.get_all_components(hsd, only_active=True)
+        else:
+            component = HSDatalog.get_component(hsd, sensor_name)
+            if component is None:
+                return exported, skipped, {sensor_name: "No \"{}\" Component found in your Device Configuration file.".format(sensor_name)}
+            components = [component]
+        # The HDF5 export converts all the components to a single file
+        tasks = [(None, components)] if file_format == "HDF5" else [(list(c.keys())[0], c) for c in components]
+    except (Exception, SystemExit) as err:
+        return exported, skipped, {"": "{}: {}".format(type(err).__name__, err)}
+
+    for c_name, component in tasks:
+        key = get_manifest_key(file_format, c_name)
+        name = c_name if c_name is not None else "HDF5"
+        sources = ExportManifest.get_source_files(acq_folder, c_name)
+        if not force_export and manifest.is_up_to_date(key, options, sources):
+            skipped.append(name)
+            continue
+        manifest.start(key, options)
+        files_before = ExportManifest.list_files(output_folder)
+        try:
+            if file_format == "HDF5":
+                HSDatalog.convert_acquisition_to_hdf5(hsd, component, start_time, end_time, labeled, output_folder, raw_data, which_tags, no_timestamps, chunk_size)
+            else:
+                HSDatalog.convert_dat_to_xsv(hsd, component, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags, no_timestamps, chunk_size)
+        except (Exception, SystemExit) as err:
+            # An error on an acquisition (SystemExit included) must not stop the worker
+            errors[name] = "{}: {}".format(type(err).__name__, err)
+            continue
+        written_files = ExportManifest.get_written_files(files_before, ExportManifest.list_files(output_folder), c_name)
+        manifest.complete(key, options, ExportManifest.get_source_info(sources, manifest.hash_sources), written_files)
+        exported.append(name)
+    return exported, skipped, errors
+
+if __name__ == '__main__':
+    # Execute the main function
+    hsd_batch_export()
@@ -33,6 +33,16 @@ Key Features:
 - Include annotations in the exported data.
 - Filter data by tag labels.
 - Specify the size of each data chunk to be processed.
+- Memory-mapped reading mode (-mm, HSD v2 sensor components, TXT, CSV, TSV, PARQUET formats, without annotations):
+  only the samples of the time window are read from the memory-mapped .dat file, found through a persistent time
+  index (see `dat_time_window.py`), so a time window near the end of a long acquisition costs the same as one at its
+  beginning. The files are written by `dat_time_window.py` (HSDatalog column names, pandas float formatting),
+  without -mm they are written by HSDatalog.
+- Export all the components in parallel processes (TXT, CSV, TSV, PARQUET), with a combined progress bar
+  and a per-component error summary.
+- Incremental exports: an export manifest in the output folder records the sources, the options and the outputs
+  of each export, so that a later run skips the components that are up to date and exports again only the
+  changed or interrupted ones (see `export_manifest.py`).
 - Export data in different formats (TXT, CSV, TSV, PARQUET, HDF5(*)).
     -- HSDF5 format:
         - acquisition_metadata group: Contains the acquisition information (9 attributes)
@@ -53,6 +63,7 @@ Key Features:
 
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Add the STDatalog SDK root directory to the sys.path to access the SDK packages
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -62,6 +73,8 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import DataCorruptedException, MissingDeviceModelError, MissingTagsException, MissingISPUOutputDescriptorException
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from export_manifest import ExportManifest
+from dat_time_window import DatTimeWindow
 
 # Set up the application logger with a specified log file
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
@@ -81,6 +94,8 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path", fg='cyan')
         # Example: Export data for all sensors and include annotations in the exported data
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s all -l", fg='cyan')
+        # Example: Export data for all sensors to CSV format using 4 parallel processes
+        click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s all -f CSV -j 4", fg='cyan')
         # Example: Export data for a specific sensor in TSV format and use raw data
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s SENSOR_NAME -f TSV -r", fg='cyan')
         # Example: Export data to a specified output folder
@@ -97,10 +112,14 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s SENSOR_NAME -f TSV -cs 500000", fg='cyan')
         # Example: Export data for a specific sensor with a start and end time
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s SENSOR_NAME -st 100 -et 200", fg='cyan')
+        # Example: Export data for a specific sensor with a start and end time, reading only the samples of the time window through the memory-mapped reader
+        click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s SENSOR_NAME -st 3600 -et 3610 -mm", fg='cyan')
         # Example: Export data for a specific sensor with specified tag labels
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s SENSOR_NAME -tl TAG_LABEL_1 TAG_LABEL_2 TAG_LABEL_3", fg='cyan')
         # Example: Export data to a specified output folder
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -o Output_Folder_Path", fg='cyan')
+        # Example: Export data for all sensors again, ignoring the export manifest of a previous run
+        click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -s all -fe", fg='cyan')
         # Example: Run the script in debug mode to check for corrupted data and timestamps
         click.secho("   python stdatalog_data_export.py Acquisition_Folder_Path -d", fg='cyan')
         ctx.exit()
@@ -119,12 +138,16 @@ def show_help(ctx, param, value):
 @click.option('-r', '--raw_data', is_flag=True, help="Uses Raw data (not multiplied by sensitivity)", default=False)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
 @click.option('-cs', '--chunk_size', help="Specify the size (number of samples) of each data chunk to be processed", default=HSDatalog.DEFAULT_SAMPLES_CHUNK_SIZE)
+@click.option('-mm', '--memmap', is_flag=True, help="Read the .dat files through a memory map, only the samples in the time window are read (HSD v2 sensor components, TXT, CSV, TSV, PARQUET formats, no annotations)", default=False)
+@click.option('-j', '--jobs', help="Number of parallel processes used to export the components when \"-s all\" is used (TXT, CSV, TSV, PARQUET formats)", type=click.IntRange(min=1), default=1)
+@click.option('-fe', '--force_export', is_flag=True, help="Export the selected components again, even if the export manifest in the output folder reports them as up to date", default=False)
+@click.option('-hs', '--hash_sources', is_flag=True, help="Record the SHA-256 hash of the sources in the export manifest, so that sources with a new modification time but the same content are not exported again (reads the sources once more after each export)", default=False)
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_data_export", is_flag=True, help="stdatalog_data_export tool version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_data_export(acq_folder, output_folder, file_format, sensor_name, start_time, end_time, labeled, tag_labels, no_timestamps, raw_data, custom_device_model, chunk_size, debug):
+def hsd_data_export(acq_folder, output_folder, file_format, sensor_name, start_time, end_time, labeled, tag_labels, no_timestamps, raw_data, custom_device_model, chunk_size, memmap, jobs, force_export, hash_sources, debug):
 
     # If a custom device model is provided, upload it using the HSDatalogDTM module
     if custom_device_model is not None:
@@ -159,6 +182,10 @@ def hsd_data_export(acq_folder, output_folder, file_format, sensor_name, start_t
     # Enable timestamp recovery if debug mode is on
     hsd.enable_timestamp_recovery(debug)
 
+    # Load the export manifest of the output folder, the options that change the exported data are recorded with each export
+    manifest = ExportManifest(output_folder, log, hash_sources)
+    options = get_export_options(file_format, start_time, end_time, labeled, which_tags, no_timestamps, raw_data, custom_device_model, memmap)
+
     # Main loop to process data export by tags
     df_flag = True
     while df_flag:
@@ -167,37 +194,57 @@ def hsd_data_export(acq_folder, output_folder, file_format, sensor_name, start_t
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             # If a component is selected, convert its data
             if component is not None:
-                convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size)
+                convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size, manifest, options, force_export, debug, memmap)
             else:
                 break
         # If 'all' is specified for sensor name, process all active components
         elif sensor_name == 'all':
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             if file_format.upper() == "HDF5":
-                convert_data(hsd, component_list, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size)
+                if jobs > 1:
+                    log.warning("HDF5 export writes a single file, the --jobs option is ignored")
+                convert_data(hsd, component_list, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size, manifest, options, force_export, debug, memmap)
+            elif jobs > 1 and len(component_list) > 1:
+                # Export each component (an independent .dat file) in a separate process
+                convert_data_parallel(component_list, jobs, custom_device_model, debug, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size, manifest, options, force_export, memmap)
             else:
                 for component in component_list:
-                    convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size)
+                    convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size, manifest, options, force_export, debug, memmap)
             df_flag = False
         # If a specific sensor name is provided, process only that component
         else:
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
-                convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size)
+                convert_data(hsd, component, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size, manifest, options, force_export, debug, memmap)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
             df_flag = False
 
 # Define a helper function to convert data
-def convert_data(hsd, components, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags:list, no_timestamps, raw_data, chunk_size):
+def convert_data(hsd, components, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags:list, no_timestamps, raw_data, chunk_size, manifest=None, options=None, force_export=False, debug=False, memmap=False):
+    # The HDF5 export converts all the components to a single file
+    c_name = None if file_format == "HDF5" else list(components.keys())[0]
+    key = get_manifest_key(file_format, c_name)
+    sources = ExportManifest.get_source_files(acq_folder, c_name)
+    if manifest is not None:
+        # Skip the export if it is up to date with respect to the manifest
+        if not force_export and manifest.is_up_to_date(key, options, sources):
+            log.info("{} export is up to date, skipped (use -fe to export it again)".format(c_name if c_name is not None else "HDF5"))
+            return
+        manifest.start(key, options)
+        files_before = ExportManifest.list_files(output_folder)
     try:
         if file_format == "HDF5":
             # Attempt to convert data to the specified file format (HDF5)
             HSDatalog.convert_acquisition_to_hdf5(hsd, components, start_time, end_time, labeled, output_folder, raw_data, which_tags, no_timestamps, chunk_size)
         else:
             # Attempt to convert data to the specified file format (TXT, CSV, TSV, PARQUET or HDF5)
-            HSDatalog.convert_dat_to_xsv(hsd, components, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags, no_timestamps, chunk_size)
+            convert_component_data(hsd, components, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags, no_timestamps, chunk_size, debug, memmap)
+        if manifest is not None:
+            # Record the completed export in the manifest
+            written_files = ExportManifest.get_written_files(files_before, ExportManifest.list_files(output_folder), c_name)
+            manifest.complete(key, options, ExportManifest.get_source_info(sources, manifest.hash_sources), written_files)
     except MissingTagsException as tags_err:
         # Handle missing tags exception
         log.error(tags_err)
@@ -214,6 +261,92 @@ def convert_data(hsd, components, start_time, end_time, acq_folder, labeled, out
     except Exception as err:
         log.exception(err)
 
+# Define a helper function to convert the data of a component, through the memory-mapped reader if it is selected
+def convert_component_data(hsd, component, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags:list, no_timestamps, chunk_size, debug=False, memmap=False):
+    # Annotated data and the timestamp recovery of the debug mode are handled by HSDatalog only
+    if memmap and not labeled and not debug:
+        window = DatTimeWindow.open(hsd, component, start_time, end_time, raw_data, log)
+        if window is not None:
+            window.export_xsv(output_folder, file_format, no_timestamps, chunk_size)
+            return
+    HSDatalog.convert_dat_to_xsv(hsd, component, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags, no_timestamps, chunk_size)
+
+# Define a helper function to get the export options recorded in the manifest (the options that change the exported data)
+def get_export_options(file_format, start_time, end_time, labeled, which_tags, no_timestamps, raw_data, custom_device_model, memmap=False):
+    options = {"file_format": file_format.upper(), "start_time": start_time, "end_time": end_time, "labeled": labeled, "which_tags": which_tags,
+               "no_timestamps": no_timestamps, "raw_data": raw_data, "custom_device_model": list(custom_device_model) if custom_device_model is not None else None}
+    # The memory-mapped reader writes its own float formatting (recorded only when selected, so older manifests stay valid)
+    if memmap:
+        options["memmap"] = True
+    return options
+
+# Define a helper function to get the key of an export in the manifest
+def get_manifest_key(file_format, component_name=None):
+    return "stdatalog_data_export/{}/{}".format(file_format.upper(), component_name if component_name is not None else "all")
+
+# Define a helper function to convert the data of a single component in a worker process
+def convert_component(component_name, custom_device_model, debug, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags:list, no_timestamps, raw_data, chunk_size, hash_sources=False, memmap=False):
+    # Each worker process creates its own HSDatalog object, since it cannot be shared between processes
+    try:
+        if custom_device_model is not None:
+            HSDatalogDTM.upload_custom_dtm(custom_device_model)
+        hsd = HSDatalog().create_hsd(acq_folder)
+        hsd.enable_timestamp_recovery(debug)
+        component = HSDatalog.get_component(hsd, component_name)
+        files_before = ExportManifest.list_files(output_folder)
+        convert_component_data(hsd, component, start_time, end_time, labeled, raw_data, output_folder, file_format, which_tags, no_timestamps, chunk_size, debug, memmap)
+        # The manifest is updated by the main process, the worker returns the sources and the outputs of the export
+        written_files = ExportManifest.get_written_files(files_before, ExportManifest.list_files(output_folder), component_name)
+        source_info = ExportManifest.get_source_info(ExportManifest.get_source_files(acq_folder, component_name), hash_sources)
+    except Exception as err:
+        # Exceptions are returned as strings, since not all of them can be pickled back to the main process
+        return component_name, "{}: {}".format(type(err).__name__, err), None, None
+    return component_name, None, source_info, written_files
+
+# Define a helper function to convert the data of many components in a process pool
+def convert_data_parallel(components, jobs, custom_device_model, debug, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags:list, no_timestamps, raw_data, chunk_size, manifest=None, options=None, force_export=False, memmap=False):
+    component_names = [list(c.keys())[0] for c in components]
+    if manifest is not None:
+        # Skip the components whose export is up to date with respect to the manifest
+        up_to_date = [c_name for c_name in component_names if not force_export and manifest.is_up_to_date(get_manifest_key(file_format, c_name), options, ExportManifest.get_source_files(acq_folder, c_name))]
+        for c_name in up_to_date:
+            log.info("{} export is up to date, skipped (use -fe to export it again)".format(c_name))
+        component_names = [c_name for c_name in component_names if c_name not in up_to_date]
+        if len(component_names) == 0:
+            return
+        for c_name in component_names:
+            manifest.start(get_manifest_key(file_format, c_name), options)
+    errors = {}
+    with ProcessPoolExecutor(max_workers=min(jobs, len(component_names))) as executor:
+        futures = {executor.submit(convert_component, c_name, custom_device_model, debug, start_time, end_time, acq_folder, labeled, output_folder, file_format, which_tags, no_timestamps, raw_data, chunk_size,
+                                   manifest is not None and manifest.hash_sources, memmap): c_name for c_name in component_names}
+        # Show a combined progress bar, updated as soon as each component is exported
+        with click.progressbar(length=len(futures), label="Exporting {} components ({} processes)".format(len(futures), min(jobs, len(futures)))) as progress_bar:
+            for future in as_completed(futures):
+                try:
+                    c_name, error, source_info, written_files = future.result()
+                except Exception as err:
+                    # The worker process terminated abruptly
+                    c_name, error = futures[future], "{}: {}".format(type(err).__name__, err)
+                if error is not None:
+                    errors[c_name] = error
+                elif manifest is not None:
+                    # Record the completed export in the manifest
+                    manifest.complete(get_manifest_key(file_format, c_name), options, source_info, written_files)
+                progress_bar.update(1)
+
+    # Log the per-component summary
+    log.info("{}/{} components exported to {}".format(len(component_names) - len(errors), len(component_names), output_folder))
+    for c_name in component_names:
+        if c_name in errors:
+            log.error("{}: export failed - {}".format(c_name, errors[c_name]))
+    if any(error.startswith(MissingTagsException.__name__) for error in errors.values()):
+        log.warning("Check \"tags\" field in your acquisition_info.json file (AcquisitionInfo.json for HSDv1 acquisitions)")
+    if any(error.startswith(MissingISPUOutputDescriptorException.__name__) for error in errors.values()):
+        log.warning("Copy the right ISPU output descriptor file in your \"{}\" acquisition folder renamed as \"ispu_output_format.json\"".format(acq_folder))
+    if any(error.startswith(DataCorruptedException.__name__) for error in errors.values()):
+        log.warning("Check your acquisition folder for corrupted data files")
+
 if __name__ == '__main__':
     # Execute the main function
     hsd_data_export()
\ No newline at end of file
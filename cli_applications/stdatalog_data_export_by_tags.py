@@ -56,6 +56,9 @@ Key Features:
 - Include data sections without tags in the exported output.
 - Specify the size of each data chunk to be processed.
 - Export data in different formats (TXT, CSV, TSV).
+- Incremental exports: an export manifest in the output folder records the sources, the options and the outputs
+  of each export, so that a later run skips the components that are up to date and exports again only the
+  changed or interrupted ones (see `export_manifest.py`).
 - Upload and use a custom Device Template Model (DTDL).
 - Enable debug mode to check for corrupted data and timestamps.
 - Export data by tags, organizing exported files (one per selected sensor) in different files and folders based on tag labels groups.
@@ -73,6 +76,7 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingTagsException, MissingISPUOutputDescriptorException
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from export_manifest import ExportManifest
 
 # Set up the application logger
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
@@ -105,6 +109,8 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_data_export_by_tags.py path_to_acquisition_folder -cdm 255 255 custom_model.json -s SENSOR_NAME", fg='cyan')
         #This command will specify the size of each data chunk to be 1000 samples for the sensor SENSOR_NAME.
         click.secho("   python stdatalog_data_export_by_tags.py path_to_acquisition_folder -cs 1000 -s SENSOR_NAME", fg='cyan')
+        #This command will extract data for all active sensors again, even if the export manifest of a previous run reports them as up to date.
+        click.secho("   python stdatalog_data_export_by_tags.py path_to_acquisition_folder -s all -fe", fg='cyan')
         # Exit the context after showing help
         ctx.exit()
 
@@ -122,12 +128,14 @@ def show_help(ctx, param, value):
 @click.option('-r', '--raw_data', is_flag=True, help="Uses Raw data (not multiplied by sensitivity)", default=False)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL). board_id:int, fw_id:int, device_template_model json path:str", type=(int, int, str))
 @click.option('-cs', '--chunk_size', help="Specify the size (number of samples) of each data chunk to be processed", default=HSDatalog.DEFAULT_SAMPLES_CHUNK_SIZE)
+@click.option('-fe', '--force_export', is_flag=True, help="Export the selected components again, even if the export manifest in the output folder reports them as up to date", default=False)
+@click.option('-hs', '--hash_sources', is_flag=True, help="Record the SHA-256 hash of the sources in the export manifest, so that sources with a new modification time but the same content are not exported again (reads the sources once more after each export)", default=False)
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_data_export_by_tags", is_flag=True, help="stdatalog_data_export_by_tags converter script version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_exportByTags(acq_folder, output_folder, sensor_name, start_time, end_time, tag_labels, with_untagged, no_timestamps, raw_data, out_format, custom_device_model, chunk_size, debug):
+def hsd_exportByTags(acq_folder, output_folder, sensor_name, start_time, end_time, tag_labels, with_untagged, no_timestamps, raw_data, out_format, custom_device_model, chunk_size, force_export, hash_sources, debug):
 
     # If a custom device model is provided, upload it
     if custom_device_model is not None:
@@ -161,7 +169,12 @@ def hsd_exportByTags(acq_folder, output_folder, sensor_name, start_time, end_tim
         
     # Enable timestamp recovery if debug mode is on
     hsd.enable_timestamp_recovery(debug)
-    
+
+    # Load the export manifest of the output folder, the options that change the exported data are recorded with each export
+    manifest = ExportManifest(output_folder, log, hash_sources)
+    options = {"out_format": out_format.upper(), "start_time": start_time, "end_time": end_time, "which_tags": which_tags, "with_untagged": with_untagged,
+               "no_timestamps": no_timestamps, "raw_data": raw_data, "custom_device_model": list(custom_device_model) if custom_device_model is not None else None}
+
     # Main loop to process data export by tags
     df_flag = True
     while df_flag:
@@ -170,21 +183,21 @@ def hsd_exportByTags(acq_folder, output_folder, sensor_name, start_time, end_tim
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             # If a component is selected, convert its data
             if component is not None:
-                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size, manifest, options, force_export)
             else:
                 break
         # If 'all' is specified for sensor name, process all active components
         elif sensor_name == 'all':
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             for component in component_list:
-                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size, manifest, options, force_export)
             # Set flag to False to exit the loop after processing all components
             df_flag = False
         # If a specific sensor name is provided, process only that component
         else:
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
-                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size, manifest, options, force_export)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
@@ -192,10 +205,24 @@ def hsd_exportByTags(acq_folder, output_folder, sensor_name, start_time, end_tim
             df_flag = False
 
 # Define a helper function to convert data
-def convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags:list, with_untagged, no_timestamps, raw_data, chunk_size):
+def convert_data(hsd, component, start_time, end_time, output_folder, out_format, which_tags:list, with_untagged, no_timestamps, raw_data, chunk_size, manifest=None, options=None, force_export=False):
+    c_name = list(component.keys())[0]
+    key = "stdatalog_data_export_by_tags/{}/{}".format(out_format.upper(), c_name)
+    sources = ExportManifest.get_source_files(hsd.get_acquisition_path(), c_name)
+    if manifest is not None:
+        # Skip the export if it is up to date with respect to the manifest
+        if not force_export and manifest.is_up_to_date(key, options, sources):
+            log.info("{} export is up to date, skipped (use -fe to export it again)".format(c_name))
+            return
+        manifest.start(key, options)
+        files_before = ExportManifest.list_files(output_folder)
     try:
         # Attempt to convert data to text by tags
         HSDatalog.convert_dat_to_txt_by_tags(hsd, component, start_time, end_time, output_folder, out_format, which_tags, with_untagged, no_timestamps, raw_data, chunk_size)
+        if manifest is not None:
+            # Record the completed export in the manifest
+            written_files = ExportManifest.get_written_files(files_before, ExportManifest.list_files(output_folder), c_name)
+            manifest.complete(key, options, ExportManifest.get_source_info(sources, manifest.hash_sources), written_files)
     except MissingTagsException as tags_err:
         # Handle missing tags exception
         log.error(tags_err)
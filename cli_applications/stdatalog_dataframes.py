@@ -33,6 +33,10 @@ Key Features:
 - Include annotations in the extracted dataframes.
 - Filter data by tag labels.
 - Specify the size of each data chunk to be processed.
+- Memory-mapped reading mode (HSD v2 sensor components): the .dat files are mapped with np.memmap and only the
+  samples of the requested time window are read (see `dat_time_window.py`). The time window is found through
+  a persistent time index built at the first run (see `dat_time_index.py`). The dataframes have the same
+  columns as the ones extracted with HSDatalog.
 - Upload and use a custom Device Template Model (DTDL).
 - Enable debug mode to check for corrupted data and timestamps.
 """
@@ -48,6 +52,7 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingTagsException, MissingISPUOutputDescriptorException
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from dat_time_window import DatTimeWindow
 
 # Set up the application logger to record debug information and errors
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
@@ -76,6 +81,8 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_dataframes.py path_to_acquisition_folder -cdm 255 255 custom_model.json -s SENSOR_NAME", fg='cyan')
         # This command will specify the size of each data chunk to be 1000 samples for the sensor SENSOR_NAME.
         click.secho("   python stdatalog_dataframes.py path_to_acquisition_folder -cs 1000 -s SENSOR_NAME", fg='cyan')
+        # This command will extract dataframes for the sensor SENSOR_NAME between 3600 and 3610 seconds, reading the .dat file through a memory map.
+        click.secho("   python stdatalog_dataframes.py path_to_acquisition_folder -mm -st 3600 -et 3610 -s SENSOR_NAME", fg='cyan')
         # This command will extract dataframes for the sensor SENSOR_NAME and check for corrupted data and timestamps.
         click.secho("   python stdatalog_dataframes.py path_to_acquisition_folder -d -s SENSOR_NAME", fg='cyan')
         # Exit the context after showing help
@@ -95,10 +102,11 @@ def show_help(ctx, param, value):
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_dataframes", is_flag=True, help="stdatalog_dataframes tool version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option('-dlg', '--disable_lazy_generator', is_flag=True, help="Disable lazy generator for dataframes extraction", default=False)
+@click.option('-mm', '--memmap', is_flag=True, help="Read the .dat files through a memory map, only the samples in the time window are read (HSD v2 sensor components, no annotations)", default=False)
 @click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_dataframe(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, tag_labels, custom_device_model, chunk_size, debug, disable_lazy_generator):
+def hsd_dataframe(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, tag_labels, custom_device_model, chunk_size, debug, disable_lazy_generator, memmap):
 
     # Check if the lazy generator is disabled or not
     use_generator = not disable_lazy_generator
@@ -135,26 +143,39 @@ def hsd_dataframe(acq_folder, sensor_name, start_time, end_time, raw_data, label
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             # If a component is selected, extract a dataframe from its data
             if component is not None:
-                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator)
+                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator, memmap)
             else:
                 break
         # If 'all' is specified for sensor name, process all active components
         elif sensor_name == 'all':
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             for component in component_list:
-                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator)
+                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator, memmap)
             df_flag = False
         # If a specific sensor name is provided, process only that component
         else:
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
-                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator)
+                extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator, memmap)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
             df_flag = False
 
-def extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator=True):
+def extract_component_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, use_generator=True, memmap=False):
+    if memmap:
+        c_name = list(component.keys())[0]
+        window = None
+        if labeled:
+            log.warning("Annotations are not supported by the memory-mapped reader, {} data will be extracted with HSDatalog".format(c_name))
+        else:
+            window = DatTimeWindow.open(hsd, component, start_time, end_time, raw_data, log)
+            if window is None:
+                log.warning("{} is not supported by the memory-mapped reader (HSD v2 sensor components only), its data will be extracted with HSDatalog".format(c_name))
+        if window is not None:
+            for df in window.get_dataframe_gen(chunk_size):
+                log.info(f"\nDataFrame: {df}")
+            return
     if use_generator:
         df_generator = extract_dataframe(hsd, component, start_time, end_time, labeled, which_tags, raw_data, chunk_size, acq_folder, True)
         if df_generator is not None:
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+# *****************************************************************************
+#  * @file    stdatalog_multi_export.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+This script, `stdatalog_multi_export.py`, is designed to export data from acquisition folders generated by
+STMicroelectronics' HSDatalog tool to many output formats in a single pass. The data of each component is read
+and decoded once, chunk by chunk, and each chunk is written to all the selected sinks (see `export_sinks.py`).
+The CSV_TAGS and UNICO sinks write the files of `stdatalog_data_export_by_tags.py` and of
+`stdatalog_to_unico.py -ag`, so that a single run replaces the separate export scripts.
+It uses Click for command-line interface options and logs information and errors during execution.
+
+Key Features:
+- Export data for specific sensors or all active components.
+- Set start and end times for the data export.
+- Select the output sinks (one or more):
+    -- CSV_TAGS: a file per tag group and per component, in a folder per tag (and an "untagged" folder with -wu),
+       as `stdatalog_data_export_by_tags.py` (format selected with -f).
+    -- TXT: a tab-separated TXT file per component, with the tags as 0/1 columns.
+    -- PARQUET: a Parquet file per component (requires pyarrow).
+    -- HDF5: a single HDF5 file with a group per component (requires h5py).
+    -- WAV: a 16-bit PCM WAV file per microphone component.
+    -- UNICO: the sensor components aggregated in ST MEMS Studio (Unico) files, as `stdatalog_to_unico.py -ag`
+       (aggregation selected with -ag, format with -f, column labels with -cl).
+- Filter data by tag labels.
+- Option to export raw data.
+- Specify the size of each data chunk to be processed.
+- Upload and use a custom Device Template Model (DTDL).
+- Enable debug mode to check for corrupted data and timestamps.
+"""
+
+import sys
+import os
+
+# Add the STDatalog SDK root directory to the sys.path to access the SDK packages
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import click
+from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
+from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingTagsException, MissingISPUOutputDescriptorException
+import stdatalog_core.HSD_utils.logger as logger
+from stdatalog_core.HSD.HSDatalog import HSDatalog
+from export_sinks import SINKS, CsvTagSink, HDF5Sink, UnicoAggregatedSink
+
+# Set up the application logger with a specified log file
+log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
+
+# Define the script version for reference
+script_version = "1.0.0"
+
+# Define a callback function to show help information and example usage of the script
+def show_help(ctx, param, value):
+    if value and not ctx.resilient_parsing:
+        # Display the help information for the command
+        click.secho(ctx.get_help(), color=ctx.color)
+        # Display examples of script execution
+        click.secho("\n-> Script execution examples:")
+        # Example: Export all the active sensors to all the sinks
+        click.secho("   python stdatalog_multi_export.py Acquisition_Folder_Path -s all", fg='cyan')
+        # Example: Export all the active sensors to CSV files per tag and to Parquet in a single pass
+        click.secho("   python stdatalog_multi_export.py Acquisition_Folder_Path -s all -k CSV_TAGS -k PARQUET", fg='cyan')
+        # Example: Export a specific sensor to all the sinks, between 3 and 6 seconds, to a specified output folder
+        click.secho("   python stdatalog_multi_export.py Acquisition_Folder_Path -s SENSOR_NAME -st 3 -et 6 -o Output_Folder_Path", fg='cyan')
+        # Example: Export only the entries with tag labels SW_TAG_0 or SW_TAG_2, including the untagged sections
+        click.secho("   python stdatalog_multi_export.py Acquisition_Folder_Path -s all -tl SW_TAG_0 -tl SW_TAG_2 -wu", fg='cyan')
+        # Example: Export all the active sensors to TXT files per tag and to ST MEMS Studio (Unico) files per tag group, with the MLC tool column labels
+        click.secho("   python stdatalog_multi_export.py Acquisition_Folder_Path -s all -k CSV_TAGS -k UNICO -f TXT -ag split_per_tags -cl mlc_tool", fg='cyan')
+        ctx.exit()
+
+# Define the click command with options for the multi-format export script
+@click.command()
+@click.argument('acq_folder', type=click.Path(exists=True))
+@click.option('-o', '--output_folder', help="Output folder (this will be created if it doesn't exist)")
+@click.option('-s', '--sensor_name', help="Sensor Name - use \"all\" to extract all active sensors data, otherwise select a specific sensor by name", default='')
+@click.option('-k', '--sink', 'sinks', multiple=True, help="Output sink (repeat the option to select many sinks, default: all the sinks)", type=click.Choice(list(SINKS.keys()), case_sensitive=False))
+@click.option('-st','--start_time', help="Start Time - Data conversion will start from this time (seconds)", type=int, default=0)
+@click.option('-et','--end_time', help="End Time - Data conversion will end up in this time (seconds)", type=int, default=-1)
+@click.option('-tl', '--tag_labels', multiple=True, help='A list of tag labels strings to filter and include only the corresponding entries in the converted output')
+@click.option('-wu', '--with_untagged', help="Enable this option to include data sections without tags in the CSV_TAGS output and in the UNICO output with -ag split_per_tags. A dedicated \"untagged\" folder will be created", is_flag=True, default=False)
+@click.option('-nt','--no_timestamps', help="Enable this option to remove timestamps column in the exported output files (except UNICO, see -wt)", is_flag=True, default=False)
+@click.option('-f', '--out_format', help="Select the data format of the CSV_TAGS and UNICO outputs", type=click.Choice(['TXT', 'CSV', 'TSV'], case_sensitive=False), default='CSV')
+@click.option('-ag','--aggregation', help="Data aggregation strategy of the UNICO output", type=click.Choice(['single_file', 'split_per_tags']), default='single_file')
+@click.option('-cl','--columns_labels', help="Select the naming convention to be used when creating column names in the UNICO output", type=click.Choice(['default', 'mlc_tool']), default='default')
+@click.option('-t', '--use_datalog_tags', is_flag=True, help="Enable this flag to include the annotations taken during acquisition (if any) in the UNICO output with -ag single_file", default=False)
+@click.option('-wt','--with_timestamps', help="Enable this option to add timestamps column in the UNICO output", is_flag=True, default=False)
+@click.option('-r', '--raw_data', is_flag=True, help="Uses Raw data (not multiplied by sensitivity)", default=False)
+@click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
+@click.option('-cs', '--chunk_size', help="Specify the size (number of samples) of each data chunk to be processed", default=HSDatalog.DEFAULT_SAMPLES_CHUNK_SIZE)
+@click.version_option(script_version, '-v', '--version', prog_name="stdatalog_multi_export", is_flag=True, help="stdatalog_multi_export tool version number")
+@click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
+@click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
+
+# Define the main function that will be executed when the script is run
+def hsd_multi_export(acq_folder, output_folder, sensor_name, sinks, start_time, end_time, tag_labels, with_untagged, no_timestamps, out_format, aggregation, columns_labels, use_datalog_tags, with_timestamps, raw_data, custom_device_model, chunk_size, debug):
+
+    # If a custom device model is provided, upload it using the HSDatalogDTM module
+    if custom_device_model is not None:
+        HSDatalogDTM.upload_custom_dtm(custom_device_model)
+
+    # Create an instance of the HSDatalog factory
+    hsd_factory = HSDatalog()
+    try:
+        # Create an HSDatalog object for the given acquisition folder
+        hsd = hsd_factory.create_hsd(acq_folder)
+    except MissingDeviceModelError as error:
+        # Handle the case where the device model is missing and log the error
+        log.error("Device Template Model identifyed by [{}] not supported".format(error))
+        log.info("Check your input acquisition folder, then try to upload a custom Device Template Model using -cdm flag".format(error))
+        return
+
+    # Process tag labels if provided as selection filter
+    which_tags = []
+    if len(tag_labels) > 0:
+        which_tags = list(tag_labels)
+
+    # Set the default output folder if not specified
+    output_folder = acq_folder + "_Exported" if output_folder is None else output_folder
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    # Enable timestamp recovery if debug mode is on
+    hsd.enable_timestamp_recovery(debug)
+
+    # Create the selected sinks, skipping the ones whose packages are missing
+    sink_names = [s.upper() for s in sinks] if len(sinks) > 0 else list(SINKS.keys())
+    sink_list = []
+    for name in sink_names:
+        missing_packages = [p for p in SINKS[name].REQUIRED_PACKAGES if not is_package_installed(p)]
+        if len(missing_packages) > 0:
+            log.warning("{} output skipped, the following required packages are missing: {}".format(name, ", ".join(missing_packages)))
+        elif name == CsvTagSink.NAME:
+            sink_list.append(CsvTagSink(output_folder, no_timestamps, with_untagged, out_format))
+        elif name == HDF5Sink.NAME:
+            sink_list.append(HDF5Sink(output_folder, no_timestamps, os.path.basename(os.path.normpath(acq_folder)) + ".h5"))
+        elif name == UnicoAggregatedSink.NAME:
+            sink_list.append(UnicoAggregatedSink(output_folder, with_timestamps, aggregation, out_format, columns_labels, use_datalog_tags, with_untagged))
+        else:
+            sink_list.append(SINKS[name](output_folder, no_timestamps))
+    if len(sink_list) == 0:
+        log.error("No output sink available")
+        return
+
+    # Main loop to process data export
+    df_flag = True
+    try:
+        while df_flag:
+            # If no sensor name is provided, ask the user to select a component
+            if sensor_name == '':
+                component = HSDatalog.ask_for_component(hsd, only_active=True)
+                # If a component is selected, export its data
+                if component is not None:
+                    export_component(hsd, component, sink_list, start_time, end_time, which_tags, raw_data, chunk_size)
+                else:
+                    break
+            # If 'all' is specified for sensor name, process all active components
+            elif sensor_name == 'all':
+                component_list = HSDatalog.get_all_components(hsd, only_active=True)
+                for component in component_list:
+                    export_component(hsd, component, sink_list, start_time, end_time, which_tags, raw_data, chunk_size)
+                df_flag = False
+            # If a specific sensor name is provided, process only that component
+            else:
+                component = HSDatalog.get_component(hsd, sensor_name)
+                if component is not None:
+                    export_component(hsd, component, sink_list, start_time, end_time, which_tags, raw_data, chunk_size)
+                else:
+                    # Log an error if the specified component is not found
+                    log.error("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
+                df_flag = False
+    finally:
+        # Close all the output files, also when the export is interrupted
+        for sink in sink_list:
+            sink.close()
+
+    for sink in sink_list:
+        log.info("{}: {} files written".format(sink.NAME, len(sink.written_files)))
+
+# Define a helper function to check whether an optional package is installed
+def is_package_installed(package):
+    try:
+        __import__(package)
+    except ImportError:
+        return False
+    return True
+
+# Define a helper function to export the data of a component to all the sinks in a single pass
+def export_component(hsd, component, sink_list, start_time, end_time, which_tags, raw_data, chunk_size):
+    c_name = list(component.keys())[0]
+    c_status = component[c_name]
+    c_sinks = [sink for sink in sink_list if sink.accepts(c_name, c_status)]
+    if len(c_sinks) == 0:
+        return
+    # Tags are read only if a sink uses them
+    labeled = any(sink.uses_tags for sink in c_sinks) or len(which_tags) > 0
+    try:
+        log.info("Exporting {} to {}".format(c_name, ", ".join(sink.NAME for sink in c_sinks)))
+        df_generator = HSDatalog.get_dataframe_gen(hsd, component, start_time, end_time, labeled, raw_data, which_tags, chunk_size)
+        if df_generator is None:
+            return
+        for df in df_generator:
+            if df is None or df.empty:
+                continue
+            # Each chunk is decoded once and written to all the sinks
+            for sink in c_sinks:
+                sink.write(c_name, c_status, df)
+    except MissingTagsException as tags_err:
+        # Handle missing tags exception
+        log.error(tags_err)
+        log.warning("Check \"tags\" field in your acquisition_info.json file, or select the sinks that do not use them")
+    except MissingISPUOutputDescriptorException as ispu_err:
+        # Handle missing ISPU output descriptor exception
+        log.error(ispu_err)
+        log.warning("Copy the right ISPU output descriptor file in your \"{}\" acquisition folder renamed as \"ispu_output_format.json\"".format(hsd.get_acquisition_path()))
+    except Exception as err:
+        log.exception(err)
+    finally:
+        for sink in c_sinks:
+            sink.close_component(c_name)
+
+if __name__ == '__main__':
+    # Execute the main function
+    hsd_multi_export()
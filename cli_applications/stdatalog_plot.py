@@ -34,7 +34,12 @@ Key Features:
 - Include annotations in the plot.
 - Filter data by tag labels.
 - Create subplots for multi-dimensional sensors.
-- Display frequency plots for inertial sensors and microphones.
+- Display frequency plots for inertial sensors and microphones. For HSD v2 acquisitions the Welch PSD and the
+    spectrogram are computed in blocks by a pool of worker processes and cached (see `spectral_analysis.py`),
+    and the plot shows a progressive preview while the remaining blocks are computing.
+- Memory-mapped reading mode (HSD v2 sensor components, no annotations): the time-domain plot reads only the
+    samples of the time window from the memory-mapped .dat file (see `dat_time_window.py`) and shows them in the browser.
+    Time windows (-st/-et) are always plotted this way, unless debug mode is selected; -mm plots the whole acquisition this way too.
 - Upload and use a custom Device Template Model (DTDL).
 - Enable debug mode to check for corrupted data and timestamps.
 """
@@ -45,6 +50,8 @@ import os
 # Add the STDatalog SDK root directory to the sys.path to access the SDK packages
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
+import threading
+import webbrowser
 import logging
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 logging.getLogger('dash').setLevel(logging.ERROR)
@@ -55,10 +62,16 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingISPUOutputDescriptorException
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from spectral_analysis import SpectralAnalysis
+from dat_time_window import DatTimeWindow
 
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
 script_version = "1.0.0"
 
+# Running spectral analyses (stopped on exit) and port of the next frequency plot Dash app
+spectral_analyses = []
+spectrum_port = 8100
+
 def show_help(ctx, param, value):
     if value and not ctx.resilient_parsing:
         # Display the help information for the command
@@ -81,6 +94,10 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_plot.py Acquisition_Folder_Path -p", fg='cyan')
         # Example: Plot frequency plots (spectrogram) for inertial sensors and microphones
         click.secho("   python stdatalog_plot.py Acquisition_Folder_Path -fp", fg='cyan')
+        # Example: Plot frequency plots with a 4096 samples FFT, computed by 4 worker processes
+        click.secho("   python stdatalog_plot.py Acquisition_Folder_Path -fp -fs 4096 -j 4", fg='cyan')
+        # Example: Plot a time window of a sensor reading the .dat file through a memory map
+        click.secho("   python stdatalog_plot.py Acquisition_Folder_Path -s Sensor_Name -mm -st 3600 -et 3610", fg='cyan')
         # Example: Upload a custom device model
         click.secho("   python stdatalog_plot.py Acquisition_Folder_Path -cdm 1 2 custom_model.json", fg='cyan')
         # Example: Enable debug mode (Check Timestamp consistency)
@@ -97,13 +114,16 @@ def show_help(ctx, param, value):
 @click.option('-tl', '--tag_labels', multiple=True, help='A list of tag labels strings to filter and include only the corresponding entries in the converted output')
 @click.option('-p', '--subplots', is_flag=True, help="Multiple subplot for multi-dimensional sensors", default=False)
 @click.option('-fp', '--fft_plots', is_flag=True, help="Display frequency plots for inertial sensors and microphones", default=False)
+@click.option('-fs', '--fft_size', help="Number of samples of each FFT segment of the frequency plots (segments overlapping by fft_size // 2 samples)", type=click.IntRange(min=16), default=1024)
+@click.option('-j', '--jobs', help="Number of worker processes computing the frequency plots (default: number of CPUs)", type=click.IntRange(min=1), default=None)
+@click.option('-mm', '--memmap', is_flag=True, help="Read the .dat files through a memory map, only the samples in the time window are read (HSD v2 sensor components, no annotations)", default=False)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_plot", is_flag=True, help="stdatalog_plot tool version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option("-h"," --help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, tag_labels, subplots, fft_plots, custom_device_model, debug):
+def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, tag_labels, subplots, fft_plots, fft_size, jobs, memmap, custom_device_model, debug):
 
     # If a custom device model is provided, upload it using the HSDatalogDTM module
     if custom_device_model is not None:
@@ -138,7 +158,7 @@ def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, t
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             if component is not None:
                 label = ask_for_label(hsd, labeled)
-                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots)
+                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots, fft_size, jobs, memmap, debug)
             else:
                 break
         # If 'all' is specified for sensor name, plot all active components
@@ -146,7 +166,7 @@ def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, t
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             label = ask_for_label(hsd, labeled)
             for component in component_list:
-                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots)
+                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots, fft_size, jobs, memmap, debug)
             if not labeled:
                 plot_flag = False
         # If a specific sensor name is provided, plot only that component
@@ -154,7 +174,7 @@ def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, t
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
                 label = ask_for_label(hsd, labeled)
-                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots)
+                plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots, fft_size, jobs, memmap, debug)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component to plot found in your Device Configuration file.".format(sensor_name))
@@ -164,6 +184,8 @@ def hsd_plot(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, t
     log.info("--> Plotting completed!")
     # Wait for user input before closing the console
     input("Press Enter to exit...")  # Keep the console open until the user presses Enter
+    for analysis in spectral_analyses:
+        analysis.cancel()  # Stop the spectral analyses still running
     hsd.close_plot_threads()  # Close any open plot threads
 
 # Define a helper function to ask the user for a label if the data is labeled
@@ -178,10 +200,100 @@ def ask_for_label(hsd, labeled):
             quit()
     return label
 
+# Define a helper function to build the frequency plots of a spectral analysis: the Welch PSD and the spectrogram of each axis
+def get_spectrum_figure(analysis):
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
+    frequencies, psd = analysis.get_psd()
+    times, _, spectrogram = analysis.get_spectrogram()
+    axis_names = ["x", "y", "z"] if analysis.dim == 3 else [str(i) for i in range(analysis.dim)]
+    titles = [t.format(axis) for axis in axis_names for t in ["{} - Welch PSD", "{} - Spectrogram (dB)"]]
+    fig = make_subplots(rows=analysis.dim, cols=2, column_widths=[0.3, 0.7], subplot_titles=titles)
+    for i in range(analysis.dim):
+        fig.add_trace(go.Scatter(x=frequencies, y=psd[:, i], mode='lines', name=axis_names[i]), row=i+1, col=1)
+        fig.add_trace(go.Heatmap(x=times, y=frequencies, z=spectrogram[:, :, i].T, colorscale='Viridis', showscale=(i == 0)), row=i+1, col=2)
+        fig.update_xaxes(title_text="Frequency (Hz)", row=i+1, col=1)
+        fig.update_yaxes(type="log", row=i+1, col=1)
+        fig.update_xaxes(title_text="Time (s)", row=i+1, col=2)
+        fig.update_yaxes(title_text="Frequency (Hz)", row=i+1, col=2)
+    title = "{} - Frequency plots".format(analysis.component_name)
+    if not analysis.is_done():
+        title += " (preview, {:.0f}% computed)".format(100 * analysis.get_progress())
+    # uirevision keeps the zoom of the user while the preview is updated
+    fig.update_layout(title=title, showlegend=False, uirevision=analysis.component_name)
+    return fig
+
+# Define a helper function to show the frequency plots in a Dash app, updated until the spectral analysis is completed
+def show_spectrum_dash(analysis, port):
+    from dash import Dash, dcc, html, Input, Output
+
+    app = Dash(__name__)
+    app.layout = html.Div([dcc.Graph(id="graph-id", figure=get_spectrum_figure(analysis), style={"height": "95vh"}),
+                           dcc.Interval(id="interval-id", interval=1000, disabled=analysis.is_done())])
+
+    @app.callback(Output("graph-id", "figure"), Output("interval-id", "disabled"), Input("interval-id", "n_intervals"), prevent_initial_call=True)
+    def update_graph(n_intervals):
+        # Checked before reading the results, so that the last update has all the blocks
+        done = analysis.is_done() or analysis.cancelled
+        return get_spectrum_figure(analysis), done
+
+    webbrowser.open_new_tab("http://127.0.0.1:{}".format(port))
+    app.run(port=port)
+
+# Define a helper function to run a spectral analysis in a background thread
+def run_spectral_analysis(analysis, jobs):
+    try:
+        analysis.run(jobs)
+        log.info("{}: spectral analysis completed".format(analysis.component_name))
+    except Exception as err:
+        log.exception(err)
+
+# Define a helper function to compute and plot the frequency plots of a component, without waiting for the whole computation
+def plot_spectrum(acquisition_path, comp_name, start_time, end_time, raw_data, fft_size, jobs):
+    global spectrum_port
+    try:
+        analysis = SpectralAnalysis(acquisition_path, comp_name, start_time, end_time, raw_data, fft_size, log=log)
+    except ValueError as err:
+        log.warning(err)
+        return
+    spectral_analyses.append(analysis)
+    threading.Thread(target=run_spectral_analysis, args=(analysis, jobs), daemon=True).start()
+    threading.Thread(target=show_spectrum_dash, args=(analysis, spectrum_port), daemon=True).start()
+    spectrum_port += 1
+
+# Define a helper function to plot the time window of a component read through the memory-mapped reader
+def plot_time_window(window, subplots):
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
+    df = window.get_dataframe()
+    data_columns = list(df.columns[1:])
+    rows = len(data_columns) if subplots else 1
+    fig = make_subplots(rows=rows, cols=1, shared_xaxes=True, subplot_titles=data_columns if subplots else None)
+    for i, c in enumerate(data_columns):
+        fig.add_trace(go.Scattergl(x=df.iloc[:, 0], y=df[c], mode='lines', name=c), row=i+1 if subplots else 1, col=1)
+    fig.update_xaxes(title_text="Time (s)", row=rows, col=1)
+    fig.update_layout(title=window.component_name)
+    fig.show()
+    return df
+
 # Define a helper function to plot data for a specific component
-def plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots):
+def plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, acq_folder, fft_plots, fft_size, jobs, memmap=False, debug=False):
     try:
-        df = HSDatalog.plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, fft_plots)
+        acquisition_path = HSDatalog.get_acquisition_path(hsd)
+        comp_name = list(component.keys())[0]
+        # The frequency plots of the components supported by the spectral analysis are computed in parallel
+        spectral = fft_plots and SpectralAnalysis.is_supported(acquisition_path, comp_name)
+        # Time windows are read through the memory-mapped reader, annotated plots are drawn by HSDatalog
+        use_memmap = memmap or (DatTimeWindow.is_time_window(start_time, end_time) and not debug)
+        window = DatTimeWindow.open(hsd, component, start_time, end_time, raw_data, log) if use_memmap and label is None and len(which_tags) == 0 else None
+        if window is not None:
+            df = plot_time_window(window, subplots)
+        else:
+            df = HSDatalog.plot(hsd, component, start_time, end_time, label, which_tags, subplots, raw_data, fft_plots and not spectral)
+        if spectral:
+            plot_spectrum(acquisition_path, comp_name, start_time, end_time, raw_data, fft_size, jobs)
         return df
     except MissingISPUOutputDescriptorException as ispu_err:
         # Handle missing ISPU output descriptor exception
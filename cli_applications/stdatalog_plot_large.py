@@ -29,7 +29,14 @@ visualization to the user's needs.
 
 NOTEs:
 - The ensure out-of-core plots for large datasets, the script, starting from an acquisition folder,
-    converts each selected sensor data to a Parquet file and then uses Dask for reading data in chunks.
+    converts each selected sensor data to Parquet files and then uses Dask for reading data in chunks.
+- The Parquet files are kept in a managed cache folder (see `parquet_cache.py`), in time partitions keyed by the
+    source files and the conversion options: plots of other time windows reuse the partitions already converted,
+    a changed acquisition is converted again, and the least recently used partitions are removed when the cache
+    exceeds its maximum size.
+- The full timeline is plotted as a multi-resolution min/max envelope, computed in parallel over all the
+    Parquet row groups. When zooming in (interactive mode), the raw rows of the visible range are read from
+    the Parquet file as soon as they are fewer than the -mp threshold, so the whole dataset is never in memory.
 - If you choose to plot all active sensors (using the `-s all` option):
     - If the -sp flag is not set, the script will plot each sensor in a dedicated browser tab
         one after the other. To display the next sensor plot is necessary to press CTRL+C in the terminal.
@@ -102,6 +109,8 @@ else:
 
 import os
 import webbrowser
+import numpy as np
+import pandas as pd
 import dask.dataframe as dd
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
@@ -110,6 +119,8 @@ import click
 from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingISPUOutputDescriptorException
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from parquet_cache import ParquetCache
+from dat_memmap_reader import DatMemmapReader
 
 script_version = "1.0.0"
 
@@ -131,6 +142,10 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_plot_large.py Acquisition_Folder_Path -l", fg='cyan')
         # Example: Plot data in subplots (one subplot for each sensor axis)
         click.secho("   python stdatalog_plot_large.py Acquisition_Folder_Path -p", fg='cyan')
+        # Example: Keep at most 200000 points per trace in memory
+        click.secho("   python stdatalog_plot_large.py Acquisition_Folder_Path -mp 200000", fg='cyan')
+        # Example: Use a 2 GB Parquet cache in a specific folder, with 10 seconds time partitions
+        click.secho("   python stdatalog_plot_large.py Acquisition_Folder_Path -cf Cache_Folder_Path -cms 2048 -pd 10", fg='cyan')
         # Example: Save plots as HTML files
         click.secho("   python stdatalog_plot_large.py Acquisition_Folder_Path -sp", fg='cyan')
         # Example: Upload a custom device model
@@ -149,12 +164,16 @@ def show_help(ctx, param, value):
 @click.option('-p', '--subplots', is_flag=True, help="Multiple subplot for multi-dimensional sensors", default=False)
 @click.option('-sp','--save_plots', is_flag=True, help="Save plots as HTML files", default=False)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
+@click.option('-mp', '--max_points', help="Maximum number of points of each trace kept in memory: the full timeline is shown as a min/max envelope, raw rows are read when the visible range holds fewer rows", type=click.IntRange(min=1000), default=1000000)
+@click.option('-cf', '--cache_folder', help="Parquet cache folder, shared by all the acquisitions", default=os.path.join(os.path.expanduser("~"), ".stdatalog", "parquet_cache"))
+@click.option('-cms', '--cache_max_size', help="Maximum size of the Parquet cache (MB), the least recently used time partitions are removed", type=click.IntRange(min=1), default=10240)
+@click.option('-pd', '--partition_duration', help="Duration of the Parquet cache time partitions (seconds)", type=click.IntRange(min=1), default=60)
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_plot_large", is_flag=True, help="stdatalog_plot_large tool version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option("-h"," --help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, subplots, save_plots, custom_device_model, debug):
+def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labeled, subplots, save_plots, custom_device_model, max_points, cache_folder, cache_max_size, partition_duration, debug):
 
     # If a custom device model is provided, upload it using the HSDatalogDTM module
     if custom_device_model is not None:
@@ -174,6 +193,9 @@ def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labe
     # Enable timestamp recovery if debug mode is on
     hsd.enable_timestamp_recovery(debug)
 
+    # Open the Parquet cache
+    cache = ParquetCache(cache_folder, cache_max_size * 2**20, partition_duration, log)
+
     # Main loop to plot data
     plot_flag = True
     while plot_flag:
@@ -183,7 +205,7 @@ def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labe
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             if component is not None:
                 label = ask_for_label(hsd, labeled)
-                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder)
+                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder, max_points, cache)
             else:
                 break
         # If 'all' is specified for sensor name, plot all active components
@@ -191,7 +213,7 @@ def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labe
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             label = ask_for_label(hsd, labeled)
             for component in component_list:
-                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder)
+                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder, max_points, cache)
             if not labeled:
                 plot_flag = False
         # If a specific sensor name is provided, plot only that component
@@ -199,7 +221,7 @@ def hsd_plot_large(acq_folder, sensor_name, start_time, end_time, raw_data, labe
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
                 label = ask_for_label(hsd, labeled)
-                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder)
+                plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder, max_points, cache)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component to plot found in your Device Configuration file.".format(sensor_name))
@@ -219,8 +241,112 @@ def ask_for_label(hsd, labeled):
             quit()
     return label
 
+# Define a helper function to compute the min/max aggregate of the rows of a dataframe partition, in blocks of block_size rows
+def block_min_max(df, columns, block_size):
+    block = np.arange(len(df)) // block_size
+    groups = df.groupby(block)
+    aggregate = pd.DataFrame({"t0": groups["Time"].first().to_numpy(), "t1": groups["Time"].last().to_numpy(), "count": groups.size().to_numpy()})
+    for c in columns:
+        aggregate[c + "_min"] = groups[c].min().to_numpy()
+        aggregate[c + "_max"] = groups[c].max().to_numpy()
+    return aggregate
+
+# Define a helper function to reduce a min/max aggregate level, grouping factor consecutive blocks
+def reduce_min_max(aggregate, columns, factor):
+    groups = aggregate.groupby(np.arange(len(aggregate)) // factor)
+    reduced = pd.DataFrame({"t0": groups["t0"].first().to_numpy(), "t1": groups["t1"].last().to_numpy(), "count": groups["count"].sum().to_numpy()})
+    for c in columns:
+        reduced[c + "_min"] = groups[c + "_min"].min().to_numpy()
+        reduced[c + "_max"] = groups[c + "_max"].max().to_numpy()
+    return reduced
+
+# Define a helper function to compute the multi-resolution min/max aggregate of a dataset, one row group at a time and in parallel
+def compute_min_max_levels(dask_df, columns, max_points, factor=4):
+    n_rows = int(dask_df.map_partitions(len).compute().sum())
+    # The finest level has at most max_points points (two for each block)
+    block_size = max(1, -(-2 * n_rows // max_points))
+    meta = block_min_max(dask_df._meta, columns, block_size)
+    levels = [dask_df.map_partitions(block_min_max, columns, block_size, meta=meta).compute().reset_index(drop=True)]
+    # Coarser levels are computed in memory from the finest one
+    while len(levels[-1]) > factor:
+        levels.append(reduce_min_max(levels[-1], columns, factor))
+    return levels
+
+# Define a helper function to get the envelope of a column in a time range from the finest level that fits max_points
+def get_envelope(levels, column, max_points, x0=None, x1=None):
+    for level in levels:
+        first = 0 if x0 is None else int(np.searchsorted(level["t1"].to_numpy(), x0, side='left'))
+        last = len(level) if x1 is None else int(np.searchsorted(level["t0"].to_numpy(), x1, side='right'))
+        if 2 * (last - first) <= max_points or level is levels[-1]:
+            break
+    blocks = level.iloc[first:last]
+    # Each block is drawn from its minimum to its maximum
+    x = np.empty(2 * len(blocks))
+    y = np.empty(2 * len(blocks))
+    x[0::2], x[1::2] = blocks["t0"].to_numpy(), blocks["t1"].to_numpy()
+    y[0::2], y[1::2] = blocks[column + "_min"].to_numpy(), blocks[column + "_max"].to_numpy()
+    return x, y
+
+# Define a helper function to count the rows of the dataset in a time range, from the finest aggregate level
+def count_rows(levels, x0, x1):
+    level = levels[0]
+    first = int(np.searchsorted(level["t1"].to_numpy(), x0, side='left'))
+    last = int(np.searchsorted(level["t0"].to_numpy(), x1, side='right'))
+    return int(level["count"].iloc[first:last].sum())
+
+# Define a helper function to read the raw rows of the dataset in a time range, only the row groups in the range are read
+def read_raw_rows(parquet_files, columns, x0, x1):
+    df = dd.read_parquet(parquet_files, columns=["Time"] + columns, filters=[("Time", ">=", x0), ("Time", "<=", x1)]).compute()
+    return df[(df["Time"] >= x0) & (df["Time"] <= x1)]
+
+# Define a helper function to get the visible time range from the relayout data of the plot
+def get_visible_range(relayout_data):
+    if relayout_data is None:
+        return None
+    for key in relayout_data:
+        if key.endswith(".range[0]") and key.startswith("xaxis"):
+            return relayout_data[key], relayout_data[key.replace("[0]", "[1]")]
+        if key.endswith(".autorange") and key.startswith("xaxis"):
+            return (None, None)
+    return None
+
+# Define a helper function to show the plot in a Dash app that fetches the raw rows of the visible range on demand
+def show_dash_on_demand(fig, parquet_files, levels, columns, max_points, port=8050):
+    from dash import Dash, dcc, html, Input, Output, no_update
+
+    app = Dash(__name__)
+    app.layout = html.Div([dcc.Graph(id="graph-id", figure=fig, style={"height": "95vh"})])
+
+    @app.callback(Output("graph-id", "figure"), Input("graph-id", "relayoutData"), prevent_initial_call=True)
+    def update_graph(relayout_data):
+        visible_range = get_visible_range(relayout_data)
+        if visible_range is None:
+            return no_update
+        x0, x1 = visible_range
+        raw = None
+        # Raw rows are read only when the visible range holds few of them, otherwise the envelope of the range is used
+        if x0 is not None and count_rows(levels, x0, x1) <= max_points:
+            raw = read_raw_rows(parquet_files, columns, x0, x1)
+        for i, c in enumerate(columns):
+            if raw is not None:
+                fig.hf_data[i]["x"], fig.hf_data[i]["y"] = raw["Time"].to_numpy(), raw[c].to_numpy()
+            else:
+                fig.hf_data[i]["x"], fig.hf_data[i]["y"] = get_envelope(levels, c, max_points, x0, x1)
+        # plotly-resampler downsamples the new data of the visible range
+        return fig.construct_update_data_patch(relayout_data)
+
+    webbrowser.open_new_tab("http://127.0.0.1:{}".format(port))
+    app.run(port=port)
+
+# Define a helper function to get the end time of the data of a component, if it can be read cheaply from its time index
+def get_acquisition_end(acq_folder, comp_name):
+    if not DatMemmapReader.is_supported(acq_folder, comp_name):
+        return None
+    timestamps = DatMemmapReader(acq_folder, comp_name, log=log).get_frame_timestamps()
+    return float(timestamps[-1]) if len(timestamps) > 0 else None
+
 # Define a helper function to plot data for a specific component
-def plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder):
+def plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_data, acq_folder, max_points, cache):
     try:
         # Check if labeled data is required
         labeled = label is not None
@@ -229,19 +355,29 @@ def plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_
         # Get the component name
         comp_name = list(component.keys())[0]
         
-        # Define the file path for the parquet file
-        file_path = os.path.join(acquisition_path, f'{comp_name}.parquet')
-        # Convert data to parquet format if the file does not exist
-        if not os.path.exists(file_path):
-            HSDatalog.convert_dat_to_xsv(hsd, component, start_time, end_time, labeled, raw_data, acquisition_path, "PARQUET")
+        # Get the parquet time partitions of the plot window from the cache, only the missing ones are converted
+        def convert_partition(p_start, p_end, output_folder):
+            HSDatalog.convert_dat_to_xsv(hsd, component, p_start, p_end, labeled, raw_data, output_folder, "PARQUET")
+        parquet_files = cache.get_partitions(convert_partition, acquisition_path, comp_name, start_time, end_time, raw_data, labeled, get_acquisition_end(acquisition_path, comp_name))
+        if len(parquet_files) == 0:
+            log.warning("No {} data to plot in the selected time range".format(comp_name))
+            return
         
-        # Read the parquet file into a Dask dataframe
-        dask_df = dd.read_parquet(file_path)
+        # Read the parquet files into a Dask dataframe, one partition for each row group
+        dask_df = dd.read_parquet(parquet_files, split_row_groups=True)
+        # The first and the last time partitions may hold rows out of the plot window
+        if end_time != -1:
+            dask_df = dask_df[(dask_df["Time"] >= start_time) & (dask_df["Time"] < end_time)]
+        elif start_time > 0:
+            dask_df = dask_df[dask_df["Time"] >= start_time]
         
         # Get the acquisition label classes
         acq_label_classes = HSDatalog.get_acquisition_label_classes(hsd)
         # Filter columns to plot
-        columns_to_plot = [item for item in dask_df.columns if item not in acq_label_classes]
+        columns_to_plot = [item for item in dask_df.columns if item not in acq_label_classes and item != "Time"]
+
+        # Compute the min/max aggregate of all the row groups, the raw rows are never loaded all together
+        levels = compute_min_max_levels(dask_df, columns_to_plot, max_points)
         
         # Define the layout of the plot with responsive attributes
         layout = go.Layout(
@@ -253,49 +389,37 @@ def plot(hsd, component, start_time, end_time, label, subplots, save_plots, raw_
         output_dir = "plots"
         os.makedirs(output_dir, exist_ok=True)
 
-        # Iterate over each chunk of the Dask dataframe
-        for chunk in dask_df.to_delayed():
-            chunk = chunk.compute()
-            x_column = "Time"
-            # Create subplots if required
+        # Create subplots if required
+        if subplots:
+            fig = FigureResampler(make_subplots(rows=len(columns_to_plot), cols=1))
+        else:
+            fig = FigureResampler(go.Figure(layout=layout))
+
+        # Add a trace for each column, with the envelope of the full timeline
+        for i, c in enumerate(columns_to_plot):
+            x, y = get_envelope(levels, c, max_points)
             if subplots:
-                fig = make_subplots(rows=len(columns_to_plot)-1, cols=1)
+                fig.add_trace(go.Scattergl(mode='lines', name=c), hf_x=x, hf_y=y, row=i+1, col=1)
             else:
-                fig = go.Figure(layout=layout)
-
-            # Add traces to the plot for each column
-            for i, c in enumerate(columns_to_plot):
-                if c != "Time":
-                    y_column = c
-                    if subplots:
-                        fig.add_trace(go.Scattergl(x=chunk[x_column], y=chunk[y_column], mode='lines', name=y_column), row=i, col=1)
-                    else:
-                        fig.add_trace(go.Scattergl(x=chunk[x_column], y=chunk[y_column], mode='lines', name=y_column))
-            
-            # Add vertical rectangles for labeled data
-            if labeled:
-                time_tags = HSDatalog.get_time_tags(hsd, label)
-                for tt in time_tags:
-                    fig.add_vrect(x0=tt["time_start"], x1=tt["time_end"], 
-                    annotation_text=tt["label"], annotation_position="top left",
-                    fillcolor="green", opacity=0.25, line_width=2)
-            
-        # NOTE: Here you can remove the parquet file after plotting if needed
-        # if os.path.exists(file_path):
-        #     os.remove(file_path)
+                fig.add_trace(go.Scattergl(mode='lines', name=c), hf_x=x, hf_y=y)
 
+        # Add vertical rectangles for labeled data
+        if labeled:
+            time_tags = HSDatalog.get_time_tags(hsd, label)
+            for tt in time_tags:
+                fig.add_vrect(x0=tt["time_start"], x1=tt["time_end"], 
+                annotation_text=tt["label"], annotation_position="top left",
+                fillcolor="green", opacity=0.25, line_width=2)
+            
         # Save plots as HTML files if required
         if save_plots:
-            resampler = FigureResampler(fig)
             html_file = os.path.join(output_dir, f"{comp_name}.html")
-            resampler.write_html(html_file)
+            fig.write_html(html_file)
             # Open the HTML file in the browser
             webbrowser.open_new_tab(f"file://{os.path.abspath(html_file)}")
         else:
-            # Display the plot in a web browser
-            webbrowser.open_new_tab("http://127.0.0.1:8050")
-            resampler = FigureResampler(fig)
-            resampler.show_dash()
+            # Display the plot in a web browser, the raw rows are fetched when zooming in
+            show_dash_on_demand(fig, parquet_files, levels, columns_to_plot, max_points)
 
     except MissingISPUOutputDescriptorException as ispu_err:
         # Handle missing ISPU output descriptor exception
@@ -31,6 +31,9 @@ Key Features:
 - Set start and end times for the data conversion.
 - Specify the length and increment of each segment for segmentation.
 - Option to convert raw data.
+- Memory-mapped reading mode (-mm, HSD v2 sensor components): only the samples of the time window are read from the
+  memory-mapped .dat file, found through a persistent time index (see `dat_time_window.py`). The segments are written
+  by `dat_time_window.py` to {component}_nanoedge.csv, without -mm they are written by HSDatalog.
 - Upload and use a custom Device Template Model (DTDL).
 - Enable debug mode to check for corrupted data and timestamps.
 """
@@ -46,6 +49,7 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError, MissingISPUOutputDescriptorException
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from dat_time_window import DatTimeWindow
 
 # Set up the application logger
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
@@ -64,6 +68,8 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_to_nanoedge.py Acquisition_Folder_Path -s iis3dwb_acc -sl 1000 -si 500", fg='cyan')
         # Example: Convert data for all sensors with specific segment length and increment, and save in a specified output folder
         click.secho("   python stdatalog_to_nanoedge.py Acquisition_Folder_Path -o Output_Folder_Path -s all -sl 32 -si 64 -r", fg='cyan')
+        # Example: Convert the data between 3600 and 3610 seconds for sensor iis3dwb_acc, reading only the samples of the time window through the memory-mapped reader
+        click.secho("   python stdatalog_to_nanoedge.py Acquisition_Folder_Path -s iis3dwb_acc -sl 1000 -st 3600 -et 3610 -mm", fg='cyan')
         # Exit the context after showing help
         ctx.exit()
 
@@ -85,12 +91,13 @@ def validate_signal_increment(ctx, param, value):
 @click.option('-r', '--raw_data', is_flag=True, help="Uses Raw data (not multiplied by sensitivity)", default=False)
 @click.option('-t', '--target_value', help="Adds target value (mandatory for NEAI extrapolation datasets)", type=float, default=None)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
+@click.option('-mm', '--memmap', is_flag=True, help="Read the .dat files through a memory map, only the samples in the time window are read (HSD v2 sensor components)", default=False)
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_to_nanoedge", is_flag=True, help="stdatalog_to_nanoedge Converter tool version number")
 @click.option('-d', '--debug', is_flag=True, help="[DEBUG] Check for corrupted data and timestamps", default=False)
 @click.option("-h", "--help", is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_increment, start_time, end_time, raw_data, target_value, custom_device_model, debug):
+def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_increment, start_time, end_time, raw_data, target_value, custom_device_model, memmap, debug):
     
     # If a custom device model is provided, upload it
     if custom_device_model is not None:
@@ -124,7 +131,7 @@ def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             if component is not None:
                 # Convert data for the selected component
-                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value)
+                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value, debug, memmap)
             else:
                 # Exit the loop if no component is selected
                 break
@@ -134,7 +141,7 @@ def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             # Iterate over each component and convert data
             for component in component_list:
-                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value)
+                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value, debug, memmap)
             # Set flag to False to exit the loop after processing all components
             df_flag = False
         # If a specific sensor name is provided, process only that component
@@ -142,7 +149,7 @@ def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
                 # Convert data for the specified component
-                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value)
+                convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value, debug, memmap)
             else:
                 # Log an error if the specified component is not found
                 log.exception("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
@@ -150,8 +157,14 @@ def hsd_dataframe(acq_folder, output_folder, sensor_name, signal_length, signal_
             df_flag = False
 
 # Define a helper function to convert data for a given component
-def convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value = None):
+def convert_data(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, acq_folder, target_value = None, debug = False, memmap = False):
     try:
+        # Read through the memory-mapped reader if it is selected (not with the timestamp recovery of the debug mode)
+        if memmap and not debug:
+            window = DatTimeWindow.open(hsd, component, start_time, end_time, raw_data, log)
+            if window is not None:
+                window.export_nanoedge(output_folder, signal_length, signal_increment, target_value)
+                return
         # Attempt to convert data to NanoEdge format
         HSDatalog.convert_dat_to_nanoedge(hsd, component, signal_length, signal_increment, start_time, end_time, raw_data, output_folder, target_value)
     except MissingISPUOutputDescriptorException as ispu_err:
@@ -33,6 +33,9 @@ Key Features:
 - Split the output into separate files for each tag.
 - Upload and use a custom Device Template Model (DTDL).
 - Specify the size of each data chunk to be processed.
+- Memory-mapped reading mode (HSD v2 microphones, not split per tags): only the samples of the time window are read
+  from the memory-mapped .dat file (see `dat_time_window.py`). The WAV file is written by `export_sinks.WavSink`,
+  with the sample rate measured on the timestamps, without -mm it is written by HSDatalog.
 """
 
 import sys
@@ -46,6 +49,7 @@ from stdatalog_core.HSD_utils.dtm import HSDatalogDTM
 from stdatalog_core.HSD_utils.exceptions import MissingDeviceModelError
 import stdatalog_core.HSD_utils.logger as logger
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from dat_time_window import DatTimeWindow
 
 # Set up the application logger to record debug information and errors
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
@@ -72,6 +76,8 @@ def show_help(ctx, param, value):
         click.secho("   python stdatalog_to_wav.py Acquisition_Folder_Path -s SENSOR_NAME -cs 500000", fg='cyan')
         # Example: Convert data to WAV format for a specific time range
         click.secho("   python stdatalog_to_wav.py Acquisition_Folder_Path -s SENSOR_NAME -st 3 -et 6", fg='cyan')
+        # Example: Convert a time range of a microphone to WAV format reading the .dat file through a memory map
+        click.secho("   python stdatalog_to_wav.py Acquisition_Folder_Path -s SENSOR_NAME -mm -st 3600 -et 3610", fg='cyan')
         # Exit the context after showing help
         ctx.exit()
 
@@ -85,11 +91,12 @@ def show_help(ctx, param, value):
 @click.option('-spt', '--split_per_tags', is_flag=True, help="Enable this option to split the output into separate files for each tag", default=False)
 @click.option('-cdm','--custom_device_model', help="Upload a custom Device Template Model (DTDL)", type=(int, int, str))
 @click.option('-cs', '--chunk_size', help="Specify the size (number of samples) of each data chunk to be processed", default=10000000)
+@click.option('-mm', '--memmap', is_flag=True, help="Read the .dat files through a memory map, only the samples in the time window are read (HSD v2 microphones, not split per tags)", default=False)
 @click.version_option(script_version, '-v', '--version', prog_name="stdatalog_to_wav", is_flag=True, help="stdatalog_to_wav Converter tool version number")
 @click.option('-h', '--help', is_flag=True, is_eager=True, expose_value=False, callback=show_help, help="Show this message and exit.",)
 
 # Define the main function that will be executed when the script is run
-def hsd_toWav(acq_folder, output_folder, sensor_name, start_time, end_time, split_per_tags, custom_device_model, chunk_size):
+def hsd_toWav(acq_folder, output_folder, sensor_name, start_time, end_time, split_per_tags, custom_device_model, chunk_size, memmap):
     
     # If a custom device model is provided, upload it
     if custom_device_model is not None:
@@ -124,7 +131,7 @@ def hsd_toWav(acq_folder, output_folder, sensor_name, start_time, end_time, spli
             component = HSDatalog.ask_for_component(hsd, only_active=True)
             if component is not None:
                 # Convert data to WAV format for the selected component
-                HSDatalog.convert_dat_to_wav(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size, memmap)
             else:
                 # Exit the loop if no component is selected
                 break
@@ -134,7 +141,7 @@ def hsd_toWav(acq_folder, output_folder, sensor_name, start_time, end_time, spli
             component_list = HSDatalog.get_all_components(hsd, only_active=True)
             # Iterate over each component and convert data to WAV format
             for component in component_list:
-                HSDatalog.convert_dat_to_wav(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size, memmap)
             # Set flag to False to exit the loop after processing all components
             df_flag = False
         # If a specific sensor name is provided, process only that component
@@ -142,13 +149,24 @@ def hsd_toWav(acq_folder, output_folder, sensor_name, start_time, end_time, spli
             component = HSDatalog.get_component(hsd, sensor_name)
             if component is not None:
                 # Convert data to WAV format for the specified component
-                HSDatalog.convert_dat_to_wav(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size)
+                convert_data(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size, memmap)
             else:
                 # Log an error if the specified component is not found
                 log.error("No \"{}\" Component found in your Device Configuration file.".format(sensor_name))
             # Set flag to False to exit the loop after processing the specified component
             df_flag = False
 
+# Define a helper function to convert the data of a component to WAV format
+def convert_data(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size, memmap=False):
+    c_name = list(component.keys())[0]
+    if memmap and not split_per_tags and c_name.endswith("_mic"):
+        # The raw microphone samples are written as they are stored in the .dat file
+        window = DatTimeWindow.open(hsd, component, start_time, end_time, True, log)
+        if window is not None:
+            window.export_wav(output_folder, chunk_size)
+            return
+    HSDatalog.convert_dat_to_wav(hsd, component, start_time, end_time, output_folder, split_per_tags, chunk_size)
+
 if __name__ == '__main__':
     # Execute the main function
     hsd_toWav()
@@ -0,0 +1,88 @@
+# *****************************************************************************
+#  * @file    test_export_sinks.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Tests of the sinks of stdatalog_multi_export.py on synthetic dataframe chunks (they do not require the SDK).
+
+Usage:
+    python -m pytest cli_applications/tests
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from export_sinks import CsvTagSink, UnicoAggregatedSink
+
+def make_dataframe(n_samples, rate, columns, t0=0.0):
+    times = t0 + np.arange(n_samples) / rate
+    df = pd.DataFrame({"Time": times})
+    for i, column in enumerate(columns):
+        df[column] = np.sin((i + 1) * times)
+    df["SW_TAG_0"] = (times > 0.3) & (times < 0.6)
+    return df
+
+def write_chunks(sink, component_name, df, chunk_size=128):
+    for start in range(0, len(df), chunk_size):
+        sink.write(component_name, {"c_type": 0}, df.iloc[start:start + chunk_size])
+    sink.close_component(component_name)
+
+def test_csv_tags_layout_matches_export_by_tags(tmp_path):
+    sink = CsvTagSink(str(tmp_path), with_untagged=True, out_format="TXT")
+    df = make_dataframe(1000, 1000, ["A_x [g]"])
+    write_chunks(sink, "iis3dwb_acc", df)
+    sink.close()
+    assert sorted(os.path.relpath(f, tmp_path) for f in sink.written_files) == [
+        os.path.join("SW_TAG_0", "SW_TAG_0_iis3dwb_acc_dataLog_0.txt"),
+        os.path.join("untagged", "untagged_iis3dwb_acc_dataLog_0.txt"),
+        os.path.join("untagged", "untagged_iis3dwb_acc_dataLog_1.txt")]
+    group = pd.read_csv(tmp_path / "SW_TAG_0" / "SW_TAG_0_iis3dwb_acc_dataLog_0.txt", sep='\t')
+    pd.testing.assert_frame_equal(group, df.loc[df["SW_TAG_0"], ["Time", "A_x [g]"]].reset_index(drop=True))
+
+@pytest.mark.parametrize("chunk_size", [7, 128, 5000])
+def test_unico_single_file_aligns_the_nearest_samples(tmp_path, chunk_size):
+    acc = make_dataframe(1000, 1000, ["A_x [g]", "A_y [g]"])
+    gyro = make_dataframe(500, 500, ["G_x [mdps]"], t0=0.0005)
+    sink = UnicoAggregatedSink(str(tmp_path), with_timestamps=True, columns_labels="mlc_tool", use_datalog_tags=True)
+    write_chunks(sink, "ism330dhcx_acc", acc, chunk_size)
+    write_chunks(sink, "ism330dhcx_gyro", gyro, chunk_size)
+    sink.close()
+    assert os.listdir(tmp_path) == ["unico_aggregated.csv"]
+    out = pd.read_csv(tmp_path / "unico_aggregated.csv")
+    assert list(out.columns) == ["Time", "A_X [mg]", "A_Y [mg]", "G_X [dps]", "SW_TAG_0"]
+    np.testing.assert_allclose(out["A_X [mg]"], acc["A_x [g]"] * 1000)
+    nearest = np.abs(gyro["Time"].to_numpy()[None, :] - acc["Time"].to_numpy()[:, None]).argmin(axis=1)
+    np.testing.assert_allclose(out["G_X [dps]"], gyro["G_x [mdps]"].to_numpy()[nearest] * 0.001)
+    np.testing.assert_array_equal(out["SW_TAG_0"], acc["SW_TAG_0"].astype(int))
+
+def test_unico_split_per_tags_writes_a_file_per_tag_group(tmp_path):
+    sink = UnicoAggregatedSink(str(tmp_path), aggregation="split_per_tags", out_format="TSV", with_untagged=True)
+    write_chunks(sink, "ism330dhcx_acc", make_dataframe(1000, 1000, ["A_x [g]"]))
+    write_chunks(sink, "stts22h_temp", make_dataframe(3, 3, ["T [Celsius]"]))
+    sink.close()
+    assert sorted(os.path.relpath(f, tmp_path) for f in sink.written_files) == [
+        os.path.join("SW_TAG_0", "SW_TAG_0_unico_aggregated_dataLog_0.tsv"),
+        os.path.join("untagged", "untagged_unico_aggregated_dataLog_0.tsv"),
+        os.path.join("untagged", "untagged_unico_aggregated_dataLog_1.tsv")]
+    group = pd.read_csv(tmp_path / "SW_TAG_0" / "SW_TAG_0_unico_aggregated_dataLog_0.tsv", sep='\t')
+    assert list(group.columns) == ["ism330dhcx_acc_A_x [g]", "stts22h_temp_T [Celsius]"]
+    # The buffered chunks are removed
+    assert sorted(os.listdir(tmp_path)) == ["SW_TAG_0", "untagged"]
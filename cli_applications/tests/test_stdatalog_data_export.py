@@ -0,0 +1,52 @@
+# *****************************************************************************
+#  * @file    test_stdatalog_data_export.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Smoke tests of stdatalog_data_export.py on the bundled acquisition examples.
+The tests run the script as the users do and require the SDK (stdatalog_core) and click, they are skipped otherwise.
+
+Usage:
+    python -m pytest cli_applications/tests
+"""
+
+import os
+import sys
+import filecmp
+import subprocess
+import pytest
+
+pytest.importorskip("click")
+pytest.importorskip("stdatalog_core")
+
+CLI_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ACQUISITION_FOLDER = os.path.abspath(os.path.join(CLI_FOLDER, "..", "acquisition_examples", "STWIN.box_acquisition_examples", "DL2_00001"))
+
+def run_data_export(output_folder, *options):
+    result = subprocess.run([sys.executable, os.path.join(CLI_FOLDER, "stdatalog_data_export.py"), ACQUISITION_FOLDER, "-o", str(output_folder)] + list(options),
+                            cwd=CLI_FOLDER, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Traceback" not in result.stderr, result.stderr
+    return sorted(f for f in os.listdir(output_folder) if f != "export_manifest.json")
+
+@pytest.mark.parametrize("file_format", ["CSV", "TXT"])
+def test_parallel_export_matches_serial_export(tmp_path, file_format):
+    serial_files = run_data_export(tmp_path / "serial", "-s", "all", "-f", file_format, "-j", "1")
+    parallel_files = run_data_export(tmp_path / "parallel", "-s", "all", "-f", file_format, "-j", "2")
+    assert len(serial_files) > 1
+    assert parallel_files == serial_files
+    for file_name in serial_files:
+        assert filecmp.cmp(tmp_path / "serial" / file_name, tmp_path / "parallel" / file_name, shallow=False), file_name
@@ -0,0 +1,72 @@
+# *****************************************************************************
+#  * @file    test_stdatalog_multi_export.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Comparison of the outputs of stdatalog_multi_export.py with the outputs of the separate export scripts it replaces,
+on a labeled bundled acquisition example.
+The tests run the scripts as the users do and require the SDK (stdatalog_core) and click, they are skipped otherwise.
+
+Usage:
+    python -m pytest cli_applications/tests
+"""
+
+import os
+import sys
+import subprocess
+import pandas as pd
+import pytest
+
+pytest.importorskip("click")
+pytest.importorskip("stdatalog_core")
+
+CLI_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ACQUISITION_FOLDER = os.path.abspath(os.path.join(CLI_FOLDER, "..", "acquisition_examples", "STWIN_acquisition_examples", "20240916_15_21_49"))
+SEPARATORS = {"CSV": ',', "TXT": '\t', "TSV": '\t'}
+
+def run_script(script, output_folder, *options):
+    result = subprocess.run([sys.executable, os.path.join(CLI_FOLDER, script), ACQUISITION_FOLDER, "-o", str(output_folder)] + list(options),
+                            cwd=CLI_FOLDER, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Traceback" not in result.stderr, result.stderr
+    files = []
+    for root, _, names in os.walk(output_folder):
+        files.extend(os.path.relpath(os.path.join(root, name), output_folder) for name in names if name != "export_manifest.json")
+    return sorted(files)
+
+def assert_same_data(path, expected_path, out_format):
+    df = pd.read_csv(path, sep=SEPARATORS[out_format])
+    expected = pd.read_csv(expected_path, sep=SEPARATORS[out_format])
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, rtol=1e-6)
+
+@pytest.mark.parametrize("out_format", ["CSV", "TXT"])
+def test_csv_tags_matches_export_by_tags(tmp_path, out_format):
+    files = run_script("stdatalog_multi_export.py", tmp_path / "multi", "-s", "all", "-k", "CSV_TAGS", "-f", out_format, "-wu")
+    expected_files = run_script("stdatalog_data_export_by_tags.py", tmp_path / "by_tags", "-s", "all", "-f", out_format, "-wu")
+    assert len(expected_files) > 0
+    assert files == expected_files
+    for file_name in files:
+        assert_same_data(tmp_path / "multi" / file_name, tmp_path / "by_tags" / file_name, out_format)
+
+@pytest.mark.parametrize("aggregation, options", [("single_file", ["-t"]), ("split_per_tags", ["-wu"])])
+def test_unico_matches_unico_aggregated(tmp_path, aggregation, options):
+    files = run_script("stdatalog_multi_export.py", tmp_path / "multi", "-s", "all", "-k", "UNICO", "-ag", aggregation, "-cl", "mlc_tool", *options)
+    expected_files = run_script("stdatalog_to_unico.py", tmp_path / "unico", "-s", "all", "-ag", aggregation, "-cl", "mlc_tool", "-f", "CSV", *options)
+    assert len(expected_files) > 0
+    # Same folders and number of files, the name of the aggregated files is set by the sink
+    assert [os.path.dirname(f) for f in files] == [os.path.dirname(f) for f in expected_files]
+    for file_name, expected_file_name in zip(files, expected_files):
+        assert_same_data(tmp_path / "multi" / file_name, tmp_path / "unico" / expected_file_name, "CSV")
@@ -0,0 +1,129 @@
+# *****************************************************************************
+#  * @file    plugin_chain_benchmark.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Benchmark of a chain of DataToolkit plugins.
+
+The script replays the .dat stream of a component of a recorded HSD v2 acquisition through a chain of
+plugins, one packet (samples_per_ts samples and their timestamp, as delivered by the DataToolkit pipeline)
+at a time, and reports for each stage of the chain:
+- the latency of process(), per packet (mean, median, 99th percentile and maximum)
+- the memory allocated by process(), per packet (peak of the memory traced by tracemalloc during the call,
+  numpy arrays included), measured in a second replay so that tracing does not affect the latency
+
+By default the chain is FilterPlugin -> ProcessPlugin of the ChainedPlugins tutorial. The messages printed
+by the plugins are discarded, unless --show_output is given.
+
+Usage:
+    python plugin_chain_benchmark.py ../../acquisition_examples/STWIN.box_acquisition_examples/DL2_00001
+    python plugin_chain_benchmark.py <acq_folder> -c iis3dwb_acc -p FilterPlugin.py -p ProcessPlugin.py -r 10
+"""
+
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+import contextlib
+import numpy as np
+
+# Add the replay directory to the sys.path (acquisition replay helpers)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../replay')))
+
+from plugin_replay import DatMemmapReader, load_plugin, get_components_status, make_packet
+
+CHAINED_PLUGINS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '../tutorials/simple/ChainedPlugins'))
+DEFAULT_CHAIN = [os.path.join(CHAINED_PLUGINS_FOLDER, "FilterPlugin.py"), os.path.join(CHAINED_PLUGINS_FOLDER, "ProcessPlugin.py")]
+
+
+def replay(plugins, reader, n_packets, trace_memory):
+    """
+    Replays the packets of a component through the chain of plugins.
+
+    Args:
+        plugins (list): The plugin instances, in chain order.
+        reader (DatMemmapReader): The reader of the replayed component.
+        n_packets (int): The number of packets to replay.
+        trace_memory (bool): If True, the memory allocated by each stage is traced instead of the latency.
+
+    Returns:
+        np.ndarray: The latency (seconds) or the allocated bytes of each stage, with shape (n_plugins, n_packets).
+    """
+    timestamps = reader.get_frame_timestamps()
+    results = np.zeros((len(plugins), n_packets))
+    if trace_memory:
+        tracemalloc.start()
+    for p in plugins:
+        if hasattr(p, "start_log_cb"):
+            p.start_log_cb()
+    for k in range(n_packets):
+        # Each packet is a new array of interleaved samples, as the one received from the device
+        data = make_packet(reader, k, timestamps[k])
+        for i, p in enumerate(plugins):
+            if trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                p.process(data)
+                results[i, k] = tracemalloc.get_traced_memory()[1] - before
+            else:
+                start = time.perf_counter()
+                p.process(data)
+                results[i, k] = time.perf_counter() - start
+    for p in plugins:
+        if hasattr(p, "stop_log_cb"):
+            p.stop_log_cb()
+    if trace_memory:
+        tracemalloc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of a chain of DataToolkit plugins")
+    parser.add_argument("acq_folder", help="HSD v2 acquisition folder")
+    parser.add_argument("-c", "--component", default="iis3dwb_acc", help="Replayed component")
+    parser.add_argument("-p", "--plugin", action="append", help="Plugin file, in chain order (repeat the option for each stage). Defaults to the ChainedPlugins tutorial")
+    parser.add_argument("-r", "--repeat", type=int, default=1, help="Number of times the stream is replayed in the latency measurement")
+    parser.add_argument("-n", "--max_packets", type=int, default=None, help="Maximum number of packets replayed")
+    parser.add_argument("--show_output", action="store_true", help="Show the messages printed by the plugins")
+    args = parser.parse_args()
+
+    plugin_files = args.plugin if args.plugin else DEFAULT_CHAIN
+    reader = DatMemmapReader(args.acq_folder, args.component)
+    n_packets = reader.n_frames if args.max_packets is None else min(args.max_packets, reader.n_frames)
+    print(f"{args.component}: {n_packets} packets of {reader.spts} samples x {reader.dim} axes")
+
+    output = contextlib.nullcontext() if args.show_output else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with output:
+        plugins = [load_plugin(f) for f in plugin_files]
+        components_status = get_components_status(args.acq_folder, [args.component])
+        for p in plugins:
+            p.components_status = components_status
+        latency = np.hstack([replay(plugins, reader, n_packets, trace_memory=False) for _ in range(args.repeat)])
+        allocated = replay(plugins, reader, n_packets, trace_memory=True)
+
+    print(f"{'stage':<24}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}{'alloc B/packet':>16}{'max alloc B':>14}")
+    for i, file_path in enumerate(plugin_files):
+        us = latency[i] * 1e6
+        print(f"{os.path.basename(file_path):<24}{us.mean():>10.1f}{np.median(us):>10.1f}{np.percentile(us, 99):>10.1f}{us.max():>10.1f}"
+              f"{allocated[i].mean():>16.0f}{allocated[i].max():>14.0f}")
+    total = latency.sum(axis=0) * 1e6
+    print(f"{'chain':<24}{total.mean():>10.1f}{np.median(total):>10.1f}{np.percentile(total, 99):>10.1f}{total.max():>10.1f}"
+          f"{allocated.sum(axis=0).mean():>16.0f}{allocated.sum(axis=0).max():>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
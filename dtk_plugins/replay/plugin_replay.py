@@ -0,0 +1,298 @@
+# *****************************************************************************
+#  * @file    plugin_replay.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Offline replay of a recorded acquisition through DataToolkit plugins.
+
+The script loads a chain of plugins (files defining a PluginClass, as selected in the DataToolkit GUI) and feeds
+them the data of a recorded HSD v2 acquisition folder, without a board and without the GUI:
+- start_log_cb() is called before the first packet and stop_log_cb() after the last one
+- the .dat stream of each replayed component is split in packets of samples_per_ts samples, rebuilt as
+  HSD_DataToolkit_data objects (the interleaved axes as a float64 array, the timestamp of the last sample) and
+  passed to process() of each plugin of the chain, the packets of all the components sorted by timestamp
+- tag_cb(status, label) is called at the time of each tag event recorded in acquisition_info.json
+- the replay runs as fast as possible, or paced at the original speed (--speed 1) or at a multiple of it
+
+The plugins see in components_status the status of all the components of device_config.json, with only the
+replayed components enabled. The plugins that send their data to a plot widget get a headless stand-in that
+discards the data, since create_plot_widget() is not called.
+
+At the end the script reports, for each plugin, the time spent in process() and the throughput in samples/s,
+and for the whole replay the wall-clock time and the real-time factor, so that the plugins can be load-tested
+before deploying them.
+
+Usage:
+    python plugin_replay.py ../../acquisition_examples/STWIN.box_acquisition_examples/DL2_00001 -p ../tutorials/simple/HelloWorld/HelloWorldPlugin.py
+    python plugin_replay.py <acq_folder> -p FilterPlugin.py -p ProcessPlugin.py -c iis3dwb_acc --speed 1 --quiet
+"""
+
+import sys
+import os
+import json
+import time
+import heapq
+import argparse
+import contextlib
+import importlib.util
+from datetime import datetime
+import numpy as np
+
+# Add the cli_applications directory to the sys.path (memory-mapped .dat reader)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../cli_applications')))
+
+from dat_memmap_reader import DatMemmapReader
+from stdatalog_dtk.HSD_DataToolkit_Pipeline import HSD_DataToolkit_data
+
+TAG_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+# Event kinds, the tags of a timestamp are sent before the packets of the same timestamp
+TAG_EVENT = 0
+PACKET_EVENT = 1
+
+
+class NullPlotWidget:
+    """
+    Headless stand-in of a plugin plot widget: the data sent to the plot is counted and discarded.
+    """
+    def __init__(self):
+        self.n_updates = 0
+
+    def add_data(self, data):
+        self.n_updates += 1
+
+
+def load_plugin(file_path):
+    """
+    Loads a plugin file and instantiates its PluginClass.
+
+    Args:
+        file_path (str): The path of the plugin file.
+
+    Returns:
+        HSD_Plugin: The plugin instance.
+    """
+    module_name = os.path.splitext(os.path.basename(file_path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PluginClass()
+
+
+def get_components_status(acq_folder, enabled_components):
+    """
+    Gets the status of all the components of an acquisition, as seen by the plugins in components_status.
+
+    Args:
+        acq_folder (str): The acquisition folder.
+        enabled_components (list): The replayed components, the only ones enabled.
+
+    Returns:
+        dict: The status of each component, by component name.
+    """
+    with open(os.path.join(acq_folder, "device_config.json"), 'r') as f:
+        device_config = json.load(f)
+    components_status = {}
+    for component in device_config["devices"][0]["components"]:
+        for comp_name, status in component.items():
+            components_status[comp_name] = dict(status, enable=comp_name in enabled_components)
+    return components_status
+
+
+def get_tag_events(acq_folder):
+    """
+    Gets the tag events of an acquisition, with their time from the start of the acquisition.
+
+    Args:
+        acq_folder (str): The acquisition folder.
+
+    Returns:
+        list: The (time, status, label) tuple of each tag event, sorted by time.
+    """
+    with open(os.path.join(acq_folder, "acquisition_info.json"), 'r') as f:
+        acquisition_info = json.load(f)
+    tags = acquisition_info.get("tags", [])
+    if not tags:
+        return []
+    start_time = datetime.strptime(acquisition_info["start_time"], TAG_TIME_FORMAT)
+    events = [((datetime.strptime(tag["ta"], TAG_TIME_FORMAT) - start_time).total_seconds(), tag["e"], tag["l"]) for tag in tags]
+    return sorted(events, key=lambda e: e[0])
+
+
+def make_packet(reader, frame_index, timestamp):
+    """
+    Rebuilds the DataToolkit data of a packet, that is, of a frame of the .dat file.
+
+    Args:
+        reader (DatMemmapReader): The reader of the component.
+        frame_index (int): The frame index.
+        timestamp (float): The timestamp of the frame.
+
+    Returns:
+        HSD_DataToolkit_data: The packet, with a new float64 array of interleaved axes.
+    """
+    samples = reader.get_frames(frame_index, frame_index + 1).astype(np.float64).reshape(-1)
+    return HSD_DataToolkit_data(reader.component_name, samples, timestamp)
+
+
+class PluginReplay:
+    def __init__(self, acq_folder, plugin_files, components=None, speed=None, duration=None):
+        """
+        Prepare the replay of an acquisition through a chain of plugins.
+
+        Args:
+            acq_folder (str): The HSD v2 acquisition folder.
+            plugin_files (list): The plugin files, in chain order.
+            components (list, optional): The replayed components. Defaults to None, that is, all the sensor components with a .dat file.
+            speed (float, optional): The replay speed, 1 for the original speed. Defaults to None, that is, as fast as possible.
+            duration (float, optional): The replayed time from the first packet, in seconds. Defaults to None, that is, the whole acquisition.
+
+        Raises:
+            ValueError: If a requested component cannot be replayed or if no component can be replayed.
+        """
+        self.acq_folder = acq_folder
+        self.plugin_files = plugin_files
+        self.speed = speed
+        self.duration = duration
+
+        if components is None:
+            with open(os.path.join(acq_folder, "device_config.json"), 'r') as f:
+                device_config = json.load(f)
+            names = [name for component in device_config["devices"][0]["components"] for name in component]
+            components = [name for name in names if DatMemmapReader.is_supported(acq_folder, name)]
+        if not components:
+            raise ValueError("No sensor component to replay in {}".format(acq_folder))
+        self.readers = [DatMemmapReader(acq_folder, name) for name in components]
+        self.components_status = get_components_status(acq_folder, components)
+        self.tag_events = get_tag_events(acq_folder)
+
+        self.plugins = [load_plugin(f) for f in plugin_files]
+        for p in self.plugins:
+            p.components_status = self.components_status
+            if getattr(p, "plot_widget", None) is None:
+                p.plot_widget = NullPlotWidget()
+        self.stats = None
+
+    def _events(self):
+        # Merge the packets of all the components and the tag events in time order
+        streams = [[(t, PACKET_EVENT, i, k) for k, t in enumerate(reader.get_frame_timestamps().tolist())]
+                   for i, reader in enumerate(self.readers)]
+        streams.append([(t, TAG_EVENT, j, None) for j, (t, _, _) in enumerate(self.tag_events)])
+        return heapq.merge(*streams)
+
+    def run(self):
+        """
+        Replay the acquisition through the plugins.
+
+        Returns:
+            dict: The replay statistics (see get_report).
+        """
+        n_plugins = len(self.plugins)
+        stats = {"packets": np.zeros(n_plugins, dtype=np.int64), "samples": np.zeros(n_plugins, dtype=np.int64),
+                 "process_time": np.zeros(n_plugins), "max_process_time": np.zeros(n_plugins),
+                 "tags": 0, "replayed_time": 0.0, "wall_time": 0.0, "max_lag": 0.0}
+        for p in self.plugins:
+            if hasattr(p, "start_log_cb"):
+                p.start_log_cb()
+        first_time = None
+        wall_start = time.perf_counter()
+        try:
+            for t, kind, index, frame_index in self._events():
+                if first_time is None:
+                    first_time = t
+                if self.duration is not None and t - first_time > self.duration:
+                    break
+                if self.speed:
+                    # Wait for the time of the event, or record how late the replay is
+                    delay = wall_start + (t - first_time) / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        stats["max_lag"] = max(stats["max_lag"], -delay)
+                stats["replayed_time"] = t - first_time
+
+                if kind == TAG_EVENT:
+                    _, status, label = self.tag_events[index]
+                    for p in self.plugins:
+                        if hasattr(p, "tag_cb"):
+                            p.tag_cb(status, label)
+                    stats["tags"] += 1
+                    continue
+
+                reader = self.readers[index]
+                data = make_packet(reader, frame_index, t)
+                for i, p in enumerate(self.plugins):
+                    start = time.perf_counter()
+                    result = p.process(data)
+                    elapsed = time.perf_counter() - start
+                    stats["packets"][i] += 1
+                    stats["samples"][i] += reader.spts
+                    stats["process_time"][i] += elapsed
+                    stats["max_process_time"][i] = max(stats["max_process_time"][i], elapsed)
+                    # The output of a plugin is the input of the next one
+                    if result is not None:
+                        data = result
+        finally:
+            for p in self.plugins:
+                if hasattr(p, "stop_log_cb"):
+                    p.stop_log_cb()
+            stats["wall_time"] = time.perf_counter() - wall_start
+            self.stats = stats
+        return stats
+
+    def get_report(self):
+        """
+        Get the report of the last replay.
+
+        Returns:
+            str: For each plugin, the packets and samples processed, the time spent in process() and the throughput in
+            samples/s (samples processed per second of process() time); for the replay, the replayed and wall-clock time,
+            the real-time factor and, for paced replays, the maximum lag behind the original timing.
+        """
+        s = self.stats
+        lines = [f"{'plugin':<28}{'packets':>10}{'samples':>12}{'process s':>11}{'max ms':>9}{'samples/s':>14}"]
+        for i, file_path in enumerate(self.plugin_files):
+            rate = s["samples"][i] / s["process_time"][i] if s["process_time"][i] > 0 else float('inf')
+            lines.append(f"{os.path.basename(file_path):<28}{s['packets'][i]:>10}{s['samples'][i]:>12}{s['process_time'][i]:>11.3f}"
+                         f"{s['max_process_time'][i] * 1e3:>9.2f}{rate:>14.0f}")
+        realtime = s["replayed_time"] / s["wall_time"] if s["wall_time"] > 0 else float('inf')
+        lines.append(f"replayed {s['replayed_time']:.2f} s of acquisition ({s['tags']} tag events) in {s['wall_time']:.2f} s, "
+                     f"x{realtime:.1f} real time")
+        if self.speed:
+            lines.append(f"maximum lag behind the x{self.speed:g} timing: {s['max_lag'] * 1e3:.1f} ms")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay of a recorded acquisition through DataToolkit plugins")
+    parser.add_argument("acq_folder", help="HSD v2 acquisition folder")
+    parser.add_argument("-p", "--plugin", action="append", required=True, help="Plugin file, in chain order (repeat the option for each plugin)")
+    parser.add_argument("-c", "--component", action="append", help="Replayed component (repeat the option for each component). Defaults to all the sensor components")
+    parser.add_argument("-s", "--speed", type=float, default=None, help="Replay speed, 1 for the original speed. Defaults to as fast as possible")
+    parser.add_argument("-t", "--duration", type=float, default=None, help="Replayed time from the first packet, in seconds. Defaults to the whole acquisition")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Discard the messages printed by the plugins")
+    args = parser.parse_args()
+
+    output = contextlib.redirect_stdout(open(os.devnull, 'w')) if args.quiet else contextlib.nullcontext()
+    with output:
+        replay = PluginReplay(args.acq_folder, args.plugin, args.component, args.speed, args.duration)
+    print("replayed components: " + ", ".join(r.component_name for r in replay.readers))
+    with output:
+        replay.run()
+    print(replay.get_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,99 @@
 import os
+import sys
+import time
 import threading
 import queue
 import numpy as np
-import pandas as pd
 from datetime import datetime
 from stdatalog_dtk.HSD_DataToolkit_Pipeline import HSD_DataToolkit_data, HSD_Plugin
 
 OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Output format: "CSV", or a binary format converted to CSV offline ("NPY", or "PARQUET" that requires pyarrow)
+OUTPUT_FORMAT = "CSV"
+# Size of the data written to the file at a time (bytes of the float64 samples in memory)
+BATCH_BYTES = 1024 * 1024
+# Maximum number of chunks waiting for the writer thread of a component, then process blocks (backpressure)
+QUEUE_MAX_CHUNKS = 256
+# Number format of the CSV values
+CSV_FORMAT = '%.15g'
+
+# CSV output, the file handle stays open for the whole acquisition
+class CSVSink:
+    EXTENSION = ".csv"
+
+    def __init__(self, file_name, headers):
+        self.file = open(file_name, 'w', newline='')
+        self.file.write(",".join(headers) + "\n")
+
+    def write(self, batch):
+        np.savetxt(self.file, batch, fmt=CSV_FORMAT, delimiter=',')
+
+    def close(self):
+        self.file.close()
+
+# NPY output: the rows are appended after a fixed size header that is updated with the number of rows on close
+class NPYSink:
+    EXTENSION = ".npy"
+    HEADER_SIZE = 128
+
+    def __init__(self, file_name, headers):
+        self.file = open(file_name, 'wb')
+        self.dim = len(headers)
+        self.rows = 0
+        self._write_header()
+
+    def _write_header(self):
+        self.file.seek(0)
+        np.lib.format.write_array_header_1_0(self.file, {'descr': '<f8', 'fortran_order': False, 'shape': (self.rows, self.dim)})
+        if self.file.tell() != NPYSink.HEADER_SIZE:
+            raise ValueError(f"Unexpected NPY header size: {self.file.tell()}")
+        self.file.seek(0, os.SEEK_END)
+
+    def write(self, batch):
+        self.file.write(np.ascontiguousarray(batch, dtype='<f8').tobytes())
+        self.rows += len(batch)
+
+    def close(self):
+        self._write_header()
+        self.file.close()
+
+# Parquet output, a row group for each batch
+class ParquetSink:
+    EXTENSION = ".parquet"
+
+    def __init__(self, file_name, headers):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.headers = headers
+        self.writer = pq.ParquetWriter(file_name, pa.schema([(h, pa.float64()) for h in headers]))
+
+    def write(self, batch):
+        self.writer.write_table(self.pa.table({h: batch[:, i] for i, h in enumerate(self.headers)}))
+
+    def close(self):
+        self.writer.close()
+
+SINKS = {"CSV": CSVSink, "NPY": NPYSink, "PARQUET": ParquetSink}
+
+# Convert a binary (NPY or Parquet) output file to CSV, one batch at a time
+def convert_to_csv(file_name, csv_file_name=None):
+    csv_file_name = os.path.splitext(file_name)[0] + ".csv" if csv_file_name is None else csv_file_name
+    if file_name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file_name)
+        headers = parquet_file.schema_arrow.names
+        batches = (np.column_stack([c.to_numpy() for c in b.columns]) for b in parquet_file.iter_batches(batch_size=BATCH_BYTES // (8 * len(headers))))
+    else:
+        data = np.load(file_name, mmap_mode='r')
+        headers = ["Time"] + [f"Data_axis_{i}" for i in range(data.shape[1] - 1)]
+        rows = max(1, BATCH_BYTES // (8 * data.shape[1]))
+        batches = (data[i:i + rows] for i in range(0, len(data), rows))
+    sink = CSVSink(csv_file_name, headers)
+    for batch in batches:
+        sink.write(batch)
+    sink.close()
+    return csv_file_name
 
 class PluginClass(HSD_Plugin):
     def __init__(self):
@@ -16,81 +103,134 @@ class PluginClass(HSD_Plugin):
         self.components_files = {}
         self.data_queues = {}
         self.writer_threads = {}
-        
+        self.metrics = {}
+
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
-    
+
     # Method to recreate timestamps based on the last timestamp, number of samples, and output data rate (odr)
     def _recreate_timestamps(self, last_timestamp, num_samples, odr):
-        interval = 1.0 / odr
-        timestamps = [last_timestamp - (num_samples - 1 - i) * interval for i in range(num_samples)]
-        return timestamps
-
-    # Initialize the CSV file with headers
-    def _initialize_csv(self, file_name, headers):
-        print("Initializing CSV file")
-        df = pd.DataFrame(columns=headers)
-        df.to_csv(file_name, mode='w', header=True, index=False)
-
-    # Function to save a batch of data to CSV
-    def _save_batch_to_csv(self, data_batch, file_name):
-        # Ensure data_batch is a 2D array
-        data_batch_2d = np.vstack(data_batch)
-        df = pd.DataFrame(data_batch_2d)
-        df.to_csv(file_name, mode='a', header=False, index=False)
-
-    # Worker function to write data from the queue to the CSV file
-    def _writer_worker(self, data_queue, file_name, batch_size):
+        return last_timestamp + (np.arange(num_samples) - (num_samples - 1)) / odr
+
+    # Write the chunks of a batch to the output file
+    def _write_batch(self, sink, batch, metrics):
+        if batch:
+            data_batch = np.vstack(batch)
+            sink.write(data_batch)
+            metrics["batches"] += 1
+            metrics["bytes"] += data_batch.nbytes
+
+    # Worker function to write data from the queue to the output file, a batch of BATCH_BYTES at a time
+    def _writer_worker(self, data_queue, sink, metrics):
+        try:
+            self._write_chunks(data_queue, sink, metrics)
+        except Exception as e:
+            # Write error (e.g. disk full): process drops the next chunks and the queued ones are discarded until the
+            # stop, so that neither process nor stop_log_cb block on the full queue
+            metrics["error"] = e
+            print(f"CSVDataSavePlugin write error, the data is no longer saved: {e}")
+            while data_queue.get() is not None:
+                metrics["discarded_chunks"] += 1
+        finally:
+            try:
+                sink.close()
+            except Exception as e:
+                print(f"CSVDataSavePlugin close error: {e}")
+
+    # Write the chunks of the queue until the stop (None chunk)
+    def _write_chunks(self, data_queue, sink, metrics):
         batch = []
+        batch_bytes = 0
         while True:
-            data_chunk = data_queue.get()
+            try:
+                data_chunk = data_queue.get(timeout=1.0)
+            except queue.Empty:
+                # No data for a while: write the pending chunks
+                self._write_batch(sink, batch, metrics)
+                batch, batch_bytes = [], 0
+                continue
             if data_chunk is None:
-                if batch:
-                    self._save_batch_to_csv(batch, file_name)
+                self._write_batch(sink, batch, metrics)
                 break
             batch.append(data_chunk)
-            if len(batch) >= batch_size:
-                self._save_batch_to_csv(batch, file_name)
-                batch = []
+            batch_bytes += data_chunk.nbytes
+            if batch_bytes >= BATCH_BYTES:
+                self._write_batch(sink, batch, metrics)
+                batch, batch_bytes = [], 0
             data_queue.task_done()
-    
+
     # Process incoming data and add it to the queue
     def process(self, data:HSD_DataToolkit_data):
         component_name = data.comp_name
         if component_name not in self.components_status:
             print(f"Component {component_name} not found in components_status")
             return
+        if component_name not in self.data_queues:
+            return
         odr = self.components_status[component_name].get('odr', 1)
         dim = self.components_status[component_name].get('dim', 1)
         num_samples = len(data.data) // dim
-        timestamps = self._recreate_timestamps(data.timestamp, num_samples, odr)
-        axis_data = np.array([data.data[j::dim] for j in range(dim)])
-        combined_data = np.column_stack((timestamps, axis_data.T))
-        self.data_queues[component_name].put(combined_data)
+        # One row per sample: the timestamp followed by the axes
+        combined_data = np.empty((num_samples, dim + 1))
+        combined_data[:, 0] = self._recreate_timestamps(data.timestamp, num_samples, odr)
+        combined_data[:, 1:] = np.asarray(data.data)[:num_samples * dim].reshape(num_samples, dim)
+
+        # If the writer thread failed, the chunk is dropped. If it falls behind, wait for a free slot in the queue and
+        # measure the time spent waiting
+        data_queue = self.data_queues[component_name]
+        metrics = self.metrics[component_name]
+        if metrics["error"] is not None:
+            metrics["dropped_chunks"] += 1
+            return
+        try:
+            data_queue.put_nowait(combined_data)
+        except queue.Full:
+            start = time.perf_counter()
+            data_queue.put(combined_data)
+            metrics["blocked_puts"] += 1
+            metrics["blocked_time"] += time.perf_counter() - start
+        metrics["chunks"] += 1
+        metrics["max_queue_depth"] = max(metrics["max_queue_depth"], data_queue.qsize())
 
     # Create a plot widget (currently just a placeholder)
     def create_plot_widget(self):
         print("CSVDataSavePlugin create_plot_widget method called")
-    
-    # Start logging callback, initializes CSV files and writer threads for each component and starts the writer threads
+
+    # Start logging callback, creates the output files and writer threads for each component and starts the writer threads
     def start_log_cb(self):
         current_time = datetime.now().strftime("%Y%m%d_%H_%M_%S")
+        sink_class = SINKS[OUTPUT_FORMAT]
         for component_name, status in self.components_status.items():
             if status.get('enable', False):
-                csv_file_path = os.path.join(self.output_dir, f"{component_name}_{current_time}.csv")
-                self.components_files[component_name] = csv_file_path
+                file_path = os.path.join(self.output_dir, f"{component_name}_{current_time}{sink_class.EXTENSION}")
+                self.components_files[component_name] = file_path
                 header = ["Time"]
                 header.extend([f"Data_axis_{i}" for i in range(status.get('dim', 1))])
-                batch_size = 5  # Number of chunks per batch
-                self.data_queues[component_name] = queue.Queue()
-                # Initialize the CSV file
-                self._initialize_csv(csv_file_path, header)
-                writer_thread = threading.Thread(target=self._writer_worker, args=(self.data_queues[component_name], csv_file_path, batch_size))
+                self.data_queues[component_name] = queue.Queue(maxsize=QUEUE_MAX_CHUNKS)
+                self.metrics[component_name] = {"chunks": 0, "batches": 0, "bytes": 0, "max_queue_depth": 0, "blocked_puts": 0, "blocked_time": 0.0,
+                                                 "error": None, "dropped_chunks": 0, "discarded_chunks": 0}
+                # Create the output file
+                print(f"Initializing {OUTPUT_FORMAT} file")
+                sink = sink_class(file_path, header)
+                writer_thread = threading.Thread(target=self._writer_worker, args=(self.data_queues[component_name], sink, self.metrics[component_name]))
                 self.writer_threads[component_name] = writer_thread
                 self.writer_threads[component_name].start()
-    
-    # Stop logging callback, stops the writer threads for each component and joins them to the main thread
+
+    # Stop logging callback, stops the writer threads for each component, joins them to the main thread and prints the writer metrics
     def stop_log_cb(self):
         for component_name in self.components_files:
             self.data_queues[component_name].put(None)
-            self.writer_threads[component_name].join()
\ No newline at end of file
+            self.writer_threads[component_name].join()
+            m = self.metrics[component_name]
+            print(f"{component_name}: {m['chunks']} chunks, {m['bytes'] / 2**20:.1f} MB in {m['batches']} batches, "
+                  f"max queue depth {m['max_queue_depth']}/{QUEUE_MAX_CHUNKS}, {m['blocked_puts']} blocked puts ({m['blocked_time']:.2f} s)")
+            if m["error"] is not None:
+                print(f"{component_name}: write error ({m['error']}), {m['discarded_chunks']} queued chunks discarded, {m['dropped_chunks']} chunks dropped")
+        self.components_files = {}
+        self.data_queues = {}
+        self.writer_threads = {}
+
+if __name__ == '__main__':
+    # Convert the binary output files given as arguments to CSV
+    for file_name in sys.argv[1:]:
+        print(f"{file_name} converted to {convert_to_csv(file_name)}")
@@ -1,3 +1,4 @@
+import time
 from collections import deque
 import pyqtgraph as pg
 from PySide6.QtCore import QSize
@@ -8,6 +9,13 @@ from PySide6.QtWidgets import QGraphicsRectItem
 
 import numpy as np
 
+# Maximum number of points waiting to be drawn, the oldest points are dropped when the plot falls behind
+MAX_QUEUED_POINTS = 10000
+# Number of points drawn at each refresh: 1 draws only the latest point, more draw a decimated trail of the latest points
+TRAIL_LENGTH = 1
+# Period of the frame time and queue depth report in the plot title, in seconds
+METRICS_PERIOD = 1.0
+
 class PlotScatterWidget(PlotWidget):
     def __init__(self, comp_name, comp_display_name, y0, y1, unit="", p_id=0, parent=None):
         """
@@ -29,8 +37,21 @@ class PlotScatterWidget(PlotWidget):
         self.thr = 0.8
         
         self._data = dict()  # dict of queues
-        self._data[0] = deque(maxlen=200000)
-        
+        self._data[0] = deque(maxlen=MAX_QUEUED_POINTS)
+        self.trail = deque(maxlen=TRAIL_LENGTH)
+
+        # Pens created once, the rectangle pen is changed only when the point crosses the threshold
+        self.normal_pen = pg.mkPen(color='#a4c238', width=6)
+        self.alarm_pen = pg.mkPen(color='r', width=8)
+        self.alarm = False
+
+        # Refresh metrics
+        self.n_dropped = 0
+        self.metrics = {"frames": 0, "frame_time": 0.0, "max_frame_time": 0.0, "queue_depth": 0, "max_queue_depth": 0, "dropped_points": 0}
+        self._metrics_frames = 0
+        self._metrics_frame_time = 0.0
+        self._metrics_start = time.perf_counter()
+
         self.scatter = pg.ScatterPlotItem(x= [0], y=[0], pen=pg.mkPen(None), brush=pg.mkBrush('#3cb4e6'), size=20)
         
         self.graph_widget.setYRange(self.y0, self.y1, padding=0)
@@ -38,7 +59,7 @@ class PlotScatterWidget(PlotWidget):
 
         # Add a rectangular figure
         self.rect = QGraphicsRectItem(-self.thr,  -self.thr,  self.thr*2,  self.thr*2)  # x, y, width, height
-        self.rect.setPen(pg.mkPen(color='#a4c238', width=6))  # Set the pen for the rectangle
+        self.rect.setPen(self.normal_pen)  # Set the pen for the rectangle
         self.graph_widget.addItem(self.rect)
         
         # add item to plot window
@@ -54,28 +75,69 @@ class PlotScatterWidget(PlotWidget):
         """
         Update the scatter plot with the latest data.
 
-        This method updates the scatter plot with the latest data point from the data queue.
-        It also updates the color of the rectangular figure based on the threshold values.
+        All the points queued since the previous refresh are drained at once and only the latest one
+        (or a decimated trail of the latest TRAIL_LENGTH points) is drawn, so the plot never lags behind
+        the sensor. The color of the rectangular figure is updated based on the threshold values of the
+        latest point. The frame time and the queue depth are shown in the plot title every METRICS_PERIOD seconds.
+        """
+        start = time.perf_counter()
+        queue = self._data[0]
+        n_points = len(queue)
+        if n_points > 0:
+            points = [queue.popleft() for _ in range(n_points)]
+            # Keep one point every step, counting back from the latest point
+            step = max(1, n_points // TRAIL_LENGTH)
+            self.trail.extend(points[n_points - 1::-step][::-1])
+            x, y = self.trail[-1]
+            alarm = abs(x) >= self.thr or abs(y) >= self.thr
+            if alarm != self.alarm:
+                self.rect.setPen(self.alarm_pen if alarm else self.normal_pen)
+                self.alarm = alarm
+            self.scatter.setData([p[0] for p in self.trail], [p[1] for p in self.trail])
+        self._update_metrics(n_points, time.perf_counter() - start)
+
+    def _update_metrics(self, queue_depth, frame_time):
         """
-        if len(self._data[0]) > 1:
-            data = self._data[0].pop()
-            x = data[0]
-            y = data[1]
-            if np.abs(x[0]) >=  self.thr or np.abs(y[0]) >= self.thr:
-                self.rect.setPen(pg.mkPen(color='r', width=8))
-            else:
-                self.rect.setPen(pg.mkPen(color='#a4c238', width=6))
-
-            self.scatter.setData(x, y)
-        self.app_qt.processEvents()
+        Update the refresh metrics and, every METRICS_PERIOD seconds, show them in the plot title.
+
+        :param queue_depth: The number of points drained at this refresh.
+        :param frame_time: The time spent in this refresh, in seconds.
+        """
+        m = self.metrics
+        m["frames"] += 1
+        m["queue_depth"] = queue_depth
+        m["max_queue_depth"] = max(m["max_queue_depth"], queue_depth)
+        m["max_frame_time"] = max(m["max_frame_time"], frame_time)
+        m["dropped_points"] = self.n_dropped
+        self._metrics_frames += 1
+        self._metrics_frame_time += frame_time
+        now = time.perf_counter()
+        if now - self._metrics_start >= METRICS_PERIOD:
+            m["frame_time"] = self._metrics_frame_time / self._metrics_frames
+            fps = self._metrics_frames / (now - self._metrics_start)
+            self.graph_widget.setTitle(f"{fps:.0f} fps, frame {m['frame_time'] * 1e3:.2f} ms, queue {queue_depth}, dropped {m['dropped_points']}")
+            self._metrics_frames = 0
+            self._metrics_frame_time = 0.0
+            self._metrics_start = now
+
+    def get_metrics(self):
+        """
+        Get the refresh metrics.
+
+        :return: The number of refreshes, the mean frame time of the last period and the maximum frame time (seconds),
+                 the last and maximum queue depth (points drained at a refresh) and the number of dropped points.
+        """
+        return dict(self.metrics)
 
     def add_data(self, data):
         """
         Add data to the data queue.
 
-        :param data: The data to be added to the queue.
+        :param data: The data to be added to the queue, [[x], [y]].
         """
-        self._data[0].append(data)
+        if len(self._data[0]) == self._data[0].maxlen:
+            self.n_dropped += 1
+        self._data[0].append((data[0][0], data[1][0]))
 
 class PluginClass(HSD_Plugin):
     """
@@ -97,12 +159,17 @@ class PluginClass(HSD_Plugin):
 
     def __init__(self):
         super().__init__()
+        self.sensitivity = None
     
     def start_log_cb(self):
         print("PLUGIN2 start_log_cb method called")
 
     def stop_log_cb(self):
         print("PLUGIN2 stop_log_cb method called")
+        if isinstance(getattr(self, "plot_widget", None), PlotScatterWidget):
+            m = self.plot_widget.get_metrics()
+            print(f"PLUGIN2 plot: {m['frames']} frames, max frame time {m['max_frame_time'] * 1e3:.2f} ms, "
+                  f"max queue depth {m['max_queue_depth']}, {m['dropped_points']} dropped points")
 
     def tag_cb(self, status, label):
         print("PLUGIN2 tag_cb method called: tag label: ", label, " status: ", status)
@@ -122,17 +189,13 @@ class PluginClass(HSD_Plugin):
 
         if data.comp_name == 'iis3dwb_acc':
             
-            #Get sensor data
-            acc_data = data.data
-
-            # Get sensor sensisity
-            self.sensitivity = self.components_status["iis3dwb_acc"]["sensitivity"]
-            
-            acc_data = acc_data*self.sensitivity
+            # Get sensor sensisity (once)
+            if self.sensitivity is None:
+                self.sensitivity = self.components_status["iis3dwb_acc"]["sensitivity"]
 
-            # Extract x and y data from the input data
-            x_data = acc_data[0]
-            y_data = acc_data[1]
+            # Extract x and y data from the input data, only they are multiplied for sensor sensitivity
+            x_data = data.data[0] * self.sensitivity
+            y_data = data.data[1] * self.sensitivity
 
             x_filtered_mean = np.mean(x_data)
             y_filtered_mean = np.mean(y_data)
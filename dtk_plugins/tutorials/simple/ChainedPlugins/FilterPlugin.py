@@ -1,13 +1,32 @@
 from stdatalog_dtk.HSD_DataToolkit_Pipeline import HSD_Plugin
 import numpy as np
 
+# In-place processing contract of the chained plugins:
+# - the results are written with the out= argument of the numpy functions into scratch buffers that are
+#   allocated once for each component, so that no array is allocated for each packet
+# - data.data is replaced by a view of a scratch buffer: it is valid until the next process() call for the
+#   same component, so the next plugins of the chain must copy it if they keep it (e.g. in a queue or a plot)
+
 class PluginClass(HSD_Plugin):
 
     def __init__(self):
         super().__init__()
         self.sensitivity = None
+        self.scratch = {}
         print("FilterPlugin has been initialized!")
-    
+
+    # Get the scratch buffers of a component, sized from its status (samples_per_ts, dim) the first time
+    # and reallocated only if a packet with more values is received
+    def get_scratch(self, comp_name, n_values):
+        scratch = self.scratch.get(comp_name)
+        if scratch is None or len(scratch["scaled"]) < n_values:
+            status = self.components_status[comp_name]
+            dim = status.get("dim", 1)
+            size = max(n_values, status.get("samples_per_ts", 1) * dim)
+            scratch = {"scaled": np.empty(size), "norm": np.empty(size // dim)}
+            self.scratch[comp_name] = scratch
+        return scratch
+
     def process(self, data):
         if data.comp_name == "iis3dwb_acc":
             
@@ -15,19 +34,23 @@ class PluginClass(HSD_Plugin):
             if self.sensitivity is None:
                 self.sensitivity = self.components_status["iis3dwb_acc"]["sensitivity"]
 
-            # Multiply for sensor sensitivity
-            data.data = data.data * self.sensitivity
+            n_values = len(data.data)
+            scratch = self.get_scratch(data.comp_name, n_values)
 
-            # Extract the x, y, and z components of the accelerometer data
-            acc_x = data.data[0::3]
-            acc_y = data.data[1::3]
-            acc_z = data.data[2::3]
+            # Multiply for sensor sensitivity (the raw samples are converted to float in the scratch buffer)
+            acc_data = scratch["scaled"][:n_values]
+            acc_data[:] = data.data
+            np.multiply(acc_data, self.sensitivity, out=acc_data)
 
-            # Calculate the norm of the accelerometer data
-            acc_data_norm = np.sqrt(acc_x**2 + acc_y**2 + acc_z**2)
-            # Update the data with the calculated norm
+            # Calculate the norm of the accelerometer data, x, y and z are strided views of the squared samples
+            np.square(acc_data, out=acc_data)
+            acc_data_norm = scratch["norm"][:n_values // 3]
+            np.add(acc_data[0::3], acc_data[1::3], out=acc_data_norm)
+            np.add(acc_data_norm, acc_data[2::3], out=acc_data_norm)
+            np.sqrt(acc_data_norm, out=acc_data_norm)
+            # Update the data with the calculated norm (a view of the scratch buffer)
             data.data = acc_data_norm
         return data
 
     def create_plot_widget(self):
-        print("FilterPlugin create_plot_widget method called")
\ No newline at end of file
+        print("FilterPlugin create_plot_widget method called")
@@ -10,9 +10,10 @@ class PluginClass(HSD_Plugin):
     
     def process(self, data):
         if data.comp_name == "iis3dwb_acc":
-            if np.any(data.data >= self.control_thr):
+            # The maximum is a reduction, no boolean array is allocated for the comparison
+            if len(data.data) > 0 and np.max(data.data) >= self.control_thr:
                 print("Warning data above threshold !!")
         return data
 
     def create_plot_widget(self):
-        print("ProcessPlugin create_plot_widget method called")
\ No newline at end of file
+        print("ProcessPlugin create_plot_widget method called")
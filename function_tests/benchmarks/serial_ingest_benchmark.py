@@ -0,0 +1,272 @@
+# *****************************************************************************
+#  * @file    serial_ingest_benchmark.py
+#  * @author  SRA
+# *****************************************************************************
+#
+#                   Copyright (c) 2020 STMicroelectronics.
+#                             All rights reserved
+#
+#   This software component is licensed by ST under BSD-3-Clause license,
+#   the "License"; You may not use this file except in compliance with the
+#   License. You may obtain a copy of the License at:
+#                        https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Benchmark of the serial ingest, without a board (Linux and macOS only).
+
+A source thread streams the packets of one or more channels at a given rate through a pseudo-terminal (pty), in a
+simple frame format (channel, CRC status, length, then the packet: a 4-byte counter of the payload bytes and the
+payload). As a device, the source produces the packets in a FIFO of --fifo_size bytes and loses the packets that do
+not fit in it when the receiver falls behind. A loopback link reads the frames on the other side of the pty and
+returns them from get_serial_data(), as the serial HSDLink does.
+
+The stream is received with the single-thread loop of the previous SerialLink example ("loop") and with the
+SerialIngest stages, writing the channel files to a disk that stalls periodically (--stall seconds every
+--stall_period seconds). For each implementation the script reports the packets sent, lost by the source, received
+and written, the counter errors (the gaps left by lost or CRC-flagged packets) and, for SerialIngest, the per-channel
+counters.
+
+Usage:
+    python serial_ingest_benchmark.py -t 5 -r 400000 --stall 0.5
+    python serial_ingest_benchmark.py -c 3 -p 1024 --crc_error_rate 0.001
+"""
+
+import sys
+import os
+import pty
+import tty
+import time
+import types
+import errno
+import queue
+import select
+import struct
+import random
+import argparse
+import tempfile
+import threading
+
+# Add the function_tests directory to the sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from serial_ingest import SerialIngest, COUNTER_SIZE
+
+FRAME_HEADER = struct.Struct("<BBH")
+
+
+class PacketSource(threading.Thread):
+    def __init__(self, fd, n_channels, payload_size, rate, duration, fifo_size, crc_error_rate=0.0, seed=0):
+        """
+        Stream packets through the master side of a pty, as a device: the packets are produced at a fixed rate in a
+        FIFO of `fifo_size` bytes, and lost when the FIFO is full; a sender thread writes the FIFO to the pty.
+
+        Args:
+            fd (int): The master file descriptor.
+            n_channels (int): The number of channels, the packets are sent round-robin.
+            payload_size (int): The payload size of a packet, in bytes.
+            rate (float): The payload rate of all the channels, in bytes/s.
+            duration (float): The streaming time, in seconds.
+            fifo_size (int): The size of the FIFO of the source, in bytes.
+            crc_error_rate (float, optional): The fraction of packets flagged with a CRC error. Defaults to 0.
+            seed (int, optional): The seed of the random generator. Defaults to 0.
+        """
+        super().__init__(name="packet_source_thread")
+        self.fd = fd
+        self.n_channels = n_channels
+        self.payload_size = payload_size
+        self.period = payload_size / rate
+        self.n_packets = int(duration / self.period)
+        self.fifo = queue.Queue(maxsize=max(1, fifo_size // (payload_size + COUNTER_SIZE + FRAME_HEADER.size)))
+        self.crc_error_rate = crc_error_rate
+        self.random = random.Random(seed)
+        self.sent = [0] * n_channels
+        self.dropped = [0] * n_channels
+
+    def _send(self):
+        while True:
+            frame = self.fifo.get()
+            if frame is None:
+                break
+            view = memoryview(frame)
+            while len(view) > 0:
+                view = view[os.write(self.fd, view):]
+
+    def run(self):
+        sender = threading.Thread(target=self._send, name="packet_sender_thread")
+        sender.start()
+        counters = [0] * self.n_channels
+        payload = bytes(range(256)) * (self.payload_size // 256 + 1)
+        start = time.perf_counter()
+        for k in range(self.n_packets):
+            delay = start + k * self.period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ch_num = k % self.n_channels
+            counters[ch_num] += self.payload_size
+            cr = 1 if self.random.random() < self.crc_error_rate else 0
+            frame = FRAME_HEADER.pack(ch_num, cr, COUNTER_SIZE + self.payload_size) + struct.pack("=i", counters[ch_num]) + payload[:self.payload_size]
+            try:
+                self.fifo.put_nowait(frame)
+                self.sent[ch_num] += 1
+            except queue.Full:
+                # The packet is lost, as when the FIFO of the device overflows
+                self.dropped[ch_num] += 1
+        self.fifo.put(None)
+        sender.join()
+
+
+class LoopbackLink:
+    def __init__(self, fd):
+        """
+        Stand-in of the serial HSDLink: the frames of a PacketSource are read from the slave side of a pty.
+
+        Args:
+            fd (int): The slave file descriptor.
+        """
+        self.fd = fd
+        self.buffer = bytearray()
+
+    def get_serial_data(self):
+        """
+        Get the next packet.
+
+        Returns:
+            The packet (with header.ch_num, header.cr and data), or None if no complete packet is available.
+        """
+        if len(self.buffer) < FRAME_HEADER.size or len(self.buffer) < FRAME_HEADER.size + FRAME_HEADER.unpack_from(self.buffer)[2]:
+            if select.select([self.fd], [], [], 0.001)[0]:
+                try:
+                    self.buffer += os.read(self.fd, 65536)
+                except OSError as e:
+                    if e.errno != errno.EIO:
+                        raise
+            if len(self.buffer) < FRAME_HEADER.size:
+                return None
+        ch_num, cr, length = FRAME_HEADER.unpack_from(self.buffer)
+        end = FRAME_HEADER.size + length
+        if len(self.buffer) < end:
+            return None
+        data = bytes(self.buffer[FRAME_HEADER.size:end])
+        del self.buffer[:end]
+        return types.SimpleNamespace(header=types.SimpleNamespace(ch_num=ch_num, cr=cr), data=data)
+
+
+class StallingFile:
+    def __init__(self, file_path, stall, stall_period):
+        """
+        File that stalls for `stall` seconds at the first write of every `stall_period` seconds.
+        """
+        self.file = open(file_path, "wb")
+        self.stall = stall
+        self.stall_period = stall_period
+        self.next_stall = time.perf_counter() + stall_period
+        self.closed = False
+
+    def write(self, data):
+        if self.stall > 0 and time.perf_counter() >= self.next_stall:
+            time.sleep(self.stall)
+            self.next_stall = time.perf_counter() + self.stall_period
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        self.closed = True
+
+
+def loop_ingest(link, data_reader_params, stop_event):
+    """
+    Receives the packets with the single-thread loop of the previous ReadSerialDataThread.run (without the DataReader).
+
+    Returns:
+        dict: The packets received and the counter errors of each channel.
+    """
+    prev_cnts = [0] * len(data_reader_params)
+    counters = {ch_num: {"packets": 0, "counter_errors": 0} for ch_num in data_reader_params}
+    while not stop_event.is_set():
+        pkt = link.get_serial_data()
+        if pkt:
+            data = pkt.data
+            if pkt.header.cr == 0 and len(data) > 0:
+                curr_cnt = struct.unpack("=i", data[0:4])[0]
+                data_ch = pkt.header.ch_num
+                counters[data_ch]["packets"] += 1
+                diff = curr_cnt - prev_cnts[data_ch]
+                payload_len = len(data) - 4
+                if curr_cnt != 0 and diff != payload_len:
+                    counters[data_ch]["counter_errors"] += 1
+                else:
+                    file = data_reader_params[data_ch].get("file")
+                    if not file.closed:
+                        file.write(data)
+                prev_cnts[data_ch] = curr_cnt
+    for params in data_reader_params.values():
+        params.get("file").close()
+    return counters
+
+
+def run(implementation, args, folder):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    link = LoopbackLink(slave)
+    data_reader_params = {ch_num: {"comp_name": f"ch{ch_num}", "file": StallingFile(os.path.join(folder, f"{implementation}_ch{ch_num}.dat"), args.stall, args.stall_period)}
+                          for ch_num in range(args.channels)}
+    source = PacketSource(master, args.channels, args.payload_size, args.rate, args.duration, args.fifo_size, args.crc_error_rate)
+
+    stop_event = threading.Event()
+    if implementation == "loop":
+        result = {}
+        receiver = threading.Thread(target=lambda: result.update(loop_ingest(link, data_reader_params, stop_event)))
+        receiver.start()
+    else:
+        ingest = SerialIngest(link)
+        ingest.set_data_reader_params(data_reader_params)
+        ingest.start()
+    start = time.perf_counter()
+    source.start()
+    source.join()
+    # Let the receiver read what is left in the pty
+    time.sleep(0.5)
+    if implementation == "loop":
+        stop_event.set()
+        receiver.join()
+        counters = result
+    else:
+        ingest.stop()
+        counters = ingest.get_counters()["channels"]
+    elapsed = time.perf_counter() - start
+    os.close(master)
+    os.close(slave)
+
+    print(f"{implementation}: {elapsed:.1f} s")
+    for ch_num in range(args.channels):
+        c = counters[ch_num]
+        written = os.path.getsize(os.path.join(folder, f"{implementation}_ch{ch_num}.dat")) // (COUNTER_SIZE + args.payload_size)
+        print(f"  ch{ch_num}: {source.sent[ch_num]} sent, {source.dropped[ch_num]} lost by the source, {c['packets']} received, "
+              f"{written} written, {c['counter_errors']} counter errors")
+        if implementation != "loop":
+            print(f"        {c}")
+    if implementation != "loop":
+        print(f"  packet ring high-water mark: {ingest.get_counters()['packet_ring_high_water']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the serial ingest over a pty loopback")
+    parser.add_argument("-t", "--duration", type=float, default=5, help="Streaming time, in seconds")
+    parser.add_argument("-r", "--rate", type=float, default=184320, help="Payload rate of all the channels, in bytes/s (1843200 baud by default)")
+    parser.add_argument("-c", "--channels", type=int, default=2, help="Number of channels")
+    parser.add_argument("-p", "--payload_size", type=int, default=2048, help="Payload size of a packet, in bytes")
+    parser.add_argument("-f", "--fifo_size", type=int, default=32768, help="Size of the FIFO of the source (device), in bytes")
+    parser.add_argument("--stall", type=float, default=0.2, help="Duration of the disk stalls, in seconds (0 disables the stalls)")
+    parser.add_argument("--stall_period", type=float, default=1.0, help="Period of the disk stalls, in seconds")
+    parser.add_argument("--crc_error_rate", type=float, default=0.0, help="Fraction of the packets flagged with a CRC error")
+    args = parser.parse_args()
+
+    print(f"{args.channels} channels, {args.payload_size} B packets, {args.rate / 1024:.0f} KB/s for {args.duration} s, "
+          f"disk stalls of {args.stall} s every {args.stall_period} s")
+    with tempfile.TemporaryDirectory() as folder:
+        for implementation in ("loop", "SerialIngest"):
+            run(implementation, args, folder)
+
+
+if __name__ == "__main__":
+    main()
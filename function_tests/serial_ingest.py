@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# coding: utf-8 
+# *****************************************************************************
+#  * @file    serial_ingest.py
+#  * @author  SRA
+# *****************************************************************************
+#
+#                   Copyright (c) 2020 STMicroelectronics.
+#                             All rights reserved
+#
+#   This software component is licensed by ST under BSD-3-Clause license,
+#   the "License"; You may not use this file except in compliance with the
+#   License. You may obtain a copy of the License at:
+#                        https://opensource.org/licenses/BSD-3-Clause
+
+"""
+This module, `serial_ingest.py`, receives the data streamed by a board over a serial link (see
+stdatalog_API_examples_SerialLink.py) in three stages, each running in its own thread:
+- read: the packets are taken from the serial link (`get_serial_data()`) and copied in a preallocated ring of
+  packet slots. The stage does nothing else, so the link is drained as fast as the packets arrive.
+- validate: the CRC flag and the counter of each packet are checked, the payload is fed to the DataReader of the
+  channel and the packet (counter and payload, as in the .dat file) is copied in the preallocated byte ring of the channel.
+- write: the content of the byte ring of each channel is written to the channel file in batches of at least
+  `batch_bytes` bytes, or of what is available after `flush_interval` seconds.
+A disk stall only fills the byte rings: the packets are dropped only when a ring is full, and the drops are counted.
+
+Per-channel counters (packets, bytes, CRC and counter errors, dropped packets and bytes, byte ring high-water mark,
+write batches and bytes written) and the high-water mark of the packet ring are returned by `get_counters()`.
+"""
+
+import time
+import struct
+import threading
+import numpy as np
+
+COUNTER_SIZE = 4
+
+
+class PacketRing:
+    def __init__(self, n_slots, slot_size):
+        """
+        Single-producer single-consumer ring of preallocated packet slots.
+
+        Args:
+            n_slots (int): The number of slots.
+            slot_size (int): The maximum size of a packet, in bytes.
+        """
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self.slots = np.empty((n_slots, slot_size), dtype=np.uint8)
+        self.lengths = np.zeros(n_slots, dtype=np.int64)
+        self.channels = np.zeros(n_slots, dtype=np.int64)
+        self.crc = np.zeros(n_slots, dtype=np.int64)
+        self.head = 0  # Packets written by the producer
+        self.tail = 0  # Packets released by the consumer
+        self.high_water = 0
+        self.not_empty = threading.Condition()
+
+    def put(self, ch_num, cr, data):
+        """
+        Copy a packet in the next free slot.
+
+        Args:
+            ch_num (int): The channel of the packet.
+            cr (int): The CRC status of the packet (0 if the packet is valid).
+            data (bytes): The packet data.
+
+        Returns:
+            bool: False if the ring is full or the packet does not fit in a slot (the packet is dropped), True otherwise.
+        """
+        n = len(data)
+        if self.head - self.tail >= self.n_slots or n > self.slot_size:
+            return False
+        i = self.head % self.n_slots
+        self.slots[i, :n] = np.frombuffer(data, dtype=np.uint8)
+        self.lengths[i] = n
+        self.channels[i] = ch_num
+        self.crc[i] = cr
+        self.head += 1
+        self.high_water = max(self.high_water, self.head - self.tail)
+        with self.not_empty:
+            self.not_empty.notify()
+        return True
+
+    def get(self, timeout):
+        """
+        Wait for the oldest packet of the ring. The slot must be released after use.
+
+        Args:
+            timeout (float): The maximum wait, in seconds.
+
+        Returns:
+            int: The slot index, or None if the ring is still empty after the timeout.
+        """
+        if self.head == self.tail:
+            with self.not_empty:
+                self.not_empty.wait_for(lambda: self.head != self.tail, timeout)
+            if self.head == self.tail:
+                return None
+        return self.tail % self.n_slots
+
+    def release(self):
+        """
+        Release the slot of the oldest packet.
+        """
+        self.tail += 1
+
+
+class ByteRing:
+    def __init__(self, capacity):
+        """
+        Single-producer single-consumer ring of preallocated bytes.
+
+        Args:
+            capacity (int): The size of the ring, in bytes.
+        """
+        self.capacity = capacity
+        self.buffer = np.empty(capacity, dtype=np.uint8)
+        self.head = 0  # Bytes written by the producer
+        self.tail = 0  # Bytes consumed by the consumer
+        self.high_water = 0
+
+    def available(self):
+        return self.head - self.tail
+
+    def write(self, data):
+        """
+        Append bytes to the ring.
+
+        Args:
+            data (np.ndarray): The bytes (uint8).
+
+        Returns:
+            bool: False if there is not enough free space (nothing is written), True otherwise.
+        """
+        n = len(data)
+        if n > self.capacity - (self.head - self.tail):
+            return False
+        start = self.head % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:n - first] = data[first:]
+        self.head += n
+        self.high_water = max(self.high_water, self.head - self.tail)
+        return True
+
+    def regions(self, n):
+        """
+        Get the oldest bytes of the ring, without consuming them.
+
+        Args:
+            n (int): The number of bytes (at most the available bytes).
+
+        Returns:
+            list: One or two (at the end of the buffer) views of the ring buffer.
+        """
+        start = self.tail % self.capacity
+        first = min(n, self.capacity - start)
+        regions = [self.buffer[start:start + first]]
+        if n > first:
+            regions.append(self.buffer[:n - first])
+        return regions
+
+    def consume(self, n):
+        self.tail += n
+
+
+class SerialIngest:
+    def __init__(self, hsd_link, packet_slots=1024, slot_size=65536, channel_buffer_size=8 * 1024 * 1024,
+                 batch_bytes=256 * 1024, flush_interval=0.2, poll_interval=0.001):
+        """
+        Prepare the ingest stages of a serial link. The channels are configured with set_data_reader_params.
+
+        Args:
+            hsd_link: The serial HSDLink instance (any object with a get_serial_data() method that returns a packet or None).
+            packet_slots (int, optional): The number of slots of the packet ring. Defaults to 1024.
+            slot_size (int, optional): The maximum packet size, in bytes. Defaults to 65536.
+            channel_buffer_size (int, optional): The size of the byte ring of each channel, in bytes. Defaults to 8 MB.
+            batch_bytes (int, optional): The minimum size of a file write, in bytes. Defaults to 256 KB.
+            flush_interval (float, optional): The maximum time the data wait in a byte ring before being written, in seconds. Defaults to 0.2.
+            poll_interval (float, optional): The wait of the read stage when the link has no packet, in seconds. Defaults to 0.001.
+        """
+        self.hsd_link = hsd_link
+        self.packet_ring = PacketRing(packet_slots, slot_size)
+        self.channel_buffer_size = channel_buffer_size
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.data_reader_params = {}
+        self.data_class = None
+        self.channel_rings = {}
+        self.prev_cnts = {}
+        self.counters = {}
+        self.read_done = threading.Event()
+        self.validate_done = threading.Event()
+        self.stop_event = threading.Event()
+        self.data_ready = threading.Condition()
+        self.threads = []
+
+    def set_data_reader_params(self, data_reader_params):
+        """
+        Configure the channels: the data of the channels that are not configured are discarded.
+
+        Args:
+            data_reader_params (dict): For each channel number, a dict with "comp_name", "file" (the .dat file, open in
+            binary mode) and, optionally, "data_reader" (the DataReader fed with the payload of the packets).
+        """
+        for ch_num in data_reader_params:
+            self.channel_rings[ch_num] = ByteRing(self.channel_buffer_size)
+            self.prev_cnts[ch_num] = 0
+            self._get_counters(ch_num)
+        # The SDK is needed only to feed the DataReaders, it is imported once here and not for each packet
+        if self.data_class is None and any(params.get("data_reader") is not None for params in data_reader_params.values()):
+            from stdatalog_core.HSD_utils.DataClass import DataClass
+            self.data_class = DataClass
+        self.data_reader_params = data_reader_params
+
+    def _get_counters(self, ch_num):
+        counters = self.counters.get(ch_num)
+        if counters is None:
+            counters = {"packets": 0, "bytes": 0, "crc_errors": 0, "counter_errors": 0, "dropped_packets": 0,
+                        "dropped_bytes": 0, "buffer_high_water": 0, "write_batches": 0, "bytes_written": 0}
+            self.counters[ch_num] = counters
+        return counters
+
+    def start(self):
+        """
+        Start the read, validate and write threads.
+        """
+        self.threads = [threading.Thread(target=self._read_stage, name="serial_read_thread"),
+                        threading.Thread(target=self._validate_stage, name="serial_validate_thread"),
+                        threading.Thread(target=self._write_stage, name="serial_write_thread")]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        """
+        Stop reading from the link, process and write the packets already received, then close the channel files.
+        """
+        self.stop_event.set()
+        for t in self.threads:
+            t.join()
+        for params in self.data_reader_params.values():
+            params.get("file").close()
+
+    def get_counters(self):
+        """
+        Get the ingest counters.
+
+        Returns:
+            dict: "packet_ring_high_water", the maximum number of packets waiting for validation, and "channels",
+            the counters of each channel (packets, bytes, crc_errors, counter_errors, dropped_packets, dropped_bytes,
+            buffer_high_water, write_batches, bytes_written).
+        """
+        channels = {}
+        for ch_num, counters in self.counters.items():
+            channels[ch_num] = dict(counters)
+            if ch_num in self.channel_rings:
+                channels[ch_num]["buffer_high_water"] = self.channel_rings[ch_num].high_water
+        return {"packet_ring_high_water": self.packet_ring.high_water, "channels": channels}
+
+    def _read_stage(self):
+        while not self.stop_event.is_set():
+            pkt = self.hsd_link.get_serial_data()
+            if not pkt:
+                time.sleep(self.poll_interval)
+                continue
+            counters = self._get_counters(pkt.header.ch_num)
+            counters["packets"] += 1
+            counters["bytes"] += len(pkt.data)
+            if not self.packet_ring.put(pkt.header.ch_num, pkt.header.cr, pkt.data):
+                counters["dropped_packets"] += 1
+        self.read_done.set()
+
+    def _validate_stage(self):
+        ring = self.packet_ring
+        while True:
+            i = ring.get(timeout=0.1)
+            if i is None:
+                if self.read_done.is_set() and ring.head == ring.tail:
+                    break
+                continue
+            ch_num = int(ring.channels[i])
+            data = ring.slots[i, :ring.lengths[i]]
+            params = self.data_reader_params.get(ch_num)
+            if params is not None and len(data) > 0:
+                counters = self.counters[ch_num]
+                if ring.crc[i] != 0:
+                    counters["crc_errors"] += 1
+                else:
+                    curr_cnt = struct.unpack_from("=i", data, 0)[0]
+                    payload_len = len(data) - COUNTER_SIZE
+                    if curr_cnt != 0 and curr_cnt - self.prev_cnts[ch_num] != payload_len:
+                        counters["counter_errors"] += 1
+                    else:
+                        data_reader = params.get("data_reader")
+                        if data_reader is not None:
+                            data_reader.feed_data(self.data_class(params.get("comp_name"), data[COUNTER_SIZE:].tobytes()))
+                        channel_ring = self.channel_rings[ch_num]
+                        if not channel_ring.write(data):
+                            counters["dropped_bytes"] += len(data)
+                        elif channel_ring.available() >= self.batch_bytes:
+                            with self.data_ready:
+                                self.data_ready.notify()
+                    self.prev_cnts[ch_num] = curr_cnt
+            ring.release()
+        self.validate_done.set()
+        with self.data_ready:
+            self.data_ready.notify()
+
+    def _write_stage(self):
+        last_write = {ch_num: time.perf_counter() for ch_num in self.channel_rings}
+        while True:
+            done = self.validate_done.is_set()
+            for ch_num, channel_ring in list(self.channel_rings.items()):
+                n = channel_ring.available()
+                now = time.perf_counter()
+                if n >= self.batch_bytes or (n > 0 and (done or now - last_write.setdefault(ch_num, now) >= self.flush_interval)):
+                    file = self.data_reader_params[ch_num].get("file")
+                    for region in channel_ring.regions(n):
+                        file.write(region)
+                    channel_ring.consume(n)
+                    counters = self.counters[ch_num]
+                    counters["write_batches"] += 1
+                    counters["bytes_written"] += n
+                    last_write[ch_num] = now
+            if done:
+                break
+            with self.data_ready:
+                self.data_ready.wait(timeout=self.flush_interval)
@@ -18,64 +18,17 @@
 
 import sys
 import os
-from threading import Thread
-import struct
 
 # Add the STDatalog SDK root directory to the sys.path to access the SDK packages
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 import time
-from threading import Event
 from stdatalog_core.HSD_link.HSDLink import HSDLink, SensorAcquisitionThread
 from stdatalog_pnpl.PnPLCmd import PnPLCMDManager
 from stdatalog_core.HSD_utils.DataReader import DataReader
-from stdatalog_core.HSD_utils.DataClass import DataClass
 from stdatalog_core.HSD.utils.type_conversion import TypeConversion
 from datetime import datetime
-
-class ReadSerialDataThread(Thread):
-    def __init__(self, hsd_link):
-        Thread.__init__(self)
-        self.hsd_link = hsd_link
-        self.name = "data_reader_thread"
-        self.stop_event = Event()
-        self.data_reader_params = None
-        self.sig_streaming_error = None
-        self.prev_cnts = []
-
-    def set_data_reader_params(self, data_reader_params):
-        self.data_reader_params = data_reader_params
-        self.prev_cnts = [0]*len(data_reader_params)
-    
-    def set_sig_streaming_error(self, sig_streaming_error):
-        self.sig_streaming_error = sig_streaming_error
-
-    def run(self):
-        while not self.stop_event.is_set():
-            pkt = self.hsd_link.get_serial_data()
-            if pkt:
-                data = pkt.data
-                if pkt.header.cr == 0 and len(data) > 0:
-                    curr_cnt = struct.unpack("=i", data[0:4])[0]
-                    data_ch = pkt.header.ch_num
-                    diff = curr_cnt - self.prev_cnts[data_ch]
-                    payload_len = len(data)-4
-                    if curr_cnt != 0 and diff != payload_len:
-                        log.error("Streaming error occoured!")
-                    else:
-                        comp_name = self.data_reader_params[data_ch].get("comp_name")
-                        self.data_reader_params[data_ch].get("data_reader").feed_data(DataClass(comp_name, data[4:]))
-                        file = self.data_reader_params[data_ch].get("file")
-                        if not file.closed:
-                            file.write(data)
-                    self.prev_cnts[data_ch] = curr_cnt
-
-        # self.hsd_link.flush()
-        # time.sleep(1)
-        self.data_reader_params[0].get("file").close()
-
-    def stop(self):
-        self.stop_event.set()
+from serial_ingest import SerialIngest
 
 def dummy_function(data):
     pass
@@ -117,11 +70,10 @@ def main():
 
     is_open = hsd_link_instance.open("COM30", 1843200)
 
-    # If hsd_link being used is a serial link, start a thread to read data from the serial port
-    #serial_thread_stop_flag = Event()
-    serial_thread = ReadSerialDataThread(hsd_link_instance)
+    # If hsd_link being used is a serial link, start the threads that read, validate and write the data of the serial port
+    serial_ingest = SerialIngest(hsd_link_instance)
 
-    serial_thread.start()
+    serial_ingest.start()
 
     # Get Device Presentation String
     device_presentation = hsd_link.get_device_presentation_string(hsd_link_instance, device_id)
@@ -210,8 +162,8 @@ def main():
         "file":file
     }
 
-    # Set the data reader parameters for the serial thread
-    serial_thread.set_data_reader_params(data_reader_params)
+    # Set the data reader parameters for the serial ingest
+    serial_ingest.set_data_reader_params(data_reader_params)
 
     # Use the first sensor for demonstration
     sensor_name, _ = next(iter(sensor_list.items()))
@@ -270,9 +222,15 @@ def main():
     # [UNCOMMENT] the following line and replace the "path/to/acquisition_info.json" string with a valid path to save the acquisition_info.json file in that path
     # hsd_link.save_json_acq_info_file(hsd_link_instance, device_id, "path/to/save/acquisition_info.json")
 
-    serial_thread.stop()
+    serial_ingest.stop()
     hsd_link_instance.close()
 
+    # Print the serial ingest counters
+    counters = serial_ingest.get_counters()
+    print(f"Packet ring high-water mark: {counters['packet_ring_high_water']}")
+    for ch_num, ch_counters in counters["channels"].items():
+        print(f"Channel {ch_num}: {ch_counters}")
+
     print("\n---> End of Serial APIs test script.")
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+# *****************************************************************************
+#  * @file    losses_benchmark.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Micro-benchmark of the F1Loss engines.
+
+The script generates synthetic score profiles shaped like the output of ProminenceProfile
+(zero almost everywhere, with sparse peaks and larger peaks close to the ground truth
+break points), computes the best F1 and threshold with the "loop" and the "sweep" engines,
+reports the average elapsed time of each engine and checks that the results are the same.
+
+Usage:
+    python losses_benchmark.py -n 1000000 -g 20 -p 500
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add the example directory to the sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from assisted_segmentation.segmentation.losses import F1Loss
+
+
+def generate_score(n_samples: int, n_break_points: int, peak_tolerance: int, peak_density: float = 0.01, seed: int = 0):
+    """
+    Generates a synthetic score profile and its ground truth break points.
+
+    Args:
+        n_samples (int): The number of samples of the score profile.
+        n_break_points (int): The number of ground truth break points.
+        peak_tolerance (int): The tolerance used to place the peaks around the break points.
+        peak_density (float, optional): The fraction of samples that are background peaks. Defaults to 0.01.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+
+    Returns:
+        Tuple[np.array, List[int]]: The score profile and the sorted ground truth break points.
+    """
+    rng = np.random.default_rng(seed)
+    score = np.zeros(n_samples)
+    n_peaks = int(n_samples * peak_density)
+    score[rng.choice(n_samples, n_peaks, replace=False)] = rng.exponential(size=n_peaks)
+
+    gt_break_points = np.sort(rng.choice(np.arange(peak_tolerance, n_samples - peak_tolerance), n_break_points, replace=False))
+    jitter = rng.integers(-peak_tolerance // 2, peak_tolerance // 2 + 1, size=n_break_points)
+    score[gt_break_points + jitter] = rng.exponential(size=n_break_points) + 5
+    return score, gt_break_points.tolist()
+
+
+def time_engine(loss: F1Loss, score: np.array, gt_break_points, repeat: int):
+    """
+    Computes the best F1 and threshold with the given loss and measures the average elapsed time.
+
+    Args:
+        loss (F1Loss): The loss to be benchmarked.
+        score (np.array): The score profile.
+        gt_break_points (List[int]): The ground truth break points.
+        repeat (int): The number of repetitions.
+
+    Returns:
+        Tuple[Tuple[float, float], float]: The loss value and threshold, and the average elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = loss._compute_best_f1(score, gt_break_points)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the F1Loss engines")
+    parser.add_argument("-n", "--n_samples", type=int, default=1000000, help="Number of samples of the synthetic score profiles")
+    parser.add_argument("-g", "--n_break_points", type=int, default=20, help="Number of ground truth break points")
+    parser.add_argument("-p", "--peak_tolerance", type=int, default=500, help="Tolerance for matching the peaks")
+    parser.add_argument("-d", "--peak_density", type=float, default=0.01, help="Fraction of samples that are background peaks")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of repetitions for each engine")
+    parser.add_argument("-s", "--n_profiles", type=int, default=3, help="Number of synthetic score profiles")
+    args = parser.parse_args()
+
+    loop_loss = F1Loss(peak_tolerance=args.peak_tolerance, engine="loop")
+    sweep_loss = F1Loss(peak_tolerance=args.peak_tolerance, engine="sweep")
+
+    print(f"samples: {args.n_samples}, break points: {args.n_break_points}, peak tolerance: {args.peak_tolerance}")
+    mismatch = False
+    for seed in range(args.n_profiles):
+        score, gt_break_points = generate_score(args.n_samples, args.n_break_points, args.peak_tolerance, args.peak_density, seed)
+        loop_result, loop_time = time_engine(loop_loss, score, gt_break_points, args.repeat)
+        sweep_result, sweep_time = time_engine(sweep_loss, score, gt_break_points, args.repeat)
+        print(f"profile {seed}: loop {loop_time*1e3:.1f} ms, sweep {sweep_time*1e3:.1f} ms (x{loop_time / sweep_time:.1f}), "
+              f"loss {sweep_result[0]:.4f}, threshold {sweep_result[1]:.4f}")
+        if loop_result != sweep_result:
+            print(f"profile {seed}: the engines do not match, loop {loop_result}, sweep {sweep_result}")
+            mismatch = True
+
+    if mismatch:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# *****************************************************************************
+#  * @file    profiles_benchmark.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Benchmark of the NormalDivergenceProfile engines.
+
+The script generates a synthetic piecewise-stationary stream, computes its divergence
+profile with the "loop" and the "batch" engines, reports the elapsed time of each engine
+and checks that the two profiles match within the given tolerance.
+
+Usage:
+    python profiles_benchmark.py -n 200000 -d 3 -w 100
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add the example directory to the sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from assisted_segmentation.segmentation.profiles import NormalDivergenceProfile
+
+
+def generate_stream(n_samples: int, dimension: int, n_segments: int = 10, seed: int = 0) -> np.array:
+    """
+    Generates a synthetic stream made of segments with different mean and scale.
+
+    Args:
+        n_samples (int): The number of samples of the stream.
+        dimension (int): The dimension of each sample.
+        n_segments (int, optional): The number of stationary segments. Defaults to 10.
+        seed (int, optional): The seed of the random generator. Defaults to 0.
+
+    Returns:
+        np.array: The generated stream, with shape (n_samples, dimension).
+    """
+    rng = np.random.default_rng(seed)
+    bounds = np.linspace(0, n_samples, n_segments + 1, dtype=int)
+    stream = np.empty((n_samples, dimension))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        mean = rng.normal(size=dimension)
+        scale = rng.uniform(0.1, 1, size=dimension)
+        stream[start:end] = rng.normal(mean, scale, size=(end - start, dimension))
+    return stream
+
+
+def time_engine(stream: np.array, window_size: int, engine: str):
+    """
+    Computes the divergence profile with the given engine and measures the elapsed time.
+
+    Args:
+        stream (np.array): The stream of samples.
+        window_size (int): The size of the sliding window.
+        engine (str): The NormalDivergenceProfile engine.
+
+    Returns:
+        Tuple[np.array, float]: The divergence profile and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    profile = NormalDivergenceProfile(stream, window_size, engine=engine).get_profile()
+    return profile, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the NormalDivergenceProfile engines")
+    parser.add_argument("-n", "--n_samples", type=int, default=200000, help="Number of samples of the synthetic stream")
+    parser.add_argument("-d", "--dimension", type=int, default=3, help="Dimension of the samples")
+    parser.add_argument("-w", "--window_size", type=int, default=100, help="Size of the sliding window")
+    parser.add_argument("-t", "--tolerance", type=float, default=1e-6, help="Maximum absolute difference allowed between the profiles")
+    args = parser.parse_args()
+
+    stream = generate_stream(args.n_samples, args.dimension)
+
+    loop_profile, loop_time = time_engine(stream, args.window_size, "loop")
+    batch_profile, batch_time = time_engine(stream, args.window_size, "batch")
+    max_error = np.max(np.abs(loop_profile - batch_profile))
+
+    print(f"samples: {args.n_samples}, dimension: {args.dimension}, window size: {args.window_size}")
+    print(f"loop engine:  {loop_time:.3f} s")
+    print(f"batch engine: {batch_time:.3f} s (x{loop_time / batch_time:.1f})")
+    print(f"max abs error: {max_error:.3e} (tolerance {args.tolerance:.1e})")
+
+    if max_error > args.tolerance:
+        print("The profiles computed by the two engines do not match")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
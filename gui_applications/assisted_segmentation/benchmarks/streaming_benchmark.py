@@ -0,0 +1,180 @@
+# *****************************************************************************
+#  * @file    streaming_benchmark.py
+#  * @author  SRA
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+"""
+Equivalence check and benchmark of the StreamingWaveletDecompositionModel.
+
+The script generates a synthetic piecewise-stationary stream, computes its profiles with the in-memory
+WaveletDecompositionModel and with the StreamingWaveletDecompositionModel on chunks of the given size,
+reports the elapsed time of each model and checks that:
+- the core profiles and the average profile match within the given tolerance (relative to the range of the
+  in-memory profiles);
+- the score peaks above the given fraction of the highest one are the same, at most the given number of samples
+  apart, and their scores match within the tolerance (relative to the highest score).
+The score is compared through its peaks and not sample by sample: the prominence of a sample is not continuous.
+For a difference of the average profile within the tolerance, a peak on a near-flat top can move to the next
+sample, and two maxima of the average profile that are within the tolerance of each other can swap their
+prominences. The unmatched peaks explained by such a swap, or whose score is within the tolerance of the
+threshold, are reported but they are not errors.
+
+Usage:
+    python streaming_benchmark.py -n 400000 -c 65536
+    python streaming_benchmark.py -n 4000000 -c 1048576 -l 7 -w 100
+"""
+
+import sys
+import os
+import time
+import tempfile
+import argparse
+from typing import Tuple
+import numpy as np
+from scipy.signal import find_peaks
+
+# Add the example directory to the sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from assisted_segmentation.segmentation.scoremodels import WaveletDecompositionModel
+from assisted_segmentation.segmentation.streaming import StreamingWaveletDecompositionModel
+from profiles_benchmark import generate_stream
+
+
+def relative_error(profile: np.array, reference: np.array) -> float:
+    """
+    Computes the maximum absolute difference between two profiles, relative to the range of the reference.
+
+    Args:
+        profile (np.array): The profile to check.
+        reference (np.array): The reference profile.
+
+    Returns:
+        float: The relative error.
+    """
+    return np.max(np.abs(np.asarray(profile, dtype=np.float64) - reference)) / max(np.ptp(reference), np.finfo(float).tiny)
+
+
+def match_peaks(peaks: np.array, other_peaks: np.array, max_distance: int) -> np.array:
+    """
+    Matches each peak with the nearest peak of another score.
+
+    Args:
+        peaks (np.array): The sorted positions of the peaks.
+        other_peaks (np.array): The sorted positions of the peaks of the other score.
+        max_distance (int): The maximum distance between two matching peaks.
+
+    Returns:
+        np.array: The position of the matching peak of each peak, or -1 if there is none.
+    """
+    if len(other_peaks) == 0:
+        return np.full(len(peaks), -1)
+    right = np.searchsorted(other_peaks, peaks).clip(0, len(other_peaks) - 1)
+    left = (right - 1).clip(0)
+    nearest = np.where(np.abs(other_peaks[left] - peaks) <= np.abs(other_peaks[right] - peaks), other_peaks[left], other_peaks[right])
+    return np.where(np.abs(nearest - peaks) <= max_distance, nearest, -1)
+
+
+def explained_peaks(missing_peaks: np.array, extra_peaks: np.array, score: np.array, streaming_score: np.array,
+                    average: np.array, height: float, tolerance: float) -> Tuple[np.array, np.array]:
+    """
+    Finds the unmatched peaks that are explained by a swap of prominences between near-equal maxima of the
+    average profile, or by a score within the tolerance of the threshold.
+
+    Args:
+        missing_peaks (np.array): The peaks of the in-memory score without a matching peak in the streaming score.
+        extra_peaks (np.array): The peaks of the streaming score without a matching peak in the in-memory score.
+        score (np.array): The in-memory score.
+        streaming_score (np.array): The streaming score.
+        average (np.array): The in-memory average profile.
+        height (float): The threshold of the compared peaks.
+        tolerance (float): The tolerance, relative to the highest score and to the range of the average profile.
+
+    Returns:
+        Tuple[np.array, np.array]: For each missing and each extra peak, True if it is explained.
+    """
+    score_tolerance = tolerance * np.max(score)
+    missing_explained = score[missing_peaks] <= height + score_tolerance
+    extra_explained = streaming_score[extra_peaks] <= height + score_tolerance
+    for i, missing_peak in enumerate(missing_peaks):
+        for j, extra_peak in enumerate(extra_peaks):
+            # the two maxima swapped their prominences: each one has the score of the other in the other model
+            if (not missing_explained[i] and not extra_explained[j]
+                    and abs(average[missing_peak] - average[extra_peak]) <= tolerance * np.ptp(average)
+                    and abs(streaming_score[extra_peak] - score[missing_peak]) <= score_tolerance
+                    and abs(streaming_score[missing_peak] - score[extra_peak]) <= score_tolerance):
+                missing_explained[i] = extra_explained[j] = True
+                break
+    return missing_explained, extra_explained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalence check and benchmark of the StreamingWaveletDecompositionModel")
+    parser.add_argument("-n", "--n_samples", type=int, default=400000, help="Number of samples of the synthetic stream")
+    parser.add_argument("-d", "--dimension", type=int, default=3, help="Dimension of the samples")
+    parser.add_argument("-c", "--chunk_size", type=int, default=2**16, help="Number of samples of each chunk of the streaming model")
+    parser.add_argument("-l", "--level_wavelet", type=int, default=7, help="Level of the wavelet decomposition")
+    parser.add_argument("-w", "--window_size", type=int, default=100, help="Size of the divergence windows")
+    parser.add_argument("-t", "--tolerance", type=float, default=1e-3, help="Maximum difference allowed between the profiles, relative to their range")
+    parser.add_argument("-p", "--peak_fraction", type=float, default=0.05, help="Fraction of the highest score above which the peaks are compared")
+    parser.add_argument("-s", "--peak_distance", type=int, default=2, help="Maximum distance (samples) between the matching peaks of the two scores")
+    args = parser.parse_args()
+
+    stream = generate_stream(args.n_samples, args.dimension)
+
+    start = time.perf_counter()
+    model = WaveletDecompositionModel(stream, args.level_wavelet, args.window_size)
+    score = model.get_score()
+    memory_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        streaming_model = StreamingWaveletDecompositionModel(stream, folder, args.level_wavelet, args.window_size, chunk_size=args.chunk_size)
+        streaming_score = np.array(streaming_model.get_score())
+        streaming_time = time.perf_counter() - start
+
+        core_errors = [relative_error(streaming_profile.get_profile(), profile.get_profile())
+                       for streaming_profile, profile in zip(streaming_model.core_profiles, model.core_profiles)]
+        average = model.score_profile.input_profile.get_profile()
+        streaming_average = streaming_model._open(streaming_model.AVERAGE_PROFILE_FILE, (args.n_samples,), 'r')
+        average_error = relative_error(streaming_average, average)
+        del streaming_model, streaming_average
+
+    height = args.peak_fraction * np.max(score)
+    peaks, _ = find_peaks(score, height=height)
+    streaming_peaks, _ = find_peaks(streaming_score, height=height)
+    matches = match_peaks(peaks, streaming_peaks, args.peak_distance)
+    is_matched = matches >= 0
+    missing_peaks = peaks[~is_matched]
+    extra_peaks = np.setdiff1d(streaming_peaks, matches[is_matched])
+    missing_explained, extra_explained = explained_peaks(missing_peaks, extra_peaks, score, streaming_score, average, height, args.tolerance)
+    peak_error = np.max(np.abs(streaming_score[matches[is_matched]] - score[peaks[is_matched]]), initial=0) / np.max(score)
+
+    print(f"samples: {args.n_samples}, dimension: {args.dimension}, chunk size: {args.chunk_size}, level: {args.level_wavelet}, window size: {args.window_size}")
+    print(f"in-memory model: {memory_time:.3f} s")
+    print(f"streaming model: {streaming_time:.3f} s")
+    print("core profiles max relative error: " + ", ".join(f"{e:.1e}" for e in core_errors) + f" (tolerance {args.tolerance:.1e})")
+    print(f"average profile max relative error: {average_error:.1e} (tolerance {args.tolerance:.1e})")
+    print(f"score peaks above {args.peak_fraction:.0%} of the highest: {len(peaks)}, max relative error {peak_error:.1e} (tolerance {args.tolerance:.1e})")
+    print(f"unmatched peaks: missing {missing_peaks[~missing_explained].tolist()}, extra {extra_peaks[~extra_explained].tolist()}")
+    print(f"unmatched peaks explained by near-equal maxima or by the threshold: missing {missing_peaks[missing_explained].tolist()}, extra {extra_peaks[extra_explained].tolist()}")
+
+    if max(core_errors + [average_error, peak_error]) > args.tolerance or not missing_explained.all() or not extra_explained.all():
+        print("The profiles computed by the two models do not match")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
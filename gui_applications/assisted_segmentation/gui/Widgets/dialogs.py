@@ -66,10 +66,11 @@ class TagsAlertDialog(QDialog):
         self.accept() # Accept the dialog
 
 class WaitingDialog(QDialog):
-    def __init__(self, title, text, parent=None):
+    def __init__(self, title, text, parent=None, cancel_callback=None):
         """
         Constructor for the WaitingDialog class.
         This class is a custom QDialog that is used to display a waiting dialog to the user when the application is processing some data.
+        If a cancel callback is passed, the dialog shows a cancel button that calls it.
         """
         super().__init__(parent)
         self.setWindowFlags(Qt.WindowType.Dialog | Qt.WindowType.CustomizeWindowHint | Qt.WindowType.WindowTitleHint) # Set the window flags
@@ -88,16 +89,46 @@ class WaitingDialog(QDialog):
         self.movie.setScaledSize(QSize(64,64)) # Set the size of the loading icon
         self.movie_label.setMovie(self.movie) # Set the movie to the movie label
         layout.addWidget(self.movie_label, alignment=Qt.AlignmentFlag.AlignCenter) # Add the movie label to the layout
+        self.text = text # Default message text, restored every time the dialog is started
+        self.cancel_button = None
+        if cancel_callback is not None:
+            self.cancel_button = QPushButton("Cancel") # Create the cancel button
+            self.cancel_button.clicked.connect(cancel_callback) # Connect the clicked signal to the cancel callback
+            layout.addWidget(self.cancel_button, alignment=Qt.AlignmentFlag.AlignCenter) # Add the cancel button to the layout
         # Set the layout
         self.setLayout(layout)
 
-    def start(self):
+    def start(self, text=None):
         """
         Method to show the dialog and start the loading animation.
+
+        Args:
+            text (str, optional): The message text. Defaults to None, that is, the text passed to the constructor.
         """
+        self.set_message(text if text is not None else self.text) # Reset the message text
+        self.set_cancel_enabled(True) # Enable the cancel button
         self.movie.start() # Start the movie
         self.show() # Show the dialog
 
+    def set_message(self, text):
+        """
+        Method to update the message text, e.g. to report the progress of the running operation.
+
+        Args:
+            text (str): The message text.
+        """
+        self.message_label.setText(text)
+
+    def set_cancel_enabled(self, enabled):
+        """
+        Method to enable or disable the cancel button, if any.
+
+        Args:
+            enabled (bool): True to enable the cancel button, False to disable it.
+        """
+        if self.cancel_button is not None:
+            self.cancel_button.setEnabled(enabled)
+
     def stop(self):
         """
         Method to stop the loading animation and close the dialog.
@@ -0,0 +1,113 @@
+
+# ******************************************************************************
+# * @attention
+# *
+# * Copyright (c) 2022 STMicroelectronics.
+# * All rights reserved.
+# *
+# * This software is licensed under terms that can be found in the LICENSE file
+# * in the root directory of this software component.
+# * If no LICENSE file comes with this software, it is provided AS-IS.
+# *
+# *
+# ******************************************************************************
+#
+
+import numpy as np
+
+class MinMaxPyramid:
+    def __init__(self, samples, factor=4, min_block_size=16, chunk_size=2**20):
+        """
+        Initialize the MinMaxPyramid. The pyramid stores, for each level, the minimum and the maximum of each axis
+        over blocks of consecutive samples. The block size of the first level is min_block_size and each level
+        groups factor blocks of the previous one. The pyramid is built once, reading the samples one chunk at a time,
+        so that memory-mapped samples are never loaded in memory at once.
+
+        Args:
+            samples (np.ndarray): The samples, with shape (n_samples,) or (n_samples, n_axes).
+            factor (int, optional): The number of blocks of a level grouped in a block of the next level. Defaults to 4.
+            min_block_size (int, optional): The block size of the first level. Defaults to 16.
+            chunk_size (int, optional): The number of samples read at a time to build the first level. Defaults to 2**20.
+        """
+        self.samples = samples
+        self.factor = factor
+        self.n_samples = samples.shape[0]
+        self.block_sizes = [] # Block size of each level
+        self.levels = [] # (minimum, maximum) arrays of each level, with shape (n_blocks, n_axes)
+
+        # Build the first level from the samples, chunk_size is rounded to a multiple of the block size
+        chunk_size = max(chunk_size // min_block_size, 1) * min_block_size
+        n_blocks = -(-self.n_samples // min_block_size)
+        n_axes = 1 if samples.ndim == 1 else samples.shape[1]
+        mins = np.empty((n_blocks, n_axes), dtype=samples.dtype)
+        maxs = np.empty((n_blocks, n_axes), dtype=samples.dtype)
+        for start in range(0, self.n_samples, chunk_size):
+            chunk = np.asarray(samples[start:start + chunk_size]).reshape(-1, n_axes)
+            first = start // min_block_size
+            chunk_mins, chunk_maxs = self._reduce(chunk, chunk, min_block_size)
+            mins[first:first + len(chunk_mins)] = chunk_mins
+            maxs[first:first + len(chunk_maxs)] = chunk_maxs
+        self.block_sizes.append(min_block_size)
+        self.levels.append((mins, maxs))
+
+        # Build the next levels from the previous ones, until a single block is left
+        while len(mins) > 1:
+            mins, maxs = self._reduce(mins, maxs, factor)
+            self.block_sizes.append(self.block_sizes[-1] * factor)
+            self.levels.append((mins, maxs))
+
+    @staticmethod
+    def _reduce(mins, maxs, block_size):
+        """
+        Compute the minimum and the maximum over blocks of consecutive rows. The last block is padded with its last row.
+
+        Args:
+            mins (np.ndarray): The minimum values, with shape (n_rows, n_axes).
+            maxs (np.ndarray): The maximum values, with shape (n_rows, n_axes).
+            block_size (int): The number of rows in each block.
+
+        Returns:
+            tuple: The minimum and the maximum of each block, with shape (n_blocks, n_axes).
+        """
+        n_blocks = -(-len(mins) // block_size)
+        pad = n_blocks * block_size - len(mins)
+        if pad:
+            mins = np.concatenate([mins, np.repeat(mins[-1:], pad, axis=0)])
+            maxs = np.concatenate([maxs, np.repeat(maxs[-1:], pad, axis=0)])
+        mins = mins.reshape(n_blocks, block_size, -1).min(axis=1)
+        maxs = maxs.reshape(n_blocks, block_size, -1).max(axis=1)
+        return mins, maxs
+
+    def get_envelope(self, start, end, n_pixels, axis=0):
+        """
+        Get the min/max envelope of an axis in the range [start, end), with about two points per pixel.
+        The coarsest level with at least one block per pixel is used, if no level is fine enough the samples are returned.
+
+        Args:
+            start (int): The start sample index.
+            end (int): The end sample index.
+            n_pixels (int): The width of the plot in pixels.
+            axis (int, optional): The axis of the samples. Defaults to 0.
+
+        Returns:
+            tuple: The x coordinates (sample indices) and the y values of the envelope.
+        """
+        samples_per_pixel = (end - start) / max(n_pixels, 1)
+        level = None
+        for i, block_size in enumerate(self.block_sizes):
+            if block_size <= samples_per_pixel:
+                level = i
+        if level is None: # The range is narrow enough to plot all the samples
+            samples = self.samples[start:end]
+            return np.arange(start, end), np.asarray(samples if samples.ndim == 1 else samples[:, axis])
+
+        block_size = self.block_sizes[level]
+        mins, maxs = self.levels[level]
+        first = start // block_size
+        last = -(-end // block_size)
+        # Each block is drawn as a vertical segment from its minimum to its maximum
+        x = np.repeat(np.arange(first, last) * block_size, 2)
+        y = np.empty(2 * (last - first), dtype=mins.dtype)
+        y[0::2] = mins[first:last, axis]
+        y[1::2] = maxs[first:last, axis]
+        return x, y
@@ -16,19 +16,192 @@
 from functools import partial
 import os
 import json
+import shutil
+import tempfile
 from datetime import datetime, timedelta, timezone
 
+import numpy as np
 from PySide6.QtCore import QThread, Signal
 
 from stdatalog_core.HSD.HSDatalog import HSDatalog
+from stdatalog_core.HSD.utils.type_conversion import TypeConversion
 from ..segmentation_controller import Controller
 from ..segmentation.losses import F1Loss
 from ..segmentation.optimizers import MangoOptimizer
 from ..segmentation.segmenters import Segmenter
 from ..segmentation.scoremodels import WaveletDecompositionModel
+from ..segmentation.streaming import MemmapStream, StreamingWaveletDecompositionModel
+from ..segmentation.utils import LRUCache
+
+def read_component_chunks(hsd, component, chunk_size):
+    """
+    Reads the raw data of a component one chunk at a time.
+
+    Args:
+        hsd (HSDatalog): The HSD object of the acquisition.
+        component (dict): The component to read.
+        chunk_size (int): The number of samples read at a time.
+
+    Yields:
+        tuple: The samples, with shape (n_samples, dim), and the timestamps, with shape (n_samples, 1), of each chunk.
+    """
+    df_generator = HSDatalog.get_dataframe_gen(hsd, component, start_time=0, end_time=-1, raw_data=True, chunk_size=chunk_size)
+    for df in df_generator or []:
+        # The first column of each dataframe contains the timestamps
+        yield df.iloc[:, 1:].to_numpy(), df.iloc[:, [0]].to_numpy()
+
+def get_sample_size(component):
+    """
+    Returns the size in bytes of a sample of a component in its data file.
+
+    Args:
+        component (dict): The component.
+
+    Returns:
+        int: The size of a sample (all the axes) in bytes.
+    """
+    c_name = list(component.keys())[0] # Get the component name
+    return component[c_name]["dim"] * TypeConversion.check_type_length(component[c_name]["data_type"])
+
+def create_controller(score_model):
+    """
+    Creates the segmentation controller for a score model.
+
+    Args:
+        score_model (ScoreModel): The score model of the datastream to segment.
+
+    Returns:
+        Controller: The controller of the segmentation.
+    """
+    segmenter = Segmenter(score_model=score_model) # Create the segmenter
+    optimizer = MangoOptimizer(max_calls=50) # Create the optimizer
+    loss = F1Loss(peak_tolerance=500) # Create the loss function
+    segmenter.compile(loss, optimizer) # Compile the segmenter
+    # Create the controller object with the segmenter and the break point tolerance
+    return Controller(segmenter=segmenter, break_point_tolerance=500)
+
+class WorkerThread(QThread):
+    sig_error = Signal(str) # Signal emitted if the thread fails (error message)
+
+    def run(self):
+        """
+        Runs the thread, emitting sig_error if an exception is raised, so that the waiting dialog can be closed.
+        """
+        try:
+            self._run()
+        except Exception as e:
+            print(f"{self.__class__.__name__} failed: {e!r}")
+            self.sig_error.emit(f"{type(e).__name__}: {e}")
+
+    def _run(self):
+        """
+        The work of the thread, implemented by the subclasses.
+        """
+        raise NotImplementedError
 
 class UI_Controller:
-    class SegmentationThread(QThread):
+    # Components whose data file is larger than this size (in bytes) are segmented out of core
+    STREAMING_FILE_SIZE = 256 * 1024**2
+    # Number of samples read from the acquisition and processed at a time when segmenting out of core
+    STREAMING_CHUNK_SIZE = 2**20
+    # Number of samples read from the acquisition at a time when loading a component in memory
+    LOADING_CHUNK_SIZE = 2**18
+    # Number of decoded components kept in memory, to segment them again without reading their data files
+    DECODED_CACHE_SIZE = 4
+
+    class AcquisitionFolderThread(WorkerThread):
+        sig_progress = Signal(str, int, int) # Signal emitted after each component is inspected (component name, index, number of components)
+        sig_finished = Signal(object, object, object) # Signal emitted when the folder is loaded (HSD object or None if the folder is invalid, component list, file sizes)
+        sig_cancelled = Signal() # Signal emitted when the loading is cancelled
+
+        def __init__(self, hsd_factory, acquisition_folder_path):
+            """
+            Initializes the AcquisitionFolderThread object.
+
+            Args:
+                hsd_factory (HSDatalog): The HSDatalog factory used to create the HSD object.
+                acquisition_folder_path (str): The acquisition folder path.
+            """
+            super().__init__()
+            self.hsd_factory = hsd_factory
+            self.acquisition_folder_path = acquisition_folder_path
+            self.cancelled = False
+
+        def cancel(self):
+            """
+            Requests the cancellation of the loading, that stops before the next component is inspected.
+            """
+            self.cancelled = True
+
+        def _run(self):
+            """
+            Validates the acquisition folder, creates the HSD object and gets the components and their file sizes.
+            """
+            hsd_version = HSDatalog.validate_hsd_folder(self.acquisition_folder_path) # Validate the acquisition folder
+            if hsd_version == HSDatalog.HSDVersion.INVALID: # If the acquisition folder is invalid
+                self.sig_finished.emit(None, [], {})
+                return
+            hsd = self.hsd_factory.create_hsd(self.acquisition_folder_path) # Create the HSD object
+            components = HSDatalog.get_sensor_list(hsd) # Get the component list
+            file_sizes = {}
+            for i, c in enumerate(components):
+                if self.cancelled:
+                    self.sig_cancelled.emit()
+                    return
+                c_name = list(c.keys())[0] # Get the component name
+                file_sizes[c_name] = HSDatalog.get_file_dimension(hsd, c_name) # Get the file size
+                self.sig_progress.emit(c_name, i + 1, len(components))
+            self.sig_finished.emit(hsd, components, file_sizes)
+
+    class LoadingThread(WorkerThread):
+        sig_progress = Signal(str, object, object) # Signal emitted after each chunk is read (component name, bytes read, total bytes), the sizes can exceed a 32-bit int
+        sig_finished = Signal(object, object) # Signal emitted when the component is loaded (samples, timestamps)
+        sig_cancelled = Signal() # Signal emitted when the loading is cancelled
+
+        def __init__(self, hsd, component, file_size, chunk_size):
+            """
+            Initializes the LoadingThread object.
+
+            Args:
+                hsd (HSDatalog): The HSD object of the acquisition.
+                component (dict): The component to load.
+                file_size (int): The size of the component data file in bytes.
+                chunk_size (int): The number of samples read at a time.
+            """
+            super().__init__()
+            self.hsd = hsd
+            self.component = component
+            self.file_size = file_size
+            self.chunk_size = chunk_size
+            self.cancelled = False
+
+        def cancel(self):
+            """
+            Requests the cancellation of the loading, that stops before the next chunk is read.
+            """
+            self.cancelled = True
+
+        def _run(self):
+            """
+            Reads the component data and timestamps one chunk at a time, reporting the progress.
+            """
+            c_name = list(self.component.keys())[0] # Get the component name
+            sample_size = get_sample_size(self.component) # Get the size of a sample in bytes
+            samples, times = [], []
+            bytes_read = 0
+            for samples_chunk, times_chunk in read_component_chunks(self.hsd, self.component, self.chunk_size):
+                if self.cancelled:
+                    self.sig_cancelled.emit()
+                    return
+                samples.append(samples_chunk)
+                times.append(times_chunk)
+                bytes_read += samples_chunk.shape[0] * sample_size
+                self.sig_progress.emit(c_name, min(bytes_read, self.file_size), self.file_size)
+            if not samples: # The component contains no data
+                samples, times = [np.empty((0, self.component[c_name]["dim"]))], [np.empty((0, 1))]
+            self.sig_finished.emit(np.concatenate(samples), np.concatenate(times))
+
+    class SegmentationThread(WorkerThread):
         sig_finished = Signal(Controller) # Signal emitted when the segmentation thread finishes
 
         def __init__(self, samples):
@@ -41,7 +214,7 @@ class UI_Controller:
             super().__init__()
             self.samples = samples
 
-        def run(self):
+        def _run(self):
             """
             Runs the segmentation algorithm thread.
             """
@@ -50,17 +223,71 @@ class UI_Controller:
             sigma = self.samples.std() # Standard deviation of the samples
             samples = (self.samples - mu)/(3*sigma) # Normalize the samples
             # Create the segmentation algorithm objects
-            score_model = WaveletDecompositionModel(samples) # Create the score model
-            segmenter = Segmenter(score_model=score_model) # Create the segmenter
-            optimizer = MangoOptimizer(max_calls=50) # Create the optimizer
-            loss = F1Loss(peak_tolerance=500) # Create the loss function
-            segmenter.compile(loss, optimizer) # Compile the segmenter
-            # Create the controller object with the segmenter and the break point tolerance
-            controller = Controller(segmenter=segmenter, break_point_tolerance=500)
+            # Create the score model, computing the subband profiles on all the available cores
+            score_model = WaveletDecompositionModel(samples, n_workers=os.cpu_count() or 1)
+            controller = create_controller(score_model)
             print("Segmentation Thread completed")
             # Emit the finished signal with the controller object as an argument to be used in the finish callback
             self.sig_finished.emit(controller)
 
+    class StreamingSegmentationThread(WorkerThread):
+        sig_finished = Signal(Controller) # Signal emitted when the segmentation thread finishes
+        sig_progress = Signal(str, object, object) # Signal emitted after each chunk is read (component name, bytes read, total bytes), the sizes can exceed a 32-bit int
+        sig_loaded = Signal() # Signal emitted when all the samples are read
+        sig_cancelled = Signal() # Signal emitted when the reading is cancelled
+
+        def __init__(self, hsd, component, file_size, folder, chunk_size):
+            """
+            Initializes the StreamingSegmentationThread object. The samples are read from the acquisition
+            one chunk at a time and stored, together with all the profiles, in memory-mapped files.
+
+            Args:
+                hsd (HSDatalog): The HSD object of the acquisition.
+                component (dict): The component to segment.
+                file_size (int): The size of the component data file in bytes.
+                folder (str): The folder where the memory-mapped files are created.
+                chunk_size (int): The number of samples read and processed at a time.
+            """
+            super().__init__()
+            self.hsd = hsd
+            self.component = component
+            self.file_size = file_size
+            self.folder = folder
+            self.chunk_size = chunk_size
+            self.stream = None
+            self.cancelled = False
+
+        def cancel(self):
+            """
+            Requests the cancellation of the reading, that stops before the next chunk is read.
+            """
+            self.cancelled = True
+
+        def _run(self):
+            """
+            Runs the segmentation algorithm thread.
+            """
+            print("Streaming Segmentation Thread started...")
+            self.stream = MemmapStream(os.path.join(self.folder, "stream")) # Create the memory-mapped samples
+            c_name = list(self.component.keys())[0] # Get the component name
+            sample_size = get_sample_size(self.component) # Get the size of a sample in bytes
+            # Read the samples one chunk at a time
+            for samples, times in read_component_chunks(self.hsd, self.component, self.chunk_size):
+                if self.cancelled:
+                    self.sig_cancelled.emit()
+                    return
+                self.stream.append(samples, times)
+                self.sig_progress.emit(c_name, min(self.stream.n_samples * sample_size, self.file_size), self.file_size)
+            print(f"Read {self.stream.n_samples} samples")
+            self.sig_loaded.emit()
+            self.stream.normalize(scale=3, chunk_size=self.chunk_size) # Normalize the samples
+            # Create the score model, computing the profiles one chunk at a time
+            score_model = StreamingWaveletDecompositionModel(self.stream.samples, os.path.join(self.folder, "profiles"), chunk_size=self.chunk_size)
+            controller = create_controller(score_model)
+            print("Streaming Segmentation Thread completed")
+            # Emit the finished signal with the controller object as an argument to be used in the finish callback
+            self.sig_finished.emit(controller)
+
     def __init__(self):
         """
         Initializes the UI_Controller object.
@@ -70,6 +297,12 @@ class UI_Controller:
         self.selected_component = None
         self.controller:Controller = None
         self.tagging_params = "create"
+        self.streaming_folder = None
+        self.components = []
+        self.file_sizes = {}
+        self.decoded_data = LRUCache(UI_Controller.DECODED_CACHE_SIZE) # Decoded samples and timestamps of the components
+        self.loading_thread = None
+        self.worker_thread = None
 
     def get_gt_break_points(self):
         """
@@ -124,6 +357,15 @@ class UI_Controller:
             float: The segmenter threshold.
         """
         return self.controller.segmenter.threshold
+
+    def get_segmenter_weights(self):
+        """
+        Returns the segmenter weights.
+
+        Returns:
+            list: The weights of the score model.
+        """
+        return self.controller.segmenter.weights
     
     def add_gt_break_point(self, bkp_index):
         """
@@ -133,6 +375,7 @@ class UI_Controller:
             bkp_index (int): The breakpoint index.
         """
         self.controller.add_gt_break_point(bkp_index)
+        self.__print_cache_info()
 
     def remove_candidate_break_point(self, bkp_index):
         """
@@ -142,25 +385,61 @@ class UI_Controller:
             bkp_index (int): The breakpoint index.
         """
         self.controller.remove_candidate_break_point(bkp_index)
+        self.__print_cache_info()
+
+    def __print_cache_info(self):
+        """
+        Prints the hit and miss counters of the segmenter score and loss caches.
+        """
+        info = self.controller.segmenter.cache_info()
+        print(f"Segmenter cache - scores: {info['score_hits']} hits, {info['score_misses']} misses - "
+              f"losses: {info['loss_hits']} hits, {info['loss_misses']} misses")
     
-    def validate_acquisition_folder(self, acquisition_folder_path):
+    def start_acquisition_folder_thread(self, acquisition_folder_path, finish_callback, progress_callback, cancelled_callback, error_callback=None):
         """
-        Validates the acquisition folder.
-        
+        Starts the thread that validates and loads the acquisition folder.
+
         Args:
             acquisition_folder_path (str): The acquisition folder path.
-            
-        Returns:
-            bool: True if the acquisition folder is valid, False otherwise.
+            finish_callback (function): The finish callback, called with True if the acquisition folder is valid, False otherwise.
+            progress_callback (function): The progress callback, called with the component name, its index and the number of components.
+            cancelled_callback (function): The cancelled callback.
+            error_callback (function, optional): The error callback, called with the error message if the loading fails.
+        """
+        self.loading_thread = UI_Controller.AcquisitionFolderThread(self.hsd_factory, acquisition_folder_path) # Create the loading thread
+        self.loading_thread.sig_progress.connect(progress_callback) # Connect the progress callback
+        self.loading_thread.sig_finished.connect(partial(self.__inner_acquisition_folder_callback, acquisition_folder_path, finish_callback)) # Connect the finish callback
+        self.loading_thread.sig_cancelled.connect(cancelled_callback) # Connect the cancelled callback
+        self.loading_thread.sig_error.connect(partial(self.__inner_error_callback, error_callback, None)) # Connect the error callback
+        self.loading_thread.start() # Start the loading thread
+
+    def __inner_acquisition_folder_callback(self, acquisition_folder_path, finish_callback, hsd, components, file_sizes):
         """
-        # Validate the acquisition folder
-        hsd_version = HSDatalog.validate_hsd_folder(acquisition_folder_path)
-        if hsd_version != HSDatalog.HSDVersion.INVALID: # If the acquisition folder is valid
-            self.hsd = self.hsd_factory.create_hsd(acquisition_folder_path) # Create the HSD object
+        The inner acquisition folder finish callback.
+
+        Args:
+            acquisition_folder_path (str): The acquisition folder path.
+            finish_callback (function): The finish callback.
+            hsd (HSDatalog): The HSD object, None if the acquisition folder is invalid.
+            components (list): The component list.
+            file_sizes (dict): The file size of each component.
+        """
+        if hsd is not None: # If the acquisition folder is valid
+            self.hsd = hsd # Set the HSD object (created within the loading thread)
             self.acquisition_folder_path = acquisition_folder_path # Set the acquisition folder path
-            return True
-        return False
-    
+            self.components = components # Set the component list
+            self.file_sizes = file_sizes # Set the file sizes
+            self.decoded_data.clear() # The decoded data belong to the previous acquisition
+        finish_callback(hsd is not None) # Call the finish callback
+
+    def cancel_loading(self):
+        """
+        Requests the cancellation of the running loading thread, if any.
+        """
+        for thread in (self.loading_thread, self.worker_thread):
+            if thread is not None and thread.isRunning() and hasattr(thread, "cancel"):
+                thread.cancel()
+
     def get_file_dimension(self, component_name):
         """
         Returns the file dimension.
@@ -171,6 +450,8 @@ class UI_Controller:
         Returns:
             int: The file dimension.
         """
+        if component_name in self.file_sizes: # The file sizes are read when the acquisition folder is loaded
+            return self.file_sizes[component_name]
         return HSDatalog.get_file_dimension(self.hsd, component_name) # Get the file dimension
     
     def get_component_list(self):
@@ -180,6 +461,8 @@ class UI_Controller:
         Returns:
             list: A list of components.
         """
+        if self.components: # The component list is read when the acquisition folder is loaded
+            return self.components
         return HSDatalog.get_sensor_list(self.hsd) # Get the component list
 
     def set_selected_component(self, selected_component):
@@ -200,31 +483,131 @@ class UI_Controller:
         """
         self.tagging_params = tagging_params
 
-    def start_segmentation_thread(self, finish_callback):
+    def start_segmentation_thread(self, finish_callback, progress_callback=None, loaded_callback=None, cancelled_callback=None, error_callback=None):
         """
-        Starts the segmentation thread.
+        Starts the segmentation thread. The component data are read in a background thread, unless they
+        were already decoded for a previous segmentation.
         
         Args:
             finish_callback (function): The finish callback.
+            progress_callback (function, optional): The progress callback, called with the component name, the bytes read and the total bytes.
+            loaded_callback (function, optional): The loaded callback, called when the component data are read and the segmentation starts.
+            cancelled_callback (function, optional): The cancelled callback, called if the reading is cancelled.
+            error_callback (function, optional): The error callback, called with the error message if the reading or the segmentation fails.
+        """
+        component_name = list(self.selected_component.keys())[0] # Get the selected component name
+        file_size = self.get_file_dimension(component_name) # Get the file size
+        decoded_data = self.decoded_data.get(component_name) # Get the component data, if already decoded
+        if decoded_data is not None:
+            print(f"Reusing the decoded data of {component_name}")
+            self.__start_in_memory_segmentation(component_name, finish_callback, loaded_callback, error_callback, *decoded_data)
+        elif file_size > UI_Controller.STREAMING_FILE_SIZE:
+            # The component does not fit comfortably in memory: segment it out of core
+            folder = tempfile.mkdtemp(prefix="assisted_segmentation_")
+            self.worker_thread = UI_Controller.StreamingSegmentationThread(self.hsd, self.selected_component, file_size, folder, UI_Controller.STREAMING_CHUNK_SIZE)
+            if progress_callback is not None:
+                self.worker_thread.sig_progress.connect(progress_callback) # Connect the progress callback
+            if loaded_callback is not None:
+                self.worker_thread.sig_loaded.connect(loaded_callback) # Connect the loaded callback
+            self.worker_thread.sig_cancelled.connect(partial(self.__inner_cancelled_callback, cancelled_callback, folder)) # Connect the cancelled callback
+            self.worker_thread.sig_finished.connect(partial(self.__inner_finish_callback, finish_callback, folder, None, None)) # Connect the finish callback
+            self.worker_thread.sig_error.connect(partial(self.__inner_error_callback, error_callback, folder)) # Connect the error callback
+            self.worker_thread.start() # Start the segmentation thread
+        else:
+            # Read the data and timestamps in the loading thread, then start the segmentation thread
+            self.loading_thread = UI_Controller.LoadingThread(self.hsd, self.selected_component, file_size, UI_Controller.LOADING_CHUNK_SIZE)
+            if progress_callback is not None:
+                self.loading_thread.sig_progress.connect(progress_callback) # Connect the progress callback
+            self.loading_thread.sig_cancelled.connect(partial(self.__inner_cancelled_callback, cancelled_callback, None)) # Connect the cancelled callback
+            self.loading_thread.sig_finished.connect(partial(self.__inner_loaded_callback, component_name, finish_callback, loaded_callback, error_callback)) # Connect the loaded callback
+            self.loading_thread.sig_error.connect(partial(self.__inner_error_callback, error_callback, None)) # Connect the error callback
+            self.loading_thread.start() # Start the loading thread
+
+    def __inner_loaded_callback(self, component_name, finish_callback, loaded_callback, error_callback, samples, times):
+        """
+        The inner loading finish callback. Stores the decoded data and starts the segmentation thread.
+
+        Args:
+            component_name (str): The component name.
+            finish_callback (function): The finish callback.
+            loaded_callback (function): The loaded callback.
+            error_callback (function): The error callback.
+            samples (np.ndarray): The component samples.
+            times (np.ndarray): The component timestamps.
+        """
+        self.decoded_data.put(component_name, (samples, times)) # Store the decoded data
+        self.__start_in_memory_segmentation(component_name, finish_callback, loaded_callback, error_callback, samples, times)
+
+    def __start_in_memory_segmentation(self, component_name, finish_callback, loaded_callback, error_callback, samples, times):
         """
-        # Get the data and timestamps
-        data_times = HSDatalog.get_data_and_timestamps(self.hsd, self.selected_component, start_time=0, end_time=-1, raw_data=True)
-        self.component_samples = data_times[0][0] # Get the component samples
-        self.component_times = data_times[0][1] # Get the component times
-        # Start the segmentation thread
-        self.worker_thread = UI_Controller.SegmentationThread(self.component_samples) # Create the segmentation thread
-        self.worker_thread.sig_finished.connect(partial(self.__inner_finish_callback, finish_callback)) # Connect the finish callback
+        Starts the segmentation thread on decoded data.
+
+        Args:
+            component_name (str): The component name.
+            finish_callback (function): The finish callback.
+            loaded_callback (function): The loaded callback.
+            error_callback (function): The error callback.
+            samples (np.ndarray): The component samples.
+            times (np.ndarray): The component timestamps.
+        """
+        if loaded_callback is not None:
+            loaded_callback() # Call the loaded callback
+        self.worker_thread = UI_Controller.SegmentationThread(samples) # Create the segmentation thread
+        self.worker_thread.sig_finished.connect(partial(self.__inner_finish_callback, finish_callback, None, samples, times)) # Connect the finish callback
+        self.worker_thread.sig_error.connect(partial(self.__inner_error_callback, error_callback, None)) # Connect the error callback
         self.worker_thread.start() # Start the segmentation thread
 
-    def __inner_finish_callback(self, finish_callback, controller):
+    def __inner_cancelled_callback(self, cancelled_callback, folder):
+        """
+        The inner loading cancelled callback.
+
+        Args:
+            cancelled_callback (function): The cancelled callback.
+            folder (str): The folder of the memory-mapped files of the cancelled segmentation, if any.
+        """
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True) # Remove the memory-mapped files
+        print("Loading cancelled")
+        if cancelled_callback is not None:
+            cancelled_callback() # Call the cancelled callback
+
+    def __inner_error_callback(self, error_callback, folder, message):
+        """
+        The inner error callback of the loading and segmentation threads.
+
+        Args:
+            error_callback (function): The error callback.
+            folder (str): The folder of the memory-mapped files of the failed segmentation, if any.
+            message (str): The error message.
+        """
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True) # Remove the memory-mapped files
+        print(f"Loading failed: {message}")
+        if error_callback is not None:
+            error_callback(message) # Call the error callback
+
+    def __inner_finish_callback(self, finish_callback, folder, samples, times, controller):
         """
         The inner segmentation finish callback.
 
         Args:
             finish_callback (function): The finish callback.
+            folder (str): The folder of the memory-mapped files, if the segmentation runs out of core.
+            samples (np.ndarray): The component samples, None if the segmentation runs out of core.
+            times (np.ndarray): The component timestamps, None if the segmentation runs out of core.
             controller (Controller): The controller
         """
+        # Remove the memory-mapped files of the previous out of core segmentation, if any
+        if self.streaming_folder is not None:
+            shutil.rmtree(self.streaming_folder, ignore_errors=True)
+        self.streaming_folder = folder
         self.controller = controller # Set the returned controller (created within the segmentation thread)
+        if folder is not None:
+            # The samples and the timestamps are memory-mapped
+            samples = self.worker_thread.stream.samples
+            times = self.worker_thread.stream.times
+        self.component_samples = samples # Set the component samples
+        self.component_times = times # Set the component times
         finish_callback() # Call the finish callback
 
     def tag_acquisition_with_break_points(self, non_empty_tags_alert_callback):
@@ -15,7 +15,7 @@
 
 import os
 import pyqtgraph as pg
-from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QFrame, QSlider, QPushButton, QFileDialog, QLineEdit, QButtonGroup, QDialog, QLabel
+from PySide6.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QFrame, QSlider, QPushButton, QFileDialog, QLineEdit, QButtonGroup, QDialog, QLabel, QMessageBox
 from PySide6.QtCore import Qt
 from PySide6.QtUiTools import QUiLoader
 import numpy as np
@@ -25,6 +25,7 @@ from assisted_segmentation.gui.Ui_MainWindow import Ui_MainWindow
 from assisted_segmentation.gui.Widgets.ComponentWidget import ComponentWidget
 from assisted_segmentation.gui.Widgets.dialogs import TagsAlertDialog, WaitingDialog
 from assisted_segmentation.gui.ui_controller import UI_Controller
+from assisted_segmentation.gui.decimation import MinMaxPyramid
 from stdatalog_core.HSD.utils.type_conversion import TypeConversion
 
 class DatastreamCanvas(QWidget):
@@ -53,6 +54,8 @@ class DatastreamCanvas(QWidget):
             self.graph_curves[i] = self.plot_widget.plot() # Initialize the plot curve
             self.graph_curves[i] = pg.PlotDataItem(pen=({'color': self.view.lines_colors[i - (len(self.view.lines_colors)* int(i / len(self.view.lines_colors)))], 'width': 1}), skipFiniteCheck=True, ignoreBounds=True) # Create the curve, then set the pen color and width
             self.plot_widget.addItem(self.graph_curves[i]) # Add the curve to the plot widget
+        # Build the min/max decimation pyramid of the samples, used to plot only a screen resolution envelope
+        self.pyramid = MinMaxPyramid(self.view.samples)
 
         # Add a green vertical line to indicate the x pointer position
         self.x_pointer_line = pg.InfiniteLine(pos=self.view.x_pointer, angle=90, pen=pg.mkPen({"color": "#00FF00", "width": 3}))
@@ -79,10 +82,11 @@ class DatastreamCanvas(QWidget):
         """
         Update the plot with the latest data.
         """
-        tt = np.arange(self.view.start_plot, self.view.end_plot)
-        samples = self.view.samples[self.view.start_plot:self.view.end_plot, :]
+        n_pixels = self.plot_widget.width() # Width of the plot in pixels
         for i in self.graph_curves:
-            self.graph_curves[i].setData(tt, samples[:, i]) # Update the data for each curve
+            # Get the min/max envelope of the visible range at screen resolution
+            tt, samples = self.pyramid.get_envelope(self.view.start_plot, self.view.end_plot, n_pixels, axis=i)
+            self.graph_curves[i].setData(tt, samples) # Update the data for each curve
             # Remove padding by setting the range manually
         
         self.focus_region.setRegion([self.view.start_window, self.view.end_window]) # Update the focus region
@@ -196,6 +200,9 @@ class ScoreCanvas(QWidget):
         self.graph_curve = self.plot_widget.plot()
         self.graph_curve = pg.PlotDataItem(pen=({'color': self.view.lines_colors[0], 'width': 1}), skipFiniteCheck=True, ignoreBounds=True) # Create the curve, then set the pen color and width
         self.plot_widget.addItem(self.graph_curve) # Add the curve to the plot widget
+        # The min/max decimation pyramid of the scores is built on the first update and rebuilt when the segmenter weights change
+        self.pyramid = None
+        self.pyramid_weights = None
         # Add a green vertical line to indicate the x pointer position
         self.x_pointer_line = pg.InfiniteLine(pos=self.view.x_pointer, angle=90, pen=pg.mkPen({"color": "#00FF00", "width": 3}))
         self.plot_widget.addItem(self.x_pointer_line) # Add the vertical line to the plot
@@ -222,8 +229,13 @@ class ScoreCanvas(QWidget):
         """
         Update the plot with the latest data.
         """
-        tt = np.arange(self.view.start_plot, self.view.end_plot) # Create a time vector
-        scores = self.view.scores[self.view.start_plot:self.view.end_plot] # Get the scores
+        weights = tuple(self.view.controller.get_segmenter_weights()) # The scores depend only on the segmenter weights
+        if self.pyramid is None or weights != self.pyramid_weights:
+            self.pyramid = MinMaxPyramid(self.view.scores) # Build the min/max decimation pyramid of the scores
+            self.pyramid_weights = weights
+        n_pixels = self.plot_widget.width() # Width of the plot in pixels
+        # Get the min/max envelope of the visible range at screen resolution
+        tt, scores = self.pyramid.get_envelope(self.view.start_plot, self.view.end_plot, n_pixels)
         self.graph_curve.setData(tt, scores) # Update the data for the curve
 
         self.focus_region.setRegion([self.view.start_window, self.view.end_window]) # Update the focus region
@@ -455,7 +467,7 @@ class AssistedSegmentationWindow(QMainWindow):
         self.focus_window_canvas = None
 
         # Waiting Dialog
-        self.waiting_dialog = WaitingDialog("Assisted Segmentation", "Segmentation algorithm is running...", self)
+        self.waiting_dialog = WaitingDialog("Assisted Segmentation", "Segmentation algorithm is running...", self, cancel_callback=self.cancel_loading)
 
     @property
     def samples(self):
@@ -704,34 +716,78 @@ class AssistedSegmentationWindow(QMainWindow):
             self.acq_folder_textEdit.setStyleSheet("color: rgb(90,90,90);") # Set the text color
             # Clear the components list
             self.clear_components_list()
-            # Validate the acquisition folder
-            ret = self.controller.validate_acquisition_folder(self.acquisition_folder_path)
-            if ret: # If the folder is valid
-                if not self.message_label.isVisible(): # If the message label is not visible
-                    self.message_label.setVisible(True) # Show the message label
-                self.components = self.controller.get_component_list() # Get the component list
-                for i, c in enumerate(self.components): # Iterate through the components
-                    c_name = list(c.keys())[0] # Get the component name
-                    odr = c[c_name].get("odr", "N/A") # Get the component ODR
-                    file_size = self.controller.get_file_dimension(c_name) # Get the file size
-                    dim = c[c_name]["dim"] # Get the component dimensions (number of axis)
-                    data_sample_bytes_length = TypeConversion.check_type_length(c[c_name]["data_type"]) # Get the data sample bytes length
-                    comp_contents = {"odr": odr, "axes": dim, "data_type": c[c_name]["data_type"], "file_size": file_size, "data_sample_bytes_length": data_sample_bytes_length} # Create the component contents dictionary
-                    # Create a component widget
-                    cw = ComponentWidget(c_name, c_name.upper(), comp_contents, self.components_frame)
-                    cw.title_label.setCheckable(True) # Set the title label checkable
-                    cw.setEnabled(c[c_name]["enable"]) # Set the component widget enabled if the component is enabled in the acquisition folder, otherwise disable it
-                    if not c[c_name]["enable"]: # If the component is disabled
-                        cw.title_label.setToolTip("Component was disabled in the selected acquisition")
-                    self.components_button_group.addButton(cw.title_label, i) # Add the title label to the button group
-                    self.components_frame.layout().addWidget(cw) # Add the component widget to the components frame layout
-                    self.components_widgets[c_name] = [cw, False] # Add the component widget to the components widgets dictionary
-                self.components_button_group.buttonClicked.connect(self.on_component_selected) # Connect the button clicked signal to a callback
-            else: # If the folder is invalid
-                self.acq_folder_textEdit.setText(f"Invalid folder selected: {self.acquisition_folder_path}") # Set the text of the acquisition folder text edit
-                self.acq_folder_textEdit.setStyleSheet("color: red") # Set the text color to red
-                if self.message_label.isVisible(): # If the message label is visible
-                    self.message_label.setVisible(False) # Hide the message label
+            # Validate and load the acquisition folder in a background thread
+            self.waiting_dialog.start("Opening the acquisition folder...") # Start the waiting dialog
+            self.controller.start_acquisition_folder_thread(self.acquisition_folder_path, self.on_acquisition_folder_loaded, self.on_acquisition_folder_progress, self.on_acquisition_folder_cancelled, self.on_acquisition_folder_error)
+
+    def on_acquisition_folder_progress(self, component_name, index, n_components):
+        """
+        Callback function for when a component of the acquisition folder is inspected.
+
+        Args:
+            component_name (str): The component name.
+            index (int): The index of the component, starting from 1.
+            n_components (int): The number of components.
+        """
+        self.waiting_dialog.set_message(f"Opening the acquisition folder... {component_name.upper()} ({index}/{n_components})")
+
+    def on_acquisition_folder_cancelled(self):
+        """
+        Callback function for when the loading of the acquisition folder is cancelled.
+        """
+        self.waiting_dialog.stop() # Stop the waiting dialog
+        self.acq_folder_textEdit.setText(f"Loading cancelled: {self.acquisition_folder_path}") # Set the text of the acquisition folder text edit
+        self.acq_folder_textEdit.setStyleSheet("color: red") # Set the text color to red
+        if self.message_label.isVisible(): # If the message label is visible
+            self.message_label.setVisible(False) # Hide the message label
+
+    def on_acquisition_folder_error(self, message):
+        """
+        Callback function for when the loading of the acquisition folder fails.
+
+        Args:
+            message (str): The error message.
+        """
+        self.waiting_dialog.stop() # Stop the waiting dialog
+        self.acq_folder_textEdit.setText(f"Error loading {self.acquisition_folder_path}: {message}") # Set the text of the acquisition folder text edit
+        self.acq_folder_textEdit.setStyleSheet("color: red") # Set the text color to red
+        if self.message_label.isVisible(): # If the message label is visible
+            self.message_label.setVisible(False) # Hide the message label
+
+    def on_acquisition_folder_loaded(self, ret):
+        """
+        Callback function for when the acquisition folder is loaded.
+
+        Args:
+            ret (bool): True if the acquisition folder is valid, False otherwise.
+        """
+        self.waiting_dialog.stop() # Stop the waiting dialog
+        if ret: # If the folder is valid
+            if not self.message_label.isVisible(): # If the message label is not visible
+                self.message_label.setVisible(True) # Show the message label
+            self.components = self.controller.get_component_list() # Get the component list
+            for i, c in enumerate(self.components): # Iterate through the components
+                c_name = list(c.keys())[0] # Get the component name
+                odr = c[c_name].get("odr", "N/A") # Get the component ODR
+                file_size = self.controller.get_file_dimension(c_name) # Get the file size
+                dim = c[c_name]["dim"] # Get the component dimensions (number of axis)
+                data_sample_bytes_length = TypeConversion.check_type_length(c[c_name]["data_type"]) # Get the data sample bytes length
+                comp_contents = {"odr": odr, "axes": dim, "data_type": c[c_name]["data_type"], "file_size": file_size, "data_sample_bytes_length": data_sample_bytes_length} # Create the component contents dictionary
+                # Create a component widget
+                cw = ComponentWidget(c_name, c_name.upper(), comp_contents, self.components_frame)
+                cw.title_label.setCheckable(True) # Set the title label checkable
+                cw.setEnabled(c[c_name]["enable"]) # Set the component widget enabled if the component is enabled in the acquisition folder, otherwise disable it
+                if not c[c_name]["enable"]: # If the component is disabled
+                    cw.title_label.setToolTip("Component was disabled in the selected acquisition")
+                self.components_button_group.addButton(cw.title_label, i) # Add the title label to the button group
+                self.components_frame.layout().addWidget(cw) # Add the component widget to the components frame layout
+                self.components_widgets[c_name] = [cw, False] # Add the component widget to the components widgets dictionary
+            self.components_button_group.buttonClicked.connect(self.on_component_selected) # Connect the button clicked signal to a callback
+        else: # If the folder is invalid
+            self.acq_folder_textEdit.setText(f"Invalid folder selected: {self.acquisition_folder_path}") # Set the text of the acquisition folder text edit
+            self.acq_folder_textEdit.setStyleSheet("color: red") # Set the text color to red
+            if self.message_label.isVisible(): # If the message label is visible
+                self.message_label.setVisible(False) # Hide the message label
 
     def on_component_selected(self, button):
         """
@@ -755,8 +811,51 @@ class AssistedSegmentationWindow(QMainWindow):
         """
         Start the segmentation algorithm.
         """
-        self.waiting_dialog.start() # Start the waiting dialog
-        self.controller.start_segmentation_thread(self.on_segmentation_finished) # Start the segmentation algorithm thread, passing the on segmentation finished callback
+        self.waiting_dialog.start("Loading the component data...") # Start the waiting dialog
+        # Start the segmentation algorithm thread, passing the on segmentation finished callback and the loading callbacks
+        self.controller.start_segmentation_thread(self.on_segmentation_finished, self.on_loading_progress, self.on_data_loaded, self.on_loading_cancelled, self.on_loading_error)
+
+    def cancel_loading(self):
+        """
+        Cancel the running loading.
+        """
+        self.waiting_dialog.set_message("Cancelling...") # Update the waiting dialog message
+        self.waiting_dialog.set_cancel_enabled(False) # Disable the cancel button
+        self.controller.cancel_loading() # Request the cancellation to the controller
+
+    def on_loading_progress(self, component_name, bytes_read, total_bytes):
+        """
+        Callback function for when a chunk of the component data is read.
+
+        Args:
+            component_name (str): The component name.
+            bytes_read (int): The number of bytes read.
+            total_bytes (int): The size of the component data file in bytes.
+        """
+        self.waiting_dialog.set_message(f"Loading {component_name.upper()} data: {bytes_read / 1024**2:.1f} / {total_bytes / 1024**2:.1f} MB")
+
+    def on_data_loaded(self):
+        """
+        Callback function for when the component data are loaded and the segmentation algorithm starts.
+        """
+        self.waiting_dialog.set_message("Segmentation algorithm is running...") # Update the waiting dialog message
+        self.waiting_dialog.set_cancel_enabled(False) # The segmentation algorithm cannot be cancelled
+
+    def on_loading_cancelled(self):
+        """
+        Callback function for when the loading of the component data is cancelled.
+        """
+        self.waiting_dialog.stop() # Stop the waiting dialog
+
+    def on_loading_error(self, message):
+        """
+        Callback function for when the loading of the component data or the segmentation fails.
+
+        Args:
+            message (str): The error message.
+        """
+        self.waiting_dialog.stop() # Stop the waiting dialog
+        QMessageBox.critical(self, "Assisted Segmentation", f"The segmentation failed:\n{message}") # Report the error
 
     def start_acquisition_tagging(self):
         """
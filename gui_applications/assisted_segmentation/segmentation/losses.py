@@ -1,5 +1,6 @@
 
 from typing import List, Tuple
+from bisect import bisect_left
 import numpy as np
 from .segmenters import Loss
 
@@ -11,19 +12,181 @@ class F1Loss(Loss):
     The F1 loss is defined as 1-F1, where F1 is the maximum F1 score that can be achieved by varying the threshold value.
     """
 
-    def __init__(self, peak_tolerance: int = 100):
+    ENGINES = ("sweep", "loop")
+    SWEEP_BLOCK_SIZE = 4096
+    SWEEP_SAMPLE_SIZE = 65536
+
+    def __init__(self, peak_tolerance: int = 100, engine: str = "sweep"):
         """
         Initializes the F1Loss object.
 
         Args:
             peak_tolerance (int): The tolerance value for matching peaks in the ground truth break points.
                                   Defaults to 100.
+            engine (str): The engine used to search the best threshold. "sweep" visits the sorted scores once
+                          and updates the matches incrementally as the threshold drops, "loop" matches all the
+                          samples above each threshold from scratch. Defaults to "sweep".
         """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Valid engines are: {', '.join(self.ENGINES)}")
         self.peak_tolerance = peak_tolerance
+        self.engine = engine
 
     def _compute_best_f1(self, scores: np.array, gt_break_points: List[int]) -> Tuple[float, float]:
         """
-        Computes the best F1 score and threshold value for a given set of scores and ground truth break points.
+        Computes the best F1 score and threshold value for a given set of scores and ground truth break points,
+        using the configured engine.
+
+        Args:
+            scores (np.array): The array of scores.
+            gt_break_points (List[int]): The list of ground truth break points.
+
+        Returns:
+            Tuple[float, float]: A tuple containing the best F1 score and the corresponding threshold value.
+        """
+        if self.engine == "sweep":
+            return self._compute_best_f1_sweep(scores, gt_break_points)
+        return self._compute_best_f1_loop(scores, gt_break_points)
+
+    def _match(self, candidates: List[int], gt_break_points: List[int], matches: List[int], first: int):
+        """
+        Greedily matches each ground truth break point, in order, to the nearest candidate that is not
+        matched yet, if closer than the peak tolerance. Only the break points from the first-th on are
+        matched again; the previous ones keep the matches already stored in matches.
+
+        Args:
+            candidates (List[int]): The sorted candidate indices that are within tolerance of a break point.
+            gt_break_points (List[int]): The list of ground truth break points.
+            matches (List[int]): The candidate matched to each break point (None if not matched), updated in place.
+            first (int): The index of the first break point to match again.
+        """
+        matched = {m for m in matches[:first] if m is not None}
+        remaining = [c for c in candidates if c not in matched]
+        for k in range(first, len(gt_break_points)):
+            p = gt_break_points[k]
+            matches[k] = None
+            i = bisect_left(remaining, p)
+            # on ties the candidate on the left is the nearest one, as in np.argmin
+            if i > 0 and (i == len(remaining) or p - remaining[i-1] <= remaining[i] - p):
+                i -= 1
+            if i < len(remaining) and abs(remaining[i] - p) < self.peak_tolerance:
+                matches[k] = remaining.pop(i)
+
+    def _is_near(self, indices: np.array, gt: np.array) -> np.array:
+        """
+        Checks which indices are within tolerance of a ground truth break point, that is, which
+        indices can be matched to a break point.
+
+        Args:
+            indices (np.array): The indices to check.
+            gt (np.array): The ground truth break points.
+
+        Returns:
+            np.array: A boolean array, True for the indices within tolerance of a break point.
+        """
+        if len(gt) == 0:
+            return np.zeros(len(indices), dtype=bool)
+        sorted_gt = np.sort(gt)
+        pos = np.searchsorted(sorted_gt, indices)
+        left = sorted_gt[np.maximum(pos - 1, 0)]
+        right = sorted_gt[np.minimum(pos, len(gt) - 1)]
+        return np.minimum(np.abs(indices - left), np.abs(indices - right)) < self.peak_tolerance
+
+    def _compute_best_f1_sweep(self, scores: np.array, gt_break_points: List[int]) -> Tuple[float, float]:
+        """
+        Computes the best F1 score and threshold value sweeping the thresholds in descending order.
+
+        The scores are sorted only as far as the sweep needs them: the largest scores are extracted
+        and sorted, and the number of extracted scores grows geometrically until the early stopping
+        criterion is met. As the threshold drops, the number of selected indices
+        is updated from the sorted scores, while the matching with the ground truth is updated only
+        when an index within tolerance of a break point is selected, since the other indices are
+        always false positives. The result is the same of the loop engine.
+
+        Args:
+            scores (np.array): The array of scores.
+            gt_break_points (List[int]): The list of ground truth break points.
+
+        Returns:
+            Tuple[float, float]: A tuple containing the best F1 score and the corresponding threshold value.
+        """
+        n_scores = len(scores)
+        gt = np.asarray(gt_break_points, dtype=np.int64)
+
+        threshold_values = []
+        candidates = []
+        matches = [None] * len(gt)
+        true_positive = 0
+
+        best_f1 = 0
+        max_fp = len(scores)
+        best_index = 0
+
+        # a strided sample of the scores, used to estimate how many scores are above a value
+        sample = scores[::max(1, n_scores // self.SWEEP_SAMPLE_SIZE)]
+
+        n_selected = 0
+        n_top = min(n_scores, self.SWEEP_BLOCK_SIZE)
+        stop = False
+        while not stop:
+            # about n_top largest scores in descending order, the first n_selected are already processed.
+            # All the scores above the boundary are taken, so that groups of equal scores are never split
+            if n_top < n_scores:
+                n_sample_top = max(1, n_top * len(sample) // n_scores)
+                boundary = np.partition(sample, len(sample) - n_sample_top)[len(sample) - n_sample_top]
+                top = np.flatnonzero(scores > boundary)
+            else:
+                top = np.arange(n_scores)
+            top = top[np.argsort(scores[top], kind="stable")[::-1]][n_selected:]
+            top_scores = scores[top]
+            is_near = self._is_near(top, gt)
+
+            # groups of equal scores
+            starts = np.flatnonzero(np.r_[True, top_scores[1:] != top_scores[:-1]]) if len(top) > 0 else np.array([], dtype=int)
+            ends = np.r_[starts[1:], len(top)].astype(int)
+
+            for start, end in zip(starts, ends):
+                i_threshold = len(threshold_values)
+                threshold_values.append(top_scores[start])
+
+                new_near = top[start:end][is_near[start:end]]
+                if len(new_near) > 0:
+                    for c in new_near:
+                        candidates.insert(bisect_left(candidates, c), int(c))
+                    first = min(np.argmax(np.abs(gt - c) < self.peak_tolerance) for c in new_near)
+                    self._match(candidates, gt_break_points, matches, first)
+                    true_positive = len(gt) - matches.count(None)
+
+                selected = n_selected + end
+                false_positive = selected - true_positive
+
+                if true_positive == 0:
+                    f1 = 0
+                else:
+                    precision = true_positive / selected
+                    recall = true_positive / len(gt_break_points)
+
+                    f1 = 2*precision * recall / (precision + recall)
+
+                if f1 > best_f1:
+                    best_f1 = f1
+                    max_fp = 2*len(gt_break_points) / best_f1 - 2*len(gt_break_points)
+                    best_index = i_threshold
+                else:
+                    if false_positive > max_fp:
+                        stop = True
+                        break
+            else:
+                n_selected += ends[-1] if len(ends) > 0 else 0
+                stop = n_top == n_scores
+                n_top = min(n_scores, 4 * n_top)
+
+        best_threshold = (threshold_values[best_index] + threshold_values[best_index+1])/2
+        return 1 - best_f1, best_threshold
+
+    def _compute_best_f1_loop(self, scores: np.array, gt_break_points: List[int]) -> Tuple[float, float]:
+        """
+        Computes the best F1 score and threshold value matching all the indices above each threshold.
 
         Args:
             scores (np.array): The array of scores.
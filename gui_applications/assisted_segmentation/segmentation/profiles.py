@@ -18,7 +18,7 @@ InputProfile:
     The `InputProfile` class represents a profile that wraps a numpy array as a score profile. The input samples are returned as the score profile.
 
 NormalDivergenceProfile:
-    The `NormalDivergenceProfile` class represents a profile for computing the normal divergence of a stream of samples. The divergence is computed using a sliding window of a specified size.
+    The `NormalDivergenceProfile` class represents a profile for computing the normal divergence of a stream of samples. The divergence is computed using a sliding window of a specified size, either for all the windows at once (batch engine) or updating the moments sample by sample (loop engine).
 
 ProminenceProfile:
     The `ProminenceProfile` class represents a profile for computing the prominence of peaks in a score profile. The prominence of a peak is a measure of how much the peak stands out from the surrounding samples and is computed using the `peak_prominences` function from `scipy.signal`.
@@ -41,7 +41,7 @@ from typing import List, Union
 import numpy as np
 from scipy.signal import peak_prominences
 from scipy.signal import resample
-from .utils import MovingCovarianceRatio
+from .utils import MovingCovarianceRatio, BatchCovarianceRatio
 
 
 # FIX: ricalcolare i profili solo quando il profile di input e' cambiato. Mi conviene fare un
@@ -137,6 +137,7 @@ class NormalDivergenceProfile(ScoreProfile):
     Attributes:
         stream (np.array): The stream of samples.
         window_size (int): The size of the sliding window used for computing the divergence.
+        engine (str): The engine used to compute the divergence ("batch" or "loop").
         divergence (np.array): The computed divergence profile.
 
     Methods:
@@ -144,18 +145,26 @@ class NormalDivergenceProfile(ScoreProfile):
 
     """
 
-    def __init__(self, stream: Union[ScoreProfile, np.array], window_size: int):
+    ENGINES = ("batch", "loop")
+
+    def __init__(self, stream: Union[ScoreProfile, np.array], window_size: int, engine: str = "batch"):
         """
         Initializes the NormalDivergenceProfile with a stream of samples and a window size for computing the divergence.
 
         Args:
             stream (np.array): The stream of samples.
             window_size (int): The size of the sliding window used for computing the divergence.
+            engine (str, optional): The engine used to compute the divergence. "batch" computes all the windows
+                at once with BatchCovarianceRatio, "loop" updates a MovingCovarianceRatio sample by sample.
+                Defaults to "batch".
         """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Valid engines are: {', '.join(self.ENGINES)}")
         if len(stream.shape) == 1:
             stream = stream[:, None]
         self.stream = stream
         self.window_size = window_size
+        self.engine = engine
         self.divergence = None
     
     # REFACTOR: replace the stream field with input_profile to make it coeherent with the other ScoreProfile classes
@@ -172,26 +181,57 @@ class NormalDivergenceProfile(ScoreProfile):
 
         """
         if self.divergence is None:
-            window_size = self.window_size
-            samples = self.stream
+            if self.engine == "batch":
+                self.divergence = self._compute_batch()
+            else:
+                self.divergence = self._compute_loop()
+        
+        return self.divergence
 
-            # initialization
-            moving_cov_ratio = MovingCovarianceRatio(samples[:window_size].copy().T)
-            divergence = np.zeros(self.stream.shape[0])
-            divergence[:window_size // 2] = moving_cov_ratio.get_divergence()
+    def _compute_loop(self) -> np.array:
+        """
+        Computes the divergence profile by updating a MovingCovarianceRatio sample by sample.
 
-            # score computation
-            for idx, sample in enumerate(samples[window_size:], start=window_size//2 + 1):
-                moving_cov_ratio.update(sample)
-                divergence[idx] = moving_cov_ratio.get_divergence()
+        Returns:
+            np.array: The computed divergence profile.
+        """
+        window_size = self.window_size
+        samples = self.stream
 
-            # finalization
-            divergence[-(window_size//2):] = moving_cov_ratio.get_divergence()
+        # initialization
+        moving_cov_ratio = MovingCovarianceRatio(samples[:window_size].copy().T)
+        divergence = np.zeros(self.stream.shape[0])
+        divergence[:window_size // 2] = moving_cov_ratio.get_divergence()
 
-            # save results
-            self.divergence = divergence
-        
-        return self.divergence
+        # score computation
+        for idx, sample in enumerate(samples[window_size:], start=window_size//2 + 1):
+            moving_cov_ratio.update(sample)
+            divergence[idx] = moving_cov_ratio.get_divergence()
+
+        # finalization
+        divergence[-(window_size//2):] = moving_cov_ratio.get_divergence()
+
+        return divergence
+
+    def _compute_batch(self) -> np.array:
+        """
+        Computes the divergence profile of all the windows at once with a BatchCovarianceRatio.
+        The windows are placed in the profile exactly as in _compute_loop, so that the two engines
+        return the same profile (up to the rounding errors of the incremental updates).
+
+        Returns:
+            np.array: The computed divergence profile.
+        """
+        window_size = self.window_size
+        window_divergence = BatchCovarianceRatio(self.stream, window_size).get_divergence()
+
+        # the loop engine leaves the sample at window_size//2 untouched, keep it for consistency
+        divergence = np.zeros(self.stream.shape[0])
+        divergence[:window_size // 2] = window_divergence[0]
+        divergence[window_size//2 + 1:window_size//2 + len(window_divergence)] = window_divergence[1:]
+        divergence[-(window_size//2):] = window_divergence[-1]
+
+        return divergence
      
 
 class ProminenceProfile(ScoreProfile):
@@ -1,5 +1,7 @@
 
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 import numpy as np
 import pywt
 from .profiles import NormalDivergenceProfile, ProminenceProfile, AverageScoreProfile
@@ -8,6 +10,33 @@ from .utils import UnionOfIntervals
 from .segmenters import ScoreModel
 
 
+def _compute_core_profile(subband_spec: Tuple[str, tuple, str], output_spec: Tuple[str, tuple, str],
+                          index: int, window_size: int):
+    """
+    Computes the resampled divergence profile of a subband stored in shared memory and writes it
+    into the index-th row of the output array, also stored in shared memory. This function is
+    executed by the worker processes of WaveletDecompositionModel.
+
+    Args:
+        subband_spec (Tuple[str, tuple, str]): Name, shape and dtype of the shared memory block holding the subband.
+        output_spec (Tuple[str, tuple, str]): Name, shape and dtype of the shared memory block holding the core profiles.
+        index (int): The index of the subband.
+        window_size (int): The size of the windows used for profile calculations.
+    """
+    subband_shm = SharedMemory(name=subband_spec[0])
+    output_shm = SharedMemory(name=output_spec[0])
+    try:
+        subband = np.ndarray(subband_spec[1], dtype=subband_spec[2], buffer=subband_shm.buf)
+        output = np.ndarray(output_spec[1], dtype=output_spec[2], buffer=output_shm.buf)
+        profile = ResampleProfile(NormalDivergenceProfile(subband, window_size), output.shape[1])
+        output[index] = profile.get_profile()
+        # release the views before closing the shared memory blocks
+        del subband, output
+    finally:
+        subband_shm.close()
+        output_shm.close()
+
+
 # REFACTOR: dentro lo score model e' necessario usare il metodo ScoreProfile.compute() per calcolare il profilo. Conviene renderlo disponibile nella classe astratta ScoreProfile e rivedere l'implementazione dei vari profili?
 # REFACTOR: attenziona a accedere a profile, nel momento in cui voglio passare a un'implementazione a chuncks
 class WaveletDecompositionModel(ScoreModel):
@@ -25,6 +54,7 @@ class WaveletDecompositionModel(ScoreModel):
         samples (np.array): The input samples for the model.
         level_wavelet (int): The level of wavelet decomposition.
         windows_size (int): The size of the windows used for profile calculations.
+        n_workers (int): The number of worker processes used to compute the subband profiles.
         average_profile (AverageScoreProfile): The average score profile of all subbands.
         score_profile (ProminenceProfile): The score profile of the model.
         _weights (List[float]): The weights assigned to each subband profile.
@@ -38,7 +68,7 @@ class WaveletDecompositionModel(ScoreModel):
         get_weights_constraints() -> List[Tuple[float, float]]: Returns the constraints for the weights.
     """
 
-    def __init__(self, samples: np.array, level_wavelet: int = 7, windows_size: int = 100):
+    def __init__(self, samples: np.array, level_wavelet: int = 7, windows_size: int = 100, n_workers: int = 1):
         """
         Initializes a new instance of the WaveletDecompositionModel class.
 
@@ -46,20 +76,28 @@ class WaveletDecompositionModel(ScoreModel):
             samples (np.array): The input samples for the model.
             level_wavelet (int, optional): The level of wavelet decomposition. Defaults to 7.
             windows_size (int, optional): The size of the windows used for profile calculations. Defaults to 100.
+            n_workers (int, optional): The number of worker processes used to compute the subband profiles.
+                If 1, the profiles are computed in the calling process. Defaults to 1.
         """
         self.samples = samples
         self.window_size = windows_size
+        self.n_workers = n_workers
 
         dec = pywt.wavedec(samples, wavelet='db3', level=level_wavelet, axis=0)
         N = samples.shape[0]
 
-        core_profiles = []
+        if n_workers > 1:
+            core_profiles = self._compute_core_profiles_parallel(dec, N)
+        else:
+            core_profiles = []
+            for _, subband in enumerate(dec):
+                profile = NormalDivergenceProfile(subband, windows_size)
+                profile = ResampleProfile(profile, N)
+                core_profiles.append(profile)
+
         weights = []
         constraints = []
-        for _, subband in enumerate(dec):
-            profile = NormalDivergenceProfile(subband, windows_size)
-            profile = ResampleProfile(profile, N)
-            core_profiles.append(profile)
+        for _ in dec:
             weights.append(1)
             constraints.append((0.5, 2))
             
@@ -74,6 +112,50 @@ class WaveletDecompositionModel(ScoreModel):
         self.stored_windows = []
         self.prune_factor = 10
     
+    def _compute_core_profiles_parallel(self, subbands: List[np.array], n_target_samples: int) -> List[InputProfile]:
+        """
+        Computes the resampled divergence profile of each subband in a pool of worker processes.
+        The subbands and the resulting profiles are exchanged through shared memory blocks,
+        so that the (potentially large) arrays are not pickled between the processes.
+
+        Args:
+            subbands (List[np.array]): The subbands obtained from the wavelet decomposition.
+            n_target_samples (int): The number of samples of the resampled profiles.
+
+        Returns:
+            List[InputProfile]: The core profiles, one for each subband.
+        """
+        shared_blocks = []
+        try:
+            subband_specs = []
+            for subband in subbands:
+                shm = SharedMemory(create=True, size=max(subband.nbytes, 1))
+                shared_blocks.append(shm)
+                np.ndarray(subband.shape, dtype=subband.dtype, buffer=shm.buf)[:] = subband
+                subband_specs.append((shm.name, subband.shape, subband.dtype.str))
+
+            output_shape = (len(subbands), n_target_samples)
+            output_dtype = np.dtype(np.float64)
+            output_shm = SharedMemory(create=True, size=int(np.prod(output_shape)) * output_dtype.itemsize)
+            shared_blocks.append(output_shm)
+            output_spec = (output_shm.name, output_shape, output_dtype.str)
+
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(subbands))) as executor:
+                futures = [executor.submit(_compute_core_profile, subband_spec, output_spec, index, self.window_size)
+                           for index, subband_spec in enumerate(subband_specs)]
+                for future in futures:
+                    future.result()
+
+            output = np.ndarray(output_shape, dtype=output_dtype, buffer=output_shm.buf)
+            core_profiles = [InputProfile(profile.copy()) for profile in output]
+            del output
+        finally:
+            for shm in shared_blocks:
+                shm.close()
+                shm.unlink()
+
+        return core_profiles
+
     def _enhance_profiles(self, core_profiles: List[InputProfile] = None) -> List[ScoreProfile]:
         if not core_profiles:
             core_profiles = self.core_profiles
@@ -45,7 +45,7 @@ SupervisedDomain:
 
 from typing import List, Tuple
 import numpy as np
-from .utils import UnionOfIntervals 
+from .utils import UnionOfIntervals, LRUCache
 from abc import ABC, abstractmethod
 
 # REFACTOR: the optimizer does not need the segmenter. It only needs the weights and 
@@ -212,27 +212,59 @@ class Segmenter:
         extension_window (int): The extension window for supervised intervals.
         loss (Loss): The loss function used by the segmenter.
         optimizer (Optimizer): The optimizer used by the segmenter.
+        cache_resolution (float): The resolution used to quantize the weights in the cache keys.
+        score_cache (LRUCache): The cache of the supervised scores, keyed on the quantized weights.
+        loss_cache (LRUCache): The cache of the loss values, keyed on the quantized weights.
+        gt_version (int): A counter incremented every time the ground truth changes.
 
     """
 
-    def __init__(self, score_model: ScoreModel, extension_window: int = 100):
+    def __init__(self, score_model: ScoreModel, extension_window: int = 100, cache_size: int = 256, cache_resolution: float = 1e-3):
         """
         Initializes a new instance of the Segmenter class.
 
         Args:
             score_model (ScoreModel): The score model used by the segmenter.
             extension_window (int, optional): The extension window for supervised intervals. Defaults to 100.
+            cache_size (int, optional): The maximum number of supervised scores and loss values kept in the caches. Defaults to 256.
+            cache_resolution (float, optional): The resolution used to quantize the weights in the cache keys.
+                Weight vectors that round to the same multiples of the resolution share the cached results. Defaults to 1e-3.
         """
         
         self.score_model: ScoreModel = score_model
         self.gt_break_points = []
         self.supervised_domain = UnionOfIntervals(score_model.num_samples)
         self.weights = score_model.weights
-        self.threshold = np.sort(score_model.get_score())[-10]
+        self.threshold = self._kth_largest(score_model.get_score(), 10)
         # self.threshold = np.quantile(score_model.get_score(), 0.99)
         self.extension_window = extension_window
         self.loss = None
         self.optimizer = None
+        self.cache_resolution = cache_resolution
+        self.score_cache = LRUCache(cache_size)
+        self.loss_cache = LRUCache(cache_size)
+        self.gt_version = 0
+
+    @staticmethod
+    def _kth_largest(score: np.array, k: int, chunk_size: int = 2**20) -> float:
+        """
+        Returns the k-th largest value of a score, reading it one chunk at a time so that memory-mapped
+        scores are never loaded in memory at once.
+
+        Args:
+            score (np.array): The score.
+            k (int): The rank of the value, starting from 1.
+            chunk_size (int, optional): The number of samples read at a time. Defaults to 2**20.
+
+        Returns:
+            float: The k-th largest value of the score.
+        """
+        top = np.empty(0, dtype=score.dtype)
+        for start in range(0, len(score), chunk_size):
+            top = np.concatenate([top, score[start:start + chunk_size]])
+            if len(top) > k:
+                top = np.partition(top, len(top) - k)[len(top) - k:]
+        return np.min(top)
 
     def compile(self, loss: Loss, optimizer: Optimizer):
         """
@@ -243,6 +275,7 @@ class Segmenter:
             optimizer (Optimizer): The optimizer to be used for optimization.
         """
         self.loss = loss
+        self.loss_cache.clear()
         optimizer.set_segmenter(self)
         optimizer.set_loss(self.loss_fun, loss.get_minimum_value())
         self.optimizer = optimizer
@@ -257,17 +290,52 @@ class Segmenter:
         """
         return self.score_model.num_samples
 
+    def _cache_key(self, weights: List[float]) -> Tuple:
+        """
+        Returns the cache key for the given weights: the weights quantized with the cache resolution,
+        together with the current version of the ground truth.
+
+        Args:
+            weights (List[float]): The weights of the score model.
+
+        Returns:
+            Tuple: The cache key.
+        """
+        quantized = np.round(np.asarray(weights, dtype=float) / self.cache_resolution).astype(np.int64)
+        return (self.gt_version, tuple(quantized.tolist()))
+
+    def cache_info(self) -> dict:
+        """
+        Returns the hit and miss counters and the current size of the score and loss caches.
+
+        Returns:
+            dict: The statistics of the caches.
+        """
+        return {
+            'score_hits': self.score_cache.hits,
+            'score_misses': self.score_cache.misses,
+            'score_size': len(self.score_cache),
+            'loss_hits': self.loss_cache.hits,
+            'loss_misses': self.loss_cache.misses,
+            'loss_size': len(self.loss_cache),
+        }
+
     def loss_fun(self, weights: List[float]):
         """
         Calculates the loss value for the segmenter using the given weights.
+        The loss values are cached, keyed on the quantized weights and on the ground truth.
 
         Args:
             weights (List[float]): The weights to be used for segmentation.
         Returns:
             float: The calculated loss value.
         """
-        score, gt_bkps = self.get_supervised_score(weights=weights)
-        loss_value = self.loss(score, gt_bkps)
+        key = self._cache_key(weights)
+        loss_value = self.loss_cache.get(key)
+        if loss_value is None:
+            score, gt_bkps = self.get_supervised_score(weights=weights)
+            loss_value = self.loss(score, gt_bkps)
+            self.loss_cache.put(key, loss_value)
         return loss_value
 
     def get_optimal_threshold(self) -> float:
@@ -308,6 +376,7 @@ class Segmenter:
     def get_supervised_score(self, weights: List[float] = None) -> np.array:
         """
         Calculates the score for the segmenter using the given weights, considering only the supervised regions.
+        The supervised scores are cached, keyed on the quantized weights and on the ground truth.
 
         Args:
             weights (List[float], optional): The weights to be used for segmentation. Defaults to None. If None is provided, the weights stored in the segmenter are used.
@@ -317,6 +386,10 @@ class Segmenter:
         """
         if weights is None:
             weights = self.weights
+        key = self._cache_key(weights)
+        cached = self.score_cache.get(key)
+        if cached is not None:
+            return cached
         self.score_model.weights = weights
         stored_windows = self.score_model.get_windows()
 
@@ -330,6 +403,7 @@ class Segmenter:
                     gt_bkps.append(cnt + bkp - start)
             cnt += len(window)
         supervised_score = np.concatenate(supervised_score)
+        self.score_cache.put(key, (supervised_score, gt_bkps))
         return supervised_score, gt_bkps
 
     @property
@@ -364,6 +438,10 @@ class Segmenter:
         self.gt_break_points = list(sorted([b for b in gt_break_points]))
         self.supervised_domain.add_interval(supervised_interval)
         self.score_model.store_window(supervised_interval[0], supervised_interval[1])
+        # the supervised scores and the losses depend on the ground truth
+        self.gt_version += 1
+        self.score_cache.clear()
+        self.loss_cache.clear()
 
     def update(self):
         """
@@ -0,0 +1,467 @@
+"""
+This module contains classes for segmenting datastreams that do not fit in memory. The samples, the core profiles
+and the score profile are stored in memory-mapped files, and every computation walks through them chunk by chunk,
+so that the memory footprint is bounded by the chunk size and not by the length of the datastream.
+
+Classes:
+    MemmapStream: Stores a stream of sample chunks in memory-mapped files.
+    StreamingWaveletDecompositionModel: A wavelet decomposition model that computes its profiles chunk by chunk.
+
+Functions:
+    streaming_prominence: Computes the prominence profile of a memory-mapped score profile chunk by chunk.
+    resample_range: Computes a range of the samples of the Fourier resampling of a profile.
+
+MemmapStream:
+    The `MemmapStream` class appends the sample chunks (and the corresponding timestamps) read from an acquisition
+    to raw files and exposes them as memory-mapped arrays. It also keeps the statistics needed to normalize the
+    samples without loading them in memory.
+
+StreamingWaveletDecompositionModel:
+    The `StreamingWaveletDecompositionModel` class computes the profiles of `WaveletDecompositionModel` on
+    overlapping chunks of the datastream. Each chunk is extended with a margin on both sides and aligned to
+    2**level_wavelet samples, so that its wavelet coefficients are the coefficients of the whole datastream at
+    known positions, and the divergence windows near the chunk boundaries see the same neighbourhood they would
+    see on the whole datastream. The divergence profiles of the subbands are stitched exactly, coefficient by
+    coefficient, then each subband is resampled to the global sample positions with `resample_range`.
+
+resample_range:
+    `WaveletDecompositionModel` resamples the subband profiles with scipy.signal.resample, that is, it evaluates
+    their band-limited (periodic) interpolation at the global sample positions. The function evaluates the same
+    interpolation on a range of samples from the spectrum of the profile: of the whole profile when it is not much
+    longer than the range, otherwise of the coefficients around the range extended by a margin. The interpolation
+    kernel decays slowly, so in the second case the result differs slightly from the global resampling (about 1e-4
+    of the profile range with the default margin, see benchmarks/streaming_benchmark.py).
+
+streaming_prominence:
+    The prominence of a sample depends on the samples up to the nearest higher sample on both sides, which may be
+    arbitrarily far away. The function computes the prominence of each chunk with `peak_prominences` and stitches
+    the chunks exactly by carrying, from one chunk to the next, the monotonic stack of the samples that are not yet
+    dominated by a higher sample.
+"""
+
+import os
+from typing import List, Tuple
+import numpy as np
+import pywt
+from scipy.signal import peak_prominences, czt
+from .profiles import NormalDivergenceProfile, PowerTransformProfile, InputProfile
+from .scoremodels import WaveletDecompositionModel
+
+
+class MemmapStream:
+    """
+    Stores a stream of sample chunks in memory-mapped files.
+
+    Attributes:
+        folder (str): The folder containing the memory-mapped files.
+        dtype (np.dtype): The data type of the stored samples.
+        n_samples (int): The number of stored samples.
+        dimension (int): The dimension of each sample.
+
+    Methods:
+        append(samples: np.array, times: np.array): Appends a chunk of samples and timestamps to the stream.
+        samples() -> np.memmap: Returns the stored samples.
+        times() -> np.memmap: Returns the stored timestamps.
+        normalize(scale: float, chunk_size: int): Normalizes the stored samples in place.
+    """
+
+    SAMPLES_FILE = "samples.dat"
+    TIMES_FILE = "times.dat"
+
+    def __init__(self, folder: str, dtype: np.dtype = np.float32):
+        """
+        Initializes an empty MemmapStream.
+
+        Args:
+            folder (str): The folder where the memory-mapped files are created.
+            dtype (np.dtype, optional): The data type of the stored samples. Defaults to np.float32.
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.dtype = np.dtype(dtype)
+        self.n_samples = 0
+        self.dimension = None
+        self._sum = 0.
+        self._sum_squares = 0.
+        for file_name in (self.SAMPLES_FILE, self.TIMES_FILE):
+            open(os.path.join(folder, file_name), 'wb').close()
+
+    def append(self, samples: np.array, times: np.array = None):
+        """
+        Appends a chunk of samples, and optionally the corresponding timestamps, to the stream.
+
+        Args:
+            samples (np.array): The chunk of samples, with shape (n_samples, dimension).
+            times (np.array, optional): The timestamps of the samples. Defaults to None.
+        """
+        samples = np.asarray(samples)
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if self.dimension is None:
+            self.dimension = samples.shape[1]
+        elif samples.shape[1] != self.dimension:
+            raise ValueError(f"Expected samples of dimension {self.dimension}, got {samples.shape[1]}")
+
+        with open(os.path.join(self.folder, self.SAMPLES_FILE), 'ab') as f:
+            f.write(np.ascontiguousarray(samples, dtype=self.dtype).tobytes())
+        if times is not None:
+            with open(os.path.join(self.folder, self.TIMES_FILE), 'ab') as f:
+                f.write(np.ascontiguousarray(times, dtype=np.float64).reshape(-1).tobytes())
+
+        self.n_samples += samples.shape[0]
+        self._sum += np.sum(samples, dtype=np.float64)
+        self._sum_squares += np.sum(np.square(samples, dtype=np.float64))
+
+    @property
+    def mean(self) -> float:
+        """
+        Returns the mean of all the stored values.
+
+        Returns:
+            float: The mean of the stored values.
+        """
+        return self._sum / (self.n_samples * self.dimension)
+
+    @property
+    def std(self) -> float:
+        """
+        Returns the standard deviation of all the stored values.
+
+        Returns:
+            float: The standard deviation of the stored values.
+        """
+        return np.sqrt(max(self._sum_squares / (self.n_samples * self.dimension) - self.mean ** 2, 0.))
+
+    @property
+    def samples(self) -> np.memmap:
+        """
+        Returns the stored samples.
+
+        Returns:
+            np.memmap: The stored samples, with shape (n_samples, dimension).
+        """
+        return np.memmap(os.path.join(self.folder, self.SAMPLES_FILE), dtype=self.dtype, mode='r+',
+                         shape=(self.n_samples, self.dimension))
+
+    @property
+    def times(self) -> np.memmap:
+        """
+        Returns the stored timestamps, or None if no timestamp was appended.
+
+        Returns:
+            np.memmap: The stored timestamps, with shape (n_samples, 1).
+        """
+        path = os.path.join(self.folder, self.TIMES_FILE)
+        if os.path.getsize(path) == 0:
+            return None
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(self.n_samples, 1))
+
+    def normalize(self, scale: float = 1., chunk_size: int = 2**20):
+        """
+        Normalizes the stored samples in place as (x - mean) / (scale * std).
+
+        Args:
+            scale (float, optional): The number of standard deviations mapped to 1. Defaults to 1.
+            chunk_size (int, optional): The number of samples normalized at a time. Defaults to 2**20.
+        """
+        mean, std = self.mean, self.std
+        samples = self.samples
+        for start in range(0, self.n_samples, chunk_size):
+            chunk = samples[start:start + chunk_size]
+            chunk[:] = (chunk - mean) / (scale * std)
+        samples.flush()
+
+
+def _left_minima(chunk: np.array, stack_values: np.array, stack_minima: np.array) -> Tuple[np.array, np.array, np.array]:
+    """
+    Computes, for each sample of a chunk, the minimum of the samples between the nearest strictly higher
+    sample on its left (or the beginning of the stream) and the sample itself.
+
+    The samples of the previous chunks that can still be the nearest higher sample of a later sample form
+    a stack with strictly decreasing values. Each element of the stack stores the minimum of the samples
+    between the previous element and itself.
+
+    Args:
+        chunk (np.array): The samples of the chunk.
+        stack_values (np.array): The values of the stack left by the previous chunks, from bottom to top.
+        stack_minima (np.array): The minima stored in the stack left by the previous chunks, from bottom to top.
+
+    Returns:
+        Tuple[np.array, np.array, np.array]: The minima of the chunk samples, and the values and the minima
+            of the updated stack.
+    """
+    _, left_bases, _ = peak_prominences(chunk, np.arange(len(chunk)))
+    left_minima = chunk[left_bases]
+
+    # the samples without a higher sample on their left inside the chunk continue their search in the stack
+    previous_max = np.maximum.accumulate(np.r_[-np.inf, chunk[:-1]])
+    is_open = previous_max <= chunk
+    if len(stack_values) > 0 and np.any(is_open):
+        # the stack elements lower than or equal to a sample, from the top, are the ones it passes over
+        top_values = stack_values[::-1]
+        top_minima = np.minimum.accumulate(stack_minima[::-1])
+        n_passed = np.searchsorted(top_values, chunk[is_open], side='right')
+        carried = np.where(n_passed > 0, top_minima[np.maximum(n_passed - 1, 0)], np.inf)
+        left_minima[is_open] = np.minimum(left_minima[is_open], carried)
+
+    # the stack keeps the samples not dominated by a higher sample on their right
+    next_max = np.maximum.accumulate(np.r_[-np.inf, chunk[:0:-1]])[::-1]
+    is_record = chunk > next_max
+    is_kept = stack_values > np.max(chunk)
+    stack_values = np.concatenate([stack_values[is_kept], chunk[is_record]])
+    stack_minima = np.concatenate([stack_minima[is_kept], left_minima[is_record]])
+
+    return left_minima, stack_values, stack_minima
+
+
+def streaming_prominence(samples: np.array, output: np.array, chunk_size: int = 2**20):
+    """
+    Computes the prominence of every sample of a score profile, as ProminenceProfile does, reading and writing
+    one chunk at a time. The result is the same of `peak_prominences` applied to the whole profile.
+
+    Args:
+        samples (np.array): The score profile, typically a memory-mapped array.
+        output (np.array): The array where the prominence profile is written, typically a memory-mapped array.
+        chunk_size (int, optional): The number of samples processed at a time. Defaults to 2**20.
+    """
+    n_samples = len(samples)
+    starts = range(0, n_samples, chunk_size)
+
+    # left pass: the minimum towards the nearest higher sample on the left is stored in output
+    stack_values, stack_minima = np.empty(0), np.empty(0)
+    for start in starts:
+        chunk = np.asarray(samples[start:start + chunk_size], dtype=np.float64)
+        left_minima, stack_values, stack_minima = _left_minima(chunk, stack_values, stack_minima)
+        output[start:start + chunk_size] = left_minima
+
+    # right pass: the same search on the reversed stream, then the prominence is computed
+    stack_values, stack_minima = np.empty(0), np.empty(0)
+    for start in reversed(starts):
+        chunk = np.asarray(samples[start:start + chunk_size], dtype=np.float64)
+        right_minima, stack_values, stack_minima = _left_minima(chunk[::-1].copy(), stack_values, stack_minima)
+        left_minima = np.asarray(output[start:start + chunk_size], dtype=np.float64)
+        output[start:start + chunk_size] = chunk - np.maximum(left_minima, right_minima[::-1])
+
+
+def resample_range(profile: np.array, n_target_samples: int, start: int, end: int, margin: int = 4096) -> np.array:
+    """
+    Computes the samples [start, end) of scipy.signal.resample(profile, n_target_samples) without resampling the
+    whole profile. The band-limited interpolation of the profile is evaluated at the positions of the samples with
+    a chirp z-transform of the spectrum of the whole profile, if the range and its margins cover it, otherwise of
+    the coefficients around the range extended by `margin` coefficients on both sides (the result is then an
+    approximation of the global resampling).
+
+    Args:
+        profile (np.array): The profile to resample, typically a memory-mapped array.
+        n_target_samples (int): The number of samples of the whole resampled profile.
+        start (int): The first sample of the range.
+        end (int): The end (excluded) of the range.
+        margin (int, optional): The number of coefficients added on both sides of the range. Defaults to 4096.
+
+    Returns:
+        np.array: The samples [start, end) of the resampled profile.
+    """
+    n_coefficients = len(profile)
+    step = n_coefficients / n_target_samples
+    first = int(np.floor(start * step)) - margin
+    n_block = int(np.ceil((end - 1) * step)) + margin + 1 - first
+    if n_block >= n_coefficients:
+        # the spectrum of the whole profile: the result is the global resampling
+        first, n_block = 0, n_coefficients
+        block = np.asarray(profile, dtype=np.float64)
+    else:
+        # the profile is periodic for the Fourier resampling, the blocks of the first and last ranges wrap around
+        block = np.asarray(profile[np.arange(first, first + n_block) % n_coefficients], dtype=np.float64)
+
+    # centered spectrum, with the Nyquist component of an even block split between -n_block/2 and n_block/2
+    spectrum = np.fft.fftshift(np.fft.fft(block))
+    lowest_frequency = -(n_block // 2)
+    if n_block % 2 == 0:
+        spectrum[0] *= 0.5
+        spectrum = np.r_[spectrum, spectrum[0]]
+    frequencies = np.arange(len(spectrum)) + lowest_frequency
+
+    # sum of spectrum[f] * exp(2j*pi*f*t/n_block) at the positions t = (start + n) * step - first
+    n_samples = end - start
+    offset = start * step - first
+    spectrum = spectrum * np.exp(2j * np.pi * frequencies * offset / n_block)
+    resampled = czt(spectrum, n_samples, np.exp(2j * np.pi * step / n_block), 1.)
+    resampled *= np.exp(2j * np.pi * lowest_frequency * step * np.arange(n_samples) / n_block)
+    return resampled.real / n_block
+
+
+class StreamingWaveletDecompositionModel(WaveletDecompositionModel):
+    """
+    A wavelet decomposition model for datastreams that do not fit in memory. It computes the same profiles
+    of WaveletDecompositionModel, but the core profiles, the average profile and the score profile are stored
+    in memory-mapped files and computed one chunk at a time.
+
+    The subband divergence profiles of each chunk are computed on the chunk extended by a margin on both sides,
+    and only the coefficients of the chunk are kept, so that the profiles are stitched at the chunk boundaries.
+    The subband profiles are then resampled to the global sample positions chunk by chunk (see resample_range).
+    The score profile is recomputed only when the weights change.
+
+    Attributes:
+        samples (np.array): The input samples for the model, typically a memory-mapped array.
+        folder (str): The folder containing the memory-mapped profiles.
+        chunk_size (int): The number of samples processed at a time.
+        margin (int): The number of samples added on both sides of each chunk.
+        resample_margin (int): The number of subband coefficients added on both sides of each chunk when the
+            subband profiles are resampled.
+    """
+
+    SUBBAND_PROFILES_FILE = "subband_profiles.dat"
+    CORE_PROFILES_FILE = "core_profiles.dat"
+    AVERAGE_PROFILE_FILE = "average_profile.dat"
+    SCORE_PROFILE_FILE = "score_profile.dat"
+
+    def __init__(self, samples: np.array, folder: str, level_wavelet: int = 7, windows_size: int = 100,
+                 chunk_size: int = 2**20, margin: int = None, resample_margin: int = 4096, dtype: np.dtype = np.float32):
+        """
+        Initializes a new instance of the StreamingWaveletDecompositionModel class.
+
+        Args:
+            samples (np.array): The input samples for the model, with shape (n_samples, dimension).
+            folder (str): The folder where the memory-mapped profiles are created.
+            level_wavelet (int, optional): The level of wavelet decomposition. Defaults to 7.
+            windows_size (int, optional): The size of the windows used for profile calculations. Defaults to 100.
+            chunk_size (int, optional): The number of samples processed at a time. Defaults to 2**20.
+            margin (int, optional): The number of samples added on both sides of each chunk. Defaults to None,
+                that is, twice the span of a divergence window on the coarsest subband.
+            resample_margin (int, optional): The number of subband coefficients added on both sides of each chunk
+                when the subband profiles are resampled. Defaults to 4096.
+            dtype (np.dtype, optional): The data type of the stored profiles. Defaults to np.float32.
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.samples = samples
+        self.window_size = windows_size
+        self.n_workers = 1
+        self.folder = folder
+        self.level_wavelet = level_wavelet
+        self.chunk_size = chunk_size
+        self.margin = margin if margin is not None else 2 * windows_size * 2**level_wavelet
+        self.resample_margin = resample_margin
+        self.dtype = np.dtype(dtype)
+
+        n_subbands = level_wavelet + 1
+        self._core = self._open(self.CORE_PROFILES_FILE, (n_subbands, self.num_samples), 'w+')
+        self._compute_core_profiles()
+
+        self._weights = [1] * n_subbands
+        self._constraints = [(0.5, 2)] * n_subbands
+
+        self.core_profiles = [InputProfile(profile) for profile in self._core]
+        self.enhanced_profiles = self._enhance_profiles()
+        self.score_profile = None
+        self._score = None
+        self._score_weights = None
+
+        self.max_windows = 20
+        self.stored_windows = []
+        self.prune_factor = 10
+
+    def _open(self, file_name: str, shape: tuple, mode: str) -> np.memmap:
+        """
+        Opens a memory-mapped profile in the model folder.
+
+        Args:
+            file_name (str): The name of the file.
+            shape (tuple): The shape of the array.
+            mode (str): The mode used to open the file.
+
+        Returns:
+            np.memmap: The memory-mapped array.
+        """
+        return np.memmap(os.path.join(self.folder, file_name), dtype=self.dtype, mode=mode, shape=shape)
+
+    def _subband_levels(self) -> List[int]:
+        """
+        Returns the decomposition level of each subband, in the order of pywt.wavedec.
+
+        Returns:
+            List[int]: The level of each subband.
+        """
+        return [self.level_wavelet] + list(range(self.level_wavelet, 0, -1))
+
+    def _subband_lengths(self) -> List[int]:
+        """
+        Returns the number of coefficients of each subband of the whole datastream, in the order of pywt.wavedec.
+
+        Returns:
+            List[int]: The number of coefficients of each subband.
+        """
+        filter_length = pywt.Wavelet('db3').dec_len
+        lengths = [self.num_samples]
+        for _ in range(self.level_wavelet):
+            lengths.append(pywt.dwt_coeff_len(lengths[-1], filter_length, 'symmetric'))
+        return [lengths[level] for level in self._subband_levels()]
+
+    def _compute_subband_profiles(self, subband_profiles: List[np.array]):
+        """
+        Computes the divergence profile of each subband on overlapping chunks and stores the coefficients of each
+        chunk. The chunks are extended with the margin and aligned to 2**level_wavelet samples, so that the
+        coefficient k of a subband at level j of a chunk starting at sample low is the coefficient k + low / 2**j
+        of the whole datastream.
+
+        Args:
+            subband_profiles (List[np.array]): The arrays where the profile of each subband is written.
+        """
+        n_samples = self.num_samples
+        alignment = 2**self.level_wavelet
+        levels = self._subband_levels()
+        for start in range(0, n_samples, self.chunk_size):
+            end = min(start + self.chunk_size, n_samples)
+            low = max(0, start - self.margin) // alignment * alignment
+            high = min(n_samples, end + self.margin)
+            segment = np.asarray(self.samples[low:high], dtype=np.float64)
+            dec = pywt.wavedec(segment, wavelet='db3', level=self.level_wavelet, axis=0)
+            for subband, level, output in zip(dec, levels, subband_profiles):
+                # the coefficients of the chunk, the last chunk takes the ones past the end of the datastream
+                first = -(-start // 2**level)
+                last = len(output) if end == n_samples else -(-end // 2**level)
+                profile = NormalDivergenceProfile(subband, self.window_size).get_profile()
+                output[first:last] = profile[first - low // 2**level:last - low // 2**level]
+
+    def _compute_core_profiles(self):
+        """
+        Computes the subband profiles chunk by chunk, then resamples them to the global sample positions chunk by chunk.
+        """
+        n_samples = self.num_samples
+        lengths = self._subband_lengths()
+        # the subband profiles are kept in double precision, they are resampled with a sum over many coefficients
+        all_subbands = np.memmap(os.path.join(self.folder, self.SUBBAND_PROFILES_FILE), dtype=np.float64, mode='w+', shape=(sum(lengths),))
+        offsets = np.cumsum([0] + lengths)
+        subband_profiles = [all_subbands[offset:offset + length] for offset, length in zip(offsets, lengths)]
+        self._compute_subband_profiles(subband_profiles)
+        all_subbands.flush()
+
+        for i, subband_profile in enumerate(subband_profiles):
+            for start in range(0, n_samples, self.chunk_size):
+                end = min(start + self.chunk_size, n_samples)
+                self._core[i, start:end] = resample_range(subband_profile, n_samples, start, end, self.resample_margin)
+        self._core.flush()
+
+    def get_score(self) -> np.array:
+        """
+        Returns the score profile of the model, computing it chunk by chunk if the weights changed.
+
+        Returns:
+            np.array: The memory-mapped score profile of the model.
+        """
+        weights = tuple(self.weights)
+        if self._score is None or weights != self._score_weights:
+            n_samples = self.num_samples
+            average = self._open(self.AVERAGE_PROFILE_FILE, (n_samples,), 'w+')
+            for start in range(0, n_samples, self.chunk_size):
+                end = min(start + self.chunk_size, n_samples)
+                chunk = np.zeros(end - start)
+                for core_profile, w in zip(self._core, weights):
+                    chunk += PowerTransformProfile(InputProfile(core_profile[start:end]), coeff=w).get_profile()
+                average[start:end] = chunk / len(weights)
+            average.flush()
+
+            self._score = self._open(self.SCORE_PROFILE_FILE, (n_samples,), 'w+')
+            streaming_prominence(average, self._score, self.chunk_size)
+            self._score.flush()
+            self._score_weights = weights
+        return self._score
@@ -7,6 +7,8 @@ Classes:
     CircularArrayUnivariate: A subclass of CircularArray tailored for univariate data.
     MovingMoments: A class for computing and updating the mean and covariance of a dataset.
     MovingCovarianceRatio: A class for computing the divergence of a dataset based on moving covariance.
+    BatchCovarianceRatio: A class for computing the moving covariance divergence of all the windows at once.
+    LRUCache: A bounded least-recently-used cache with hit and miss counters.
 
 CircularArray:
     Manages a circular array structure for multivariate data, supporting operations such as adding new samples,
@@ -24,9 +26,18 @@ MovingCovarianceRatio:
     Utilizes MovingMoments to compute the divergence of a dataset based on the covariance of samples before and
     after a midpoint in a sliding window approach.
 
+BatchCovarianceRatio:
+    Computes the same divergence as MovingCovarianceRatio for every position of the sliding window at once,
+    using cumulative sums of the samples and of their outer products and a stacked log-determinant.
+
+LRUCache:
+    Stores a bounded number of values, discarding the least recently used one when full, and counts
+    the lookups that found (hits) or did not find (misses) the requested key.
+
 """
 
-from typing import List
+from collections import OrderedDict
+from typing import Any, Hashable, List
 import numpy as np
 
 
@@ -363,6 +374,181 @@ class MovingCovarianceRatio:
         return y_total - 0.5 * (y_before + y_after)
 
 
+class BatchCovarianceRatio:
+    """
+    Calculates the covariance ratio divergence for every position of a sliding window at once.
+
+    This is the batched counterpart of MovingCovarianceRatio: instead of updating the moments
+    sample by sample, the window sums and the window sums of outer products are obtained from
+    cumulative sums, and the log-determinants of all the windows are computed with a single
+    stacked call to np.linalg.slogdet. The stream is processed in blocks of windows, so that
+    the memory footprint does not depend on the stream length and the cumulative sums do not
+    accumulate rounding errors over long acquisitions.
+
+    Attributes:
+        samples (np.array): The stream of samples, with shape (n_samples, dimension).
+        window_size (int): The size of the sliding window.
+        block_size (int): The number of windows processed in each block.
+
+    Methods:
+        __init__(samples: np.array, window_size: int, block_size: int): Initializes the BatchCovarianceRatio object.
+        get_divergence() -> np.array: Calculates the divergence of each window.
+    """
+
+    def __init__(self, samples: np.array, window_size: int, block_size: int = 2**16):
+        """
+        Initializes the BatchCovarianceRatio object with the given samples.
+
+        Args:
+            samples (np.array): The stream of samples, with shape (n_samples, dimension).
+            window_size (int): The size of the sliding window.
+            block_size (int, optional): The number of windows processed in each block. Defaults to 2**16.
+        """
+        if len(samples.shape) == 1:
+            samples = samples[:, np.newaxis]
+        self.samples = samples
+        self.window_size = window_size
+        self.block_size = block_size
+
+    @property
+    def dimension(self) -> int:
+        """
+        Returns the dimension of the samples.
+
+        Returns:
+            int: The dimension of the samples.
+        """
+        return self.samples.shape[1]
+
+    @property
+    def n_windows(self) -> int:
+        """
+        Returns the number of positions of the sliding window.
+
+        Returns:
+            int: The number of windows.
+        """
+        return self.samples.shape[0] - self.window_size + 1
+
+    def _log_det(self, sum_1: np.array, sum_2: np.array, start: np.array, n: int) -> np.array:
+        """
+        Computes the log-determinant of the regularized covariance of the windows [start, start + n).
+
+        Args:
+            sum_1 (np.array): The cumulative sums of the samples, with a leading zero row.
+            sum_2 (np.array): The cumulative sums of the outer products of the samples, with a leading zero row.
+            start (np.array): The start indices of the windows.
+            n (int): The number of samples in each window.
+
+        Returns:
+            np.array: The log-determinants of the windows.
+        """
+        s_1 = sum_1[start + n] - sum_1[start]
+        s_2 = sum_2[start + n] - sum_2[start]
+        covariance = (s_2 - s_1[:, :, np.newaxis] * s_1[:, np.newaxis, :] / n) / (n - 1)
+        covariance += 1e-6 * np.eye(self.dimension)
+        return np.linalg.slogdet(covariance)[1]
+
+    def get_divergence(self) -> np.array:
+        """
+        Calculates the divergence of each position of the sliding window. The i-th element
+        is the value that MovingCovarianceRatio.get_divergence() returns when the window
+        covers the samples [i, i + window_size).
+
+        Returns:
+            np.array: The divergence of each window.
+        """
+        window_size = self.window_size
+        half_size = window_size // 2
+        divergence = np.empty(self.n_windows)
+
+        for first in range(0, self.n_windows, self.block_size):
+            last = min(first + self.block_size, self.n_windows)
+            block = np.asarray(self.samples[first:last + window_size - 1], dtype=np.float64)
+            # centering the block keeps the cumulative sums small
+            block = block - block.mean(axis=0)
+
+            sum_1 = np.zeros((block.shape[0] + 1, self.dimension))
+            np.cumsum(block, axis=0, out=sum_1[1:])
+            sum_2 = np.zeros((block.shape[0] + 1, self.dimension, self.dimension))
+            np.cumsum(block[:, :, np.newaxis] * block[:, np.newaxis, :], axis=0, out=sum_2[1:])
+
+            start = np.arange(last - first)
+            y_total = self._log_det(sum_1, sum_2, start, window_size)
+            y_before = self._log_det(sum_1, sum_2, start, half_size)
+            y_after = self._log_det(sum_1, sum_2, start + half_size, window_size - half_size)
+            divergence[first:last] = y_total - 0.5 * (y_before + y_after)
+
+        return divergence
+
+
+class LRUCache:
+    """
+    A bounded cache that discards the least recently used value when full.
+
+    Attributes:
+        max_size (int): The maximum number of stored values.
+        hits (int): The number of lookups that found the requested key.
+        misses (int): The number of lookups that did not find the requested key.
+
+    Methods:
+        get(key: Hashable) -> Any: Returns the value stored for the key, or None.
+        put(key: Hashable, value: Any): Stores a value for the key.
+        clear(): Removes all the stored values.
+    """
+
+    def __init__(self, max_size: int = 256):
+        """
+        Initializes an empty LRUCache.
+
+        Args:
+            max_size (int, optional): The maximum number of stored values. Defaults to 256.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Returns the value stored for the key and marks it as the most recently used.
+
+        Args:
+            key (Hashable): The key to look up.
+
+        Returns:
+            Any: The stored value, or None if the key is not in the cache.
+        """
+        if key in self._values:
+            self._values.move_to_end(key)
+            self.hits += 1
+            return self._values[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Stores a value for the key, discarding the least recently used value if the cache is full.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (Any): The value to store.
+        """
+        self._values[key] = value
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all the stored values. The hit and miss counters are preserved.
+        """
+        self._values.clear()
+
+
 # DOC: non e' piu' chiamata SupervisedDomain, ma e' la stessa classe
 class UnionOfIntervals:
     """
@@ -1,13 +1,17 @@
-from multiprocessing import Event
+from multiprocessing import Event, Queue
 import sys
 import os
 
 # Add the STDatalog SDK root directory to the sys.path to access the SDK packages
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../..')))
 
+import io
+import argparse
 import csv
+import queue
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-from PySide6.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget, QMessageBox
+from PySide6.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget, QMessageBox, QPushButton
 from PySide6.QtCore import Qt, QThread, Signal
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QDesktopServices
 from PySide6.QtCore import QUrl
@@ -20,6 +24,21 @@ import stdatalog_core.HSD_utils.logger as logger
 log = logger.setup_applevel_logger(is_debug = False, file_name= "app_debug.log")
 
 DECIMATION = 4
+# Number of fast telemetry samples before each dataset row (1024 samples after decimation)
+WINDOW_SIZE = 1024*DECIMATION
+# Number of dataset rows computed and written at a time, it bounds the memory used by the window copies
+ROWS_PER_BATCH = 256
+# Default number of tag windows processed in parallel. Each worker process holds the data of one tag window, so the
+# peak memory grows with the number of jobs: more jobs are opt-in (-j option)
+DEFAULT_JOBS = 1
+# Duration (seconds) of the slices in which a tag window is read, the cancellation is checked between two slices
+READ_SLICE_TIME = 10
+
+# HSDatalog instance of the acquisition, progress queue and cancel event of a worker process
+worker_hsd = None
+worker_hsd_instance = None
+worker_progress_queue = None
+worker_cancel_event = None
 
 class DatasetCreationWorker(QThread):
     success = Signal()
@@ -27,24 +46,103 @@ class DatasetCreationWorker(QThread):
     message = Signal(str)
 
 
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, jobs=None):
         super().__init__()
         self.folder_path = folder_path
+        self.jobs = jobs
+        self.cancel_event = Event()
 
     def run(self):
         try:
-            MC_AI_dataset_creation(self.folder_path, self.message)
-            self.success.emit()
+            if MC_AI_dataset_creation(self.folder_path, self.message, self.jobs, self.cancel_event):
+                self.success.emit()
         except Exception as e:
             self.error.emit(str(e))
 
+    def cancel(self):
+        # The worker processes stop at their next read slice or batch of rows
+        self.cancel_event.set()
 
-def MC_AI_dataset_creation(main_folder, message_signal):
+
+class QueueSignal:
+    """
+    Forwards the messages and the progress of a tag window processed in a worker process to the DatasetCreationWorker.
+    """
+    def __init__(self, progress_queue, label):
+        self.progress_queue = progress_queue
+        self.label = label
+
+    def emit(self, text):
+        self.progress_queue.put((self.label, None, text))
+
+    def progress(self, percent):
+        self.progress_queue.put((self.label, percent, None))
+
+
+def init_tag_worker(main_folder, progress_queue, cancel_event):
+    global worker_hsd, worker_hsd_instance, worker_progress_queue, worker_cancel_event
+    worker_hsd = HSDatalog()
+    worker_hsd_instance = worker_hsd.create_hsd(acquisition_folder=main_folder)
+    worker_progress_queue = progress_queue
+    worker_cancel_event = cancel_event
+
+
+def tag_dataset_creation(tag, cf_path):
+    """
+    Creates the class file of a tag window. It runs in a worker process initialized by init_tag_worker.
+    
+    Args:
+    tag (dict): The tag, with 'label', 'time_start' and 'time_end'.
+    cf_path (str): The class file path.
+    
+    Returns:
+    numpy.ndarray: The end offset (bytes) of each row of the class file, or None if the tag window has no data or the creation was cancelled.
+    """
+    start_time = tag['time_start']
+    end_time = tag['time_end']
+    label = tag['label']
+    signal = QueueSignal(worker_progress_queue, label)
+
+    # Read the accelerometer and the fast telemetry chunks overlapping the tag window
+    acc_window = read_tag_window(worker_hsd, worker_hsd_instance, "iis3dwb_acc", start_time, end_time, worker_cancel_event)
+    fmc_window = read_tag_window(worker_hsd, worker_hsd_instance, "fast_mc_telemetries", start_time, end_time, worker_cancel_event)
+    if worker_cancel_event.is_set():
+        return None
+    if acc_window is None or fmc_window is None:
+        log.warning(f"{label} tag [{start_time}, {end_time}] skipped, no data in the tag window")
+        signal.progress(100)
+        return None
+    acc_data, acc_timestamp = acc_window
+    fmc_data, fmc_timestamp = fmc_window
+    
+    # Find the index of the nearest timestamp for fmc_timestamp and acc_timestamp based on start_time
+    fmc_start_index = (np.abs(fmc_timestamp - start_time)).argmin()
+    acc_start_index = (np.abs(acc_timestamp - start_time)).argmin()
+    # Find the index of the nearest timestamp for fmc_timestamp and acc_timestamp based on end_time
+    fmc_end_index = (np.abs(fmc_timestamp - end_time)).argmin()
+    acc_end_index = (np.abs(acc_timestamp - end_time)).argmin()
+    # Trim the data based on the start and end indices
+    
+    fmc_data_trimmed = fmc_data[fmc_start_index:fmc_end_index]
+    fmc_time_trimmed = fmc_timestamp[fmc_start_index:fmc_end_index]
+    acc_data_trimmed = acc_data[acc_start_index:acc_end_index]
+    acc_time_trimmed = acc_timestamp[acc_start_index:acc_end_index]
+
+    # Create datasets from the trimmed data
+    return dataset_creation(fmc_data_trimmed, fmc_time_trimmed, acc_data_trimmed, acc_time_trimmed, cf_path, signal, signal.progress, worker_cancel_event)
+
+
+def get_progress_message(tag_progress, n_completed):
+    return "Dataset creation: " + ", ".join(f"{label} {percent}%" for label, percent in tag_progress.items()) + f" ({n_completed}/{len(tag_progress)} tags completed)"
+
+
+def MC_AI_dataset_creation(main_folder, message_signal, jobs=None, cancel_event=None):
     if not os.path.isdir(main_folder):
         print("The provided path is not a directory.")
-        return
+        return False
 
-    class_file_paths = []
+    # End offset (bytes) of each row of each class file, by class file path
+    class_file_row_offsets = {}
 
     # Create an instance of HSDatalog
     hsd = HSDatalog()
@@ -63,42 +161,13 @@ def MC_AI_dataset_creation(main_folder, message_signal):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    acc_dat = hsd.get_data_and_timestamps_by_name(hsd_instance, "iis3dwb_acc", start_time=0, end_time=-1, raw_data = True)
-    fmc_dat = hsd.get_data_and_timestamps_by_name(hsd_instance, "fast_mc_telemetries", start_time=0, end_time=-1, raw_data = True)
-    
-    # Concatenate the accelerometer data chunck in a single array @acc_data
-    chunck_acc_data = [chunck_acc_data[0] for chunck_acc_data in acc_dat]
-    acc_data = np.concatenate(chunck_acc_data)
-
-    # Concatenate the accelerometer timestamp chunck in a single array @acc_timestamp
-    chunck_acc_ts = [chunck_acc_ts[1] for chunck_acc_ts in acc_dat]
-    acc_timestamp = np.concatenate(chunck_acc_ts)
-
-    # Get I_q data and timestamp
-    fmc_data = fmc_dat[0][0]
-    fmc_timestamp = fmc_dat[0][1]
-
-    # Get tags
+    # Get tags first: only the data of the tag windows is read, by the worker processes
     tags = hsd.get_time_tags(hsd_instance)
 
-    # Extract tag labels
+    # Class file of each tag window. The class file of a label is written by its last tag (as each tag overwrites it)
+    tag_jobs = {}
     for tag in tags:# Multiple tag groups are not supported by this script
-        start_time = tag['time_start']
-        end_time = tag['time_end']
         label = tag['label']
-        
-        # Find the index of the nearest timestamp for fmc_timestamp and acc_timestamp based on start_time
-        fmc_start_index = (np.abs(fmc_timestamp - start_time)).argmin()
-        acc_start_index = (np.abs(acc_timestamp - start_time)).argmin()
-        # Find the index of the nearest timestamp for fmc_timestamp and acc_timestamp based on end_time
-        fmc_end_index = (np.abs(fmc_timestamp - end_time)).argmin()
-        acc_end_index = (np.abs(acc_timestamp - end_time)).argmin()
-        # Trim the data based on the start and end indices
-        
-        fmc_data_trimmed = fmc_data[fmc_start_index:fmc_end_index]
-        fmc_time_trimmed = fmc_timestamp[fmc_start_index:fmc_end_index]
-        acc_data_trimmed = acc_data[acc_start_index:acc_end_index]
-        acc_time_trimmed = acc_timestamp[acc_start_index:acc_end_index]
 
         # Create tag folder
         tag_folder = os.path.join(output_folder, label)
@@ -106,54 +175,125 @@ def MC_AI_dataset_creation(main_folder, message_signal):
             os.makedirs(tag_folder)
 
         cf_path = os.path.join(tag_folder, f"{label}.csv")
-        class_file_paths.append(cf_path)
-
-        # Create datasets from the trimmed data
-        dataset_creation(fmc_data_trimmed, fmc_time_trimmed, acc_data_trimmed, acc_time_trimmed, cf_path, message_signal)
+        tag_jobs[cf_path] = tag
+
+    # Create the class files of the tag windows in parallel, they are independent
+    cancel_event = Event() if cancel_event is None else cancel_event
+    progress_queue = Queue()
+    tag_progress = {tag['label']: 0 for tag in tag_jobs.values()}
+    jobs = DEFAULT_JOBS if jobs is None else jobs
+    with ProcessPoolExecutor(max_workers=max(1, min(jobs, len(tag_jobs))), initializer=init_tag_worker, initargs=(main_folder, progress_queue, cancel_event)) as executor:
+        futures = {executor.submit(tag_dataset_creation, tag, cf_path): cf_path for cf_path, tag in tag_jobs.items()}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                row_offsets = future.result()
+                if row_offsets is not None:
+                    class_file_row_offsets[futures[future]] = row_offsets
+            # Report the progress of each tag window
+            updated = False
+            while True:
+                try:
+                    label, percent, text = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if percent is not None:
+                    tag_progress[label] = percent
+                    updated = True
+                else:
+                    log.info(text)
+            if updated or len(done) > 0:
+                message_signal.emit(get_progress_message(tag_progress, len(futures) - len(pending)))
+            if cancel_event.is_set():
+                for future in pending:
+                    future.cancel()
+
+    if cancel_event.is_set():
+        message_signal.emit("Dataset creation cancelled")
+        log.info("Dataset creation cancelled")
+        return False
 
     # After generating all files, correct the length of all class_file_path CSVs
-    if class_file_paths:
-        truncate_csv_files_to_min_length(class_file_paths)
+    if class_file_row_offsets:
+        truncate_csv_files_to_min_length(class_file_row_offsets)
     
     # Open the output folder
     QDesktopServices.openUrl(QUrl.fromLocalFile(output_folder))
     log.info(f"Dataset creation completed successfully.")
+    return True
 
-def extract_n_elements_before_indices(values, indices, n):
-    # initialize an empty list to store the results
-    result = []
-
-    # loop over each index in the array
-    for i in indices:
-        # extract n elements before the index
-        start_index = i - n
-        end_index = i
-        if start_index < 0:
-            start_index = 0
-        extracted_values = values[start_index:end_index]
-        # add the extracted values to the result list
-        result.append(extracted_values)
-
-    return result
+def read_tag_window(hsd, hsd_instance, component_name, start_time, end_time, cancel_event=None):
+    """
+    Reads the data and the timestamps of a component in a tag window, concatenating only the chunks of the window.
+    The window is read in slices of READ_SLICE_TIME seconds, so that a cancellation does not wait for the whole window.
+    
+    Args:
+    hsd (HSDatalog): The HSDatalog factory.
+    hsd_instance: The HSDatalog instance of the acquisition.
+    component_name (str): The component name.
+    start_time (float): The start time of the tag window, in seconds.
+    end_time (float): The end time of the tag window, in seconds.
+    cancel_event (multiprocessing.Event, optional): The event that cancels the read. Defaults to None.
+    
+    Returns:
+    tuple: The raw data and the timestamps of the window, or None if the window has no data or the read was cancelled.
+    """
+    chunks = []
+    last_timestamp = None
+    slice_start = start_time
+    while slice_start < end_time:
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        slice_end = min(slice_start + READ_SLICE_TIME, end_time)
+        slice_chunks = hsd.get_data_and_timestamps_by_name(hsd_instance, component_name, start_time=slice_start, end_time=slice_end, raw_data = True)
+        for chunk in slice_chunks if slice_chunks is not None else []:
+            if chunk is None or len(chunk[0]) == 0:
+                continue
+            # Skip the samples already read with the previous slice (chunks overlapping two slices)
+            if last_timestamp is not None:
+                new_samples = chunk[1].reshape(len(chunk[1]), -1)[:, 0] > last_timestamp
+                if not new_samples.all():
+                    chunk = (chunk[0][new_samples], chunk[1][new_samples])
+                    if len(chunk[0]) == 0:
+                        continue
+            chunks.append(chunk)
+            last_timestamp = chunk[1].reshape(len(chunk[1]), -1)[-1, 0]
+        slice_start = slice_end
+    if len(chunks) == 0:
+        return None
+    data = chunks[0][0] if len(chunks) == 1 else np.concatenate([chunk[0] for chunk in chunks])
+    timestamp = chunks[0][1] if len(chunks) == 1 else np.concatenate([chunk[1] for chunk in chunks])
+    return data, timestamp
 
 def find_closest_minor_indices(values, candidates):
     # sort candidate array in ascending order
     candidates_sorted = np.sort(candidates)
 
-    # initialize an array to store the indices of the closest minor values
-    indices = np.zeros_like(values, dtype=int)
+    # find the index of the closest minor value in candidates for all the elements of values with a single search
+    indices = np.searchsorted(candidates_sorted, values, side='left') - 1
 
-    # loop over each element in values
-    for i, v in enumerate(values):
-        # find the index of the closest minor value in candidates
-        index = np.searchsorted(candidates_sorted, v, side='left') - 1
-        # handle edge cases where v is smaller than the smallest value in candidates
-        if index < 0:
-            index = 0
-        # store the index in the result array
-        indices[i] = index
+    # handle edge cases where v is smaller than the smallest value in candidates
+    return np.maximum(indices, 0)
 
-    return indices
+def extract_decimated_windows(values, end_indices, n, decimation):
+    """
+    Extracts the n elements before each index and decimates them by computing the average of every `decimation` elements, for all the indices at once.
+    
+    Args:
+    values (numpy.ndarray): The 1D or 2D input array (samples along the first axis).
+    end_indices (numpy.ndarray): The end index (excluded) of each window, each one must be greater than or equal to n.
+    n (int): The number of elements of each window.
+    decimation (int): The factor by which to decimate the windows.
+    
+    Returns:
+    numpy.ndarray: The decimated windows, with shape (len(end_indices), n // decimation, number of columns of values).
+    """
+    values_2d = values.reshape(len(values), -1)
+    # Windows with shape (n_windows, columns, n), taken as views of values and copied only by the indexing
+    windows = np.lib.stride_tricks.sliding_window_view(values_2d, n, axis=0)[end_indices - n]
+    decimated = windows.reshape(len(end_indices), values_2d.shape[1], n // decimation, decimation).mean(axis=3)
+    return decimated.transpose(0, 2, 1)
 
 def csv_to_array(file_path):
     # load the CSV file into a NumPy array, skipping the first row
@@ -171,136 +311,96 @@ def array_decimation(array, decimation, axis):
     # flatten the decimated array and return it
     return decimated_array.flatten()
 
-def decimate_1d_array_by_average(arr, decimation):
-    """
-    Decimates a 1D NumPy array by computing the average of every `decimation` elements.
-    
-    Args:
-    arr (numpy.ndarray): The input array to be decimated.
-    decimation (int): The factor by which to decimate the array.
-    
-    Returns:
-    numpy.ndarray: The decimated array.
-    """
-    return np.mean(arr.reshape(-1, decimation), axis=1)
-
-def decimate_2d_array_by_average(arr, decimation):
-    """
-    Decimates a 2D NumPy array along the first axis by computing the average of every `decimation` rows.
-    
-    Args:
-    arr (numpy.ndarray): The input array to be decimated.
-    decimation (int): The factor by which to decimate the arrays.
-    
-    Returns:
-    numpy.ndarray: The decimated array.
-    """
-    return np.mean(arr.reshape(-1, decimation, arr.shape[1]), axis=1)
-
-def decimate_array_by_average(arr, decimation):
-    """
-    Decimates a 1D or 2D NumPy array along the first axis by computing the average of every `decimation` rows or elements.
-    
-    Args:
-    arr (numpy.ndarray): The input array to be decimated.
-    decimation (int): The factor by which to decimate the array.
-    
-    Returns:
-    numpy.ndarray: The decimated array.
-    """
-    if arr.ndim == 1:
-        return decimate_1d_array_by_average(arr, decimation)
-    elif arr.ndim == 2:
-        return decimate_2d_array_by_average(arr, decimation)
-    else:
-        raise ValueError("Input array must be 1D or 2D")
-
-def decimate_array_list_by_average(arr_list, decimation):
-    """
-    Decimates a list of 2D NumPy arrays along the first axis by computing the average of every `decimation` rows.
-    
-    Args:
-    arr_list (list): The list of input arrays to be decimated.
-    decimation (int): The factor by which to decimate the arrays.
-    
-    Returns:
-    list: The list of decimated arrays.
-    """
-    return [decimate_array_by_average(arr, decimation) for arr in arr_list]
-
-def concatenate_lists(arr_list1, arr_list2):
-    # Check that the two lists have the same length
-    if len(arr_list1) != len(arr_list2):
-        raise ValueError("The two lists must have the same length.")
-    
-    # Concatenate each array in the two lists along the second axis
-    concatenated_list = [np.concatenate((arr1, arr2), axis=1) 
-                        for arr1, arr2 in zip(arr_list1, arr_list2)]
-    return concatenated_list
-
-def flatten_arrays(arr_list):
-    # Reshape each array in the list to a 1D array
-    flattened_list = [arr.reshape(-1) for arr in arr_list]
-    
-    return flattened_list
-
-def dataset_creation(fast_telemetry_data, fast_telemetry_ts, iis3dwb_acc_data, iis3dwb_acc_ts, output_data_set_file_path, message_signal):
+def dataset_creation(fast_telemetry_data, fast_telemetry_ts, iis3dwb_acc_data, iis3dwb_acc_ts, output_data_set_file_path, message_signal, progress_callback=None, cancel_event=None):
     # Flatten the timestamps
     fast_telemetry_ts = fast_telemetry_ts.flatten()
     iis3dwb_acc_ts = iis3dwb_acc_ts.flatten()
     #extract timestamp each fast_telemetry packet dimension x decimation
-    fast_telemetry_decimated_ts = fast_telemetry_ts[1024*DECIMATION::1024*DECIMATION]
-    iis3dwb_acc_decimated_idx = find_closest_minor_indices(fast_telemetry_decimated_ts, iis3dwb_acc_ts.flatten())
-    fast_telemetry_decimated_idx = np.arange(1024*DECIMATION, len(fast_telemetry_data), 1024*DECIMATION)
-
-    fast_telemetry_data_decimated_in =  extract_n_elements_before_indices(fast_telemetry_data, fast_telemetry_decimated_idx, 1024*DECIMATION)
-    iis3dwb_acc_decimated_in = extract_n_elements_before_indices(iis3dwb_acc_data, iis3dwb_acc_decimated_idx, 1024*DECIMATION)
-
-    fast_telemetry_data_decimated_out = decimate_array_list_by_average(fast_telemetry_data_decimated_in,DECIMATION)
-    iis3dwb_acc_decimated_out = decimate_array_list_by_average(iis3dwb_acc_decimated_in,DECIMATION)
-
-    aggregated_data = concatenate_lists(iis3dwb_acc_decimated_out, fast_telemetry_data_decimated_out)
-
-    aggregated_data_flatten = flatten_arrays(aggregated_data)
-    
-    # Open the output file in append mode
+    fast_telemetry_decimated_ts = fast_telemetry_ts[WINDOW_SIZE::WINDOW_SIZE]
+    fast_telemetry_decimated_idx = np.arange(WINDOW_SIZE, len(fast_telemetry_data), WINDOW_SIZE)
+    n_rows = min(len(fast_telemetry_decimated_ts), len(fast_telemetry_decimated_idx))
+    iis3dwb_acc_decimated_idx = find_closest_minor_indices(fast_telemetry_decimated_ts[:n_rows], iis3dwb_acc_ts)
+    fast_telemetry_decimated_idx = fast_telemetry_decimated_idx[:n_rows]
+
+    # Skip the rows without a full accelerometer window (telemetry acquired before the first WINDOW_SIZE accelerometer samples)
+    valid_rows = iis3dwb_acc_decimated_idx >= WINDOW_SIZE
+    if not valid_rows.all():
+        log.warning(f"{output_data_set_file_path}: {np.count_nonzero(~valid_rows)} rows skipped, not enough accelerometer samples before them")
+        iis3dwb_acc_decimated_idx = iis3dwb_acc_decimated_idx[valid_rows]
+        fast_telemetry_decimated_idx = fast_telemetry_decimated_idx[valid_rows]
+
+    # End offset (bytes) of each row in the output file, so that the file can be truncated without parsing it again
+    row_offsets = [np.zeros(0, dtype=np.int64)]
+    file_offset = 0
+
+    # Open the output file in write mode
     with open(output_data_set_file_path, 'w',  newline='') as output_file:
 
-        # Create a CSV writer for the output file
-        writer = csv.writer(output_file)
-
-        # Write the aggregated data to the output file
-        for row in aggregated_data_flatten:
-            writer.writerow(row)
-
+        # Create a CSV writer for the rows of a batch
+        batch_text = io.StringIO()
+        writer = csv.writer(batch_text)
+
+        # Compute and write the rows a batch at a time: windowing and decimation of all the rows of a batch at once
+        n_rows = len(fast_telemetry_decimated_idx)
+        for first_row in range(0, n_rows, ROWS_PER_BATCH):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            rows = slice(first_row, first_row + ROWS_PER_BATCH)
+            iis3dwb_acc_decimated_out = extract_decimated_windows(iis3dwb_acc_data, iis3dwb_acc_decimated_idx[rows], WINDOW_SIZE, DECIMATION)
+            fast_telemetry_data_decimated_out = extract_decimated_windows(fast_telemetry_data, fast_telemetry_decimated_idx[rows], WINDOW_SIZE, DECIMATION)
+
+            # Each row is the flattened (decimated sample, [accelerometer axes, fast telemetries]) window
+            aggregated_data = np.concatenate((iis3dwb_acc_decimated_out, fast_telemetry_data_decimated_out), axis=2)
+            aggregated_data_flatten = aggregated_data.reshape(len(aggregated_data), -1)
+
+            # Write the aggregated data to the output file
+            batch_text.seek(0)
+            batch_text.truncate()
+            writer.writerows(aggregated_data_flatten.tolist())
+            batch_bytes = batch_text.getvalue().encode()
+            output_file.write(batch_text.getvalue())
+
+            # Each row ends with a line terminator
+            row_ends = np.flatnonzero(np.frombuffer(batch_bytes, dtype=np.uint8) == ord('\n')) + 1
+            row_offsets.append(file_offset + row_ends)
+            file_offset += len(batch_bytes)
+
+            if progress_callback is not None:
+                progress_callback(100 * min(first_row + ROWS_PER_BATCH, n_rows) // n_rows)
+
+    if cancel_event is not None and cancel_event.is_set():
+        # Remove the incomplete class file
+        os.remove(output_data_set_file_path)
+        return None
+
+    if progress_callback is not None:
+        progress_callback(100)
     message_signal.emit(f"{output_data_set_file_path} CREATED")
+    return np.concatenate(row_offsets)
 
-def truncate_csv_files_to_min_length(csv_file_paths):
-    # Determine the minimum length among the CSV files
-    min_length = float('inf')
-    for file_path in csv_file_paths:
-        data = np.genfromtxt(file_path, delimiter=',', skip_header=1)  # Assuming there's a header
-        min_length = min(min_length, data.shape[0])
-
-    # Truncate each CSV file to the minimum length
-    for file_path in csv_file_paths:
-        # Load the data
-        with open(file_path, 'r') as f:
-            header = f.readline()  # Read the header line
-            data = np.genfromtxt(f, delimiter=',', skip_header=0)  # Already skipped the header
-
-        # Truncate the data
-        truncated_data = data[:min_length]
+def truncate_csv_files_to_min_length(csv_row_offsets):
+    """
+    Truncates the class CSV files to the number of rows of the shortest one, in place.
+    
+    Args:
+    csv_row_offsets (dict): The end offset (bytes) of each row of each CSV file, by file path, as returned by dataset_creation.
+    """
+    # Determine the minimum length among the CSV files from the rows counted while writing them
+    min_length = min(len(row_offsets) for row_offsets in csv_row_offsets.values())
 
-        # Write the truncated data back to the CSV file
-        with open(file_path, 'w') as f:
-            f.write(header)  # Write the header line
-            np.savetxt(f, truncated_data, delimiter=',', fmt='%g')  # Use '%g' for floating-point format
+    # Truncate each CSV file to the minimum length, at the end of its last row, without reading it
+    for file_path, row_offsets in csv_row_offsets.items():
+        if len(row_offsets) > min_length:
+            os.truncate(file_path, int(row_offsets[min_length - 1]) if min_length > 0 else 0)
 
 class DragDropLabel(QLabel):
-    def __init__(self, parent=None):
+    running_changed = Signal(bool)
+
+    def __init__(self, parent=None, jobs=None):
         super().__init__(parent)
         self.setAcceptDrops(True)
+        self.thread = None
+        self.jobs = jobs
         self.setAlignment(Qt.AlignCenter)
         self.setText("Drag and Drop the datalogMC acquisation here")
         self.setStyleSheet("QLabel { background-color : #2E2E2E; color : white; font-size: 16px; }")
@@ -320,12 +420,19 @@ class DragDropLabel(QLabel):
 
     def start_thread(self, folder_path):
         self.update_label("Dataset creation in progress. The task will take some minutes.")
-        self.thread = DatasetCreationWorker(folder_path)
+        self.thread = DatasetCreationWorker(folder_path, self.jobs)
         self.thread.success.connect(self.on_success)
         self.thread.error.connect(self.on_error)
         self.thread.message.connect(self.update_label)
         self.thread.finished.connect(self.reset_label)
+        self.thread.finished.connect(lambda: self.running_changed.emit(False))
         self.thread.start()
+        self.running_changed.emit(True)
+
+    def cancel_thread(self):
+        if self.thread is not None and self.thread.isRunning():
+            self.update_label("Cancelling the dataset creation...")
+            self.thread.cancel()
 
     def update_label(self, text):
         self.setText(text)
@@ -340,22 +447,34 @@ class DragDropLabel(QLabel):
         QMessageBox.critical(None, "Error", f"An error occurred: {error_message}")
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, jobs=None):
         super().__init__()
         self.setWindowTitle("MC AI Dataset Creation")
         self.setFixedSize(1200, 200)  # Set fixed size for the window
         self.setStyleSheet("background-color: #2E2E2E;")
 
         layout = QVBoxLayout()
-        self.label = DragDropLabel(self)
+        self.label = DragDropLabel(self, jobs)
         layout.addWidget(self.label)
 
+        # Cancel the dataset creation in progress
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setStyleSheet("QPushButton { color : white; font-size: 14px; }")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.label.cancel_thread)
+        self.label.running_changed.connect(self.cancel_button.setEnabled)
+        layout.addWidget(self.cancel_button)
+
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    # The remaining arguments are passed to Qt
+    parser = argparse.ArgumentParser(description="MC AI Dataset Creation")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_JOBS, help=f"Number of tag windows processed in parallel (default: {DEFAULT_JOBS}). Each job holds the data of one tag window in memory")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(max(1, args.jobs))
     window.show()
     sys.exit(app.exec())